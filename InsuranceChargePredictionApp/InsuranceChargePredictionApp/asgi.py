@@ -14,3 +14,12 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'InsuranceChargePredictionApp.settings')
 
 application = get_asgi_application()
+
+# Serveurs sans hook de démarrage (ex : uvicorn) ; gunicorn passe par gunicorn.conf.py
+from django.conf import settings  # noqa: E402
+
+if settings.PREDICT_WARMUP_ASGI:
+    from predict.warmup import limit_native_threads, warm_up
+
+    limit_native_threads(settings.PREDICT_NATIVE_THREADS)
+    warm_up()
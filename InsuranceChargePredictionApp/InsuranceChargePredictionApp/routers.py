@@ -0,0 +1,33 @@
+"""
+Routage des bases de données : les modèles de l'app `predict` (volume d'écriture
+élevé) vivent dans leur propre fichier SQLite, avec leur propre verrou d'écriture.
+Comptes, sessions, messages et admin restent sur la base `default`.
+"""
+
+PREDICT_DB_ALIAS = 'predictions'
+
+
+class PredictRouter:
+    route_app_labels = {'predict'}
+
+    def _db_for_model(self, model):
+        if model._meta.app_label in self.route_app_labels:
+            return PREDICT_DB_ALIAS
+        return 'default'
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_model(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_model(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les clés étrangères vers les utilisateurs sont déclarées sans contrainte en base
+        if {obj1._meta.app_label, obj2._meta.app_label} & self.route_app_labels:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label in self.route_app_labels:
+            return db == PREDICT_DB_ALIAS
+        return db == 'default'
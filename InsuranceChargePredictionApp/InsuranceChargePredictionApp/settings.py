@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from .sqlite import init_command as sqlite_init_command
 
 # CHARGEMENT DES VARIABLES D'ENVIRONNEMENT (CORRIGÉ)
 load_dotenv()  # Ajout critique : charge le fichier .env AVANT toute utilisation d'os.getenv
@@ -28,10 +29,16 @@ ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', "127.0.0.1,localhost,0.0.0.0").split(
 
 # CONFIGURATION AUTHENTIFICATION CRITIQUE
 AUTH_USER_MODEL = "accounts.CustomUser"  # DOIT ÊTRE DÉFINI AVANT TOUTE MIGRATION
+# Remplacé par accounts.backends.CachedModelBackend quand le cache est partagé (voir Cache)
+AUTHENTICATION_BACKENDS = ["django.contrib.auth.backends.ModelBackend"]
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '300'))
 LOGIN_URL = "accounts:login"
 LOGIN_REDIRECT_URL = "predict:dashboard"  # À adapter selon votre structure
 LOGOUT_REDIRECT_URL = "accounts:login"
 
+# Jetons des partenaires autorisés sur /api/v1/score (séparés par des virgules)
+PREDICT_API_TOKENS = [token for token in os.getenv('PREDICT_API_TOKENS', '').split(',') if token]
+
 # Application definition
 INSTALLED_APPS = [
     # Our Apps
@@ -55,14 +62,15 @@ if DEBUG:
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Juste après SecurityMiddleware : fichiers statiques et pages pré-rendues servis
+    # sans passer par les sessions, le CSRF, l'authentification ni les templates
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',  # Nécessaire pour l'auth
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
 ]
 
 if DEBUG:
@@ -92,13 +100,131 @@ TEMPLATES = [
 WSGI_APPLICATION = 'InsuranceChargePredictionApp.wsgi.application'
 
 # Database
+# PRAGMAs appliqués à chaque nouvelle connexion SQLite : WAL pour que les lectures
+# ne bloquent pas l'écriture, attente sur verrou plutôt qu'erreur immédiate.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('DB_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('DB_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('DB_BUSY_TIMEOUT', '5000')),  # ms
+    'mmap_size': int(os.getenv('DB_MMAP_SIZE', str(128 * 1024 * 1024))),  # octets
+    'cache_size': int(os.getenv('DB_CACHE_SIZE', '-20000')),  # négatif : en Kio
+    'temp_store': 'MEMORY',
+}
+
+SQLITE_OPTIONS = {
+    'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+    # BEGIN IMMEDIATE : le verrou d'écriture est pris dès l'ouverture de
+    # transaction.atomic(), évitant l'échec de la promotion lecture -> écriture
+    'transaction_mode': os.getenv('DB_TRANSACTION_MODE', 'IMMEDIATE'),
+    'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+}
+
+# Connexions persistantes : plus de reconnexion à chaque requête
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.getenv('DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')),
-    }
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': dict(SQLITE_OPTIONS),
+    },
+    # Base dédiée aux modèles de l'app predict (voir routers.py)
+    'predictions': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('PREDICT_DB_NAME', os.path.join(BASE_DIR, 'predictions.sqlite3')),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': dict(SQLITE_OPTIONS),
+    },
 }
 
+DATABASE_ROUTERS = ['InsuranceChargePredictionApp.routers.PredictRouter']
+
+# Cache
+# Mémoire locale par défaut (aucun service externe). Pour partager le cache entre
+# workers : CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache avec
+# CACHE_LOCATION=/chemin/du/cache, ou un backend partagé (ex : RedisCache + URL).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'assuraimant'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '300')),
+    },
+    # Résultats des soumissions du formulaire de prédiction, par jeton d'idempotence :
+    # durée de vie courte et nombre d'entrées borné (les plus anciennes sont évincées)
+    'idempotency': {
+        'BACKEND': os.getenv('IDEMPOTENCY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('IDEMPOTENCY_CACHE_LOCATION', 'assuraimant-idempotency'),
+        'TIMEOUT': int(os.getenv('IDEMPOTENCY_TTL', '120')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '5000'))},
+    },
+}
+
+# Sessions et utilisateur connecté ne passent par le cache que s'il est partagé entre
+# workers : avec un cache propre à chaque processus, une déconnexion ou un changement de
+# profil invalidé dans un worker resterait visible dans les autres.
+# Vérifié au démarrage par accounts.checks.
+SHARED_CACHE = CACHES['default']['BACKEND'] not in {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+if SHARED_CACHE:
+    # Sessions lues dans le cache, écrites en cache et en base (survivent à un redémarrage)
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    # Utilisateur chargé à chaque requête mis en cache (invalidé à l'enregistrement)
+    AUTHENTICATION_BACKENDS = ["accounts.backends.CachedModelBackend"]
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# Prédiction asynchrone (déploiement ASGI)
+# PREDICT_ASYNC_VIEWS=True sert AsyncPredictionView : le modèle tourne dans un pool dédié
+# de PREDICT_EXECUTOR_WORKERS threads, et les appels au-delà de PREDICT_EXECUTOR_MAX_PENDING
+# en attente sont refusés. Le pool d'asgiref pour le code synchrone se règle via ASGI_THREADS.
+PREDICT_ASYNC_VIEWS = os.getenv('PREDICT_ASYNC_VIEWS', 'False') == 'True'
+PREDICT_EXECUTOR_WORKERS = int(os.getenv('PREDICT_EXECUTOR_WORKERS', str(min(4, os.cpu_count() or 1))))
+PREDICT_EXECUTOR_MAX_PENDING = int(os.getenv('PREDICT_EXECUTOR_MAX_PENDING', '200'))
+
+# Préchauffage du modèle au démarrage des workers (voir gunicorn.conf.py).
+# PREDICT_WARMUP_ASGI=True le fait au chargement de l'application ASGI (asgi.py), pour les
+# serveurs sans hook (ex : uvicorn) ; jamais pour les commandes manage.py.
+# PREDICT_NATIVE_THREADS : threads BLAS/OpenMP par worker.
+PREDICT_WARMUP_ASGI = os.getenv('PREDICT_WARMUP_ASGI', 'False') == 'True'
+PREDICT_NATIVE_THREADS = int(os.getenv('PREDICT_NATIVE_THREADS', '1'))
+
+# Regroupement des prédictions identiques en cours (predict/singleflight.py). Toujours actif
+# dans un worker ; entre workers si PREDICT_SINGLEFLIGHT_LOCK_DIR désigne un répertoire
+# local partagé (ex : /run/assuraimant). Résultat relu par les autres workers pendant
+# PREDICT_SINGLEFLIGHT_RESULT_TTL secondes.
+PREDICT_SINGLEFLIGHT_LOCK_DIR = os.getenv('PREDICT_SINGLEFLIGHT_LOCK_DIR') or None
+PREDICT_SINGLEFLIGHT_RESULT_TTL = float(os.getenv('PREDICT_SINGLEFLIGHT_RESULT_TTL', '2'))
+
+# Cache des prédictions en mémoire partagée entre les workers d'une machine
+# (predict/sharedcache.py) : PREDICT_SHM_CACHE_SLOTS entrées de 64 octets, 0 pour le désactiver.
+# La table survit aux redémarrages des workers ; la supprimer en changeant de taille.
+PREDICT_SHM_CACHE_SLOTS = int(os.getenv('PREDICT_SHM_CACHE_SLOTS', '0'))
+PREDICT_SHM_CACHE_NAME = os.getenv('PREDICT_SHM_CACHE_NAME', 'assuraimant-predictions')
+
+# Tâches de fond (predict/jobs.py), exécutées par `manage.py run_workers`. Après un échec,
+# nouvelle tentative après JOB_RETRY_DELAY secondes, doublé à chaque essai ; une tâche sans
+# battement de cœur depuis JOB_STALE_AFTER secondes est reprise. Fichiers produits dans JOB_OUTPUT_DIR.
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', '30'))
+JOB_STALE_AFTER = int(os.getenv('JOB_STALE_AFTER', '600'))
+JOB_OUTPUT_DIR = os.getenv('JOB_OUTPUT_DIR', os.path.join(BASE_DIR, 'job_outputs'))
+
+# Rang d'une prédiction dans son segment (predict/percentiles.py) : tableaux triés tenus à jour
+# toutes les PREDICT_PERCENTILES_REFRESH secondes au plus, sauvegardés dans
+# PREDICT_PERCENTILES_PATH (fichier .npz) pour ne pas relire toute la table au redémarrage.
+PREDICT_PERCENTILES_REFRESH = float(os.getenv('PREDICT_PERCENTILES_REFRESH', '5'))
+PREDICT_PERCENTILES_PATH = os.getenv('PREDICT_PERCENTILES_PATH') or None
+
+# Explication des prédictions (predict/explain.py) : tables des chemins des arbres, calculées
+# au préchauffage et sauvegardées dans PREDICT_EXPLAIN_TABLES_PATH (fichier .npz, hors du
+# code) pour être relues au redémarrage ; None : gardées en mémoire seulement.
+PREDICT_EXPLAIN_TABLES_PATH = os.getenv('PREDICT_EXPLAIN_TABLES_PATH') or None
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -134,4 +260,12 @@ STORAGES = {
         "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
         }
-}
\ No newline at end of file
+}
+
+# Pages pré-rendues (accueil, 404, 500) générées par `manage.py prerender_pages`
+# après `collectstatic`. WhiteNoise sert `/` depuis index.html (et ses variantes .gz)
+# avant le reste des middlewares ; les ressources liées sont hashées par le manifest.
+PRERENDER_ROOT = BASE_DIR / 'prerendered'
+WHITENOISE_INDEX_FILE = True
+if PRERENDER_ROOT.is_dir():
+    WHITENOISE_ROOT = PRERENDER_ROOT
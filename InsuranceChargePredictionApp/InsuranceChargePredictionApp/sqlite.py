@@ -0,0 +1,13 @@
+"""
+Réglages de connexion SQLite, partagés par les settings et le benchmark d'écriture.
+"""
+
+
+def pragma_statements(pragmas):
+    """Traduit un dictionnaire {pragma: valeur} en instructions PRAGMA."""
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def init_command(pragmas):
+    """Construit l'`init_command` exécutée par Django à l'ouverture de chaque connexion."""
+    return '; '.join(pragma_statements(pragmas))
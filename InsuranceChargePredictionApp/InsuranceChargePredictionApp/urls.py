@@ -18,15 +18,21 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from .views import HomePageView
+from .views import HomePageView, HeaderFragmentView
+from predict.views import ScoreAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("", HomePageView.as_view(), name="home"),
+    path("fragments/header/", HeaderFragmentView.as_view(), name="header_fragment"),
     path("predict/", include('predict.urls')),
+    path("api/v1/score", ScoreAPIView.as_view(), name="api_score"),
     path("accounts/", include('accounts.urls')),
 ]
 
+handler404 = "InsuranceChargePredictionApp.views.page_not_found"
+handler500 = "InsuranceChargePredictionApp.views.server_error"
+
 if settings.DEBUG:
     # Include django_browser_reload URLs only in DEBUG mode
     urlpatterns += [
@@ -1,4 +1,46 @@
-from django.views.generic import TemplateView
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.views import defaults
+from django.views.generic import TemplateView, View
+
 
 class HomePageView(TemplateView):
     template_name = "home.html"
+
+
+class HeaderFragmentView(View):
+    """En-tête des utilisateurs connectés, chargé par les pages pré-rendues (header.js)."""
+
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            # La version anonyme est déjà dans la page pré-rendue
+            return HttpResponse(status=204)
+
+        response = render(request, "includes/header.html")
+        response["Cache-Control"] = "private, no-store"
+        return response
+
+
+def read_prerendered_page(name):
+    """Contenu d'une page générée par `manage.py prerender_pages`, ou None."""
+    try:
+        return (Path(settings.PRERENDER_ROOT) / name).read_bytes()
+    except OSError:
+        return None
+
+
+def page_not_found(request, exception):
+    content = read_prerendered_page("404.html")
+    if content is None:
+        return defaults.page_not_found(request, exception)
+    return HttpResponse(content, status=404)
+
+
+def server_error(request):
+    content = read_prerendered_page("500.html")
+    if content is None:
+        return defaults.server_error(request)
+    return HttpResponse(content, status=500)
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register()
+def check_auth_cache(app_configs, **kwargs):
+    """Sessions et utilisateur en cache : seulement avec un cache partagé entre workers."""
+    if settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return []
+
+    errors = []
+    if 'accounts.backends.CachedModelBackend' in settings.AUTHENTICATION_BACKENDS:
+        errors.append(Error(
+            "CachedModelBackend avec un cache propre à chaque processus : un utilisateur "
+            "modifié ou supprimé resterait en cache dans les autres workers.",
+            hint="Utiliser ModelBackend, ou un CACHE_BACKEND partagé (Redis, fichiers...).",
+            id='accounts.E001',
+        ))
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db':
+        errors.append(Error(
+            "Sessions cached_db avec un cache propre à chaque processus : une session "
+            "supprimée (déconnexion) resterait valide dans les autres workers.",
+            hint="Utiliser le moteur de sessions db, ou un CACHE_BACKEND partagé.",
+            id='accounts.E002',
+        ))
+    return errors
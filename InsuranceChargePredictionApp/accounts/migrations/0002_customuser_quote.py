@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='quote',
+            field=models.FloatField(blank=True, null=True, verbose_name='devis'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='quote_model_version',
+            field=models.CharField(blank=True, max_length=16, verbose_name='version du modèle du devis'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='quote_range_lower',
+            field=models.FloatField(blank=True, null=True, verbose_name='fourchette basse du devis'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='quote_range_upper',
+            field=models.FloatField(blank=True, null=True, verbose_name='fourchette haute du devis'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='quote_updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='devis calculé le'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+from django.db import migrations, transaction
+
+import predict.encodings
+from predict.encodings import GENDER_CODES, REGION_CODES
+
+
+BATCH_SIZE = 5000
+CODED_FIELDS = {'gender': GENDER_CODES, 'region': REGION_CODES}
+
+
+def _batches(queryset):
+    """Intervalles de clés primaires de BATCH_SIZE lignes : une transaction courte par lot."""
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        yield queryset.filter(pk__gte=pks[0], pk__lte=last_pk)
+
+
+def encode_columns(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    db = schema_editor.connection.alias
+
+    for batch in _batches(CustomUser.objects.using(db)):
+        with transaction.atomic(using=db):
+            for name, codes in CODED_FIELDS.items():
+                for value, code in codes.items():
+                    batch.filter(**{name: value}).update(**{f'{name}_code': code})
+
+
+def decode_columns(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    db = schema_editor.connection.alias
+
+    for batch in _batches(CustomUser.objects.using(db)):
+        with transaction.atomic(using=db):
+            for name, codes in CODED_FIELDS.items():
+                for value, code in codes.items():
+                    batch.filter(**{f'{name}_code': code}).update(**{name: value})
+
+
+class Migration(migrations.Migration):
+
+    # Conversion par lots validés au fur et à mesure
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0002_customuser_quote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='gender_code',
+            field=predict.encodings.CodedChoiceField(blank=True, choices=[('female', 'Femme'), ('male', 'Homme')], codes={'female': 0, 'male': 1}, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='region_code',
+            field=predict.encodings.CodedChoiceField(blank=True, choices=[('northeast', 'Nord-Est'), ('northwest', 'Nord-Ouest'), ('southeast', 'Sud-Est'), ('southwest', 'Sud-Ouest')], codes={'northeast': 0, 'northwest': 1, 'southeast': 2, 'southwest': 3}, null=True),
+        ),
+        migrations.RunPython(encode_columns, decode_columns),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='gender',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='region',
+        ),
+        migrations.RenameField(
+            model_name='customuser',
+            old_name='gender_code',
+            new_name='gender',
+        ),
+        migrations.RenameField(
+            model_name='customuser',
+            old_name='region_code',
+            new_name='region',
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='gender',
+            field=predict.encodings.CodedChoiceField(blank=True, choices=[('female', 'Femme'), ('male', 'Homme')], codes={'female': 0, 'male': 1}, null=True, verbose_name='genre'),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='region',
+            field=predict.encodings.CodedChoiceField(blank=True, choices=[('northeast', 'Nord-Est'), ('northwest', 'Nord-Ouest'), ('southeast', 'Sud-Est'), ('southwest', 'Sud-Ouest')], codes={'northeast': 0, 'northwest': 1, 'southeast': 2, 'southwest': 3}, null=True, verbose_name='région'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:05
+
+from django.db import migrations, models, transaction
+
+import predict.encodings
+from predict.encodings import compute_bmi
+
+
+BATCH_SIZE = 5000
+
+
+def backfill_bmi(apps, schema_editor):
+    """IMC des lignes existantes, calculé par compute_bmi (mêmes arrondis que le modèle), par lots."""
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    db = schema_editor.connection.alias
+    last_pk = 0
+
+    while True:
+        rows = list(CustomUser.objects.using(db).filter(pk__gt=last_pk).order_by('pk')
+                    .only('pk', 'weight', 'height')[:BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1].pk
+
+        for row in rows:
+            row.bmi_value = compute_bmi(row.weight, row.height)
+        with transaction.atomic(using=db):
+            CustomUser.objects.using(db).bulk_update(rows, ['bmi_value'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    # Remplissage par lots validés au fur et à mesure
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0003_coded_categorical_columns'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='bmi_value',
+            field=predict.encodings.BMIField(blank=True, editable=False, null=True, verbose_name='IMC'),
+        ),
+        migrations.RunPython(backfill_bmi, migrations.RunPython.noop),
+        # Index créé après le remplissage
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['bmi_value'], name='user_bmi_idx'),
+        ),
+    ]
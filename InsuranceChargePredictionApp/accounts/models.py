@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from predict.encodings import GENDER_CODES, REGION_CODES, BMIField, CodedChoiceField, compute_bmi
+
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -53,9 +55,10 @@ class CustomUser(AbstractUser):
 
     # Caractéristiques liées à l'assurance (Brief requirements)
     age = models.PositiveIntegerField(_("âge"), null=True, blank=True)
-    gender = models.CharField(
+    # Stockés en petits entiers (predict.encodings), manipulés sous leur valeur texte
+    gender = CodedChoiceField(
         _("genre"),
-        max_length=10,
+        codes=GENDER_CODES,
         choices=[("female", _("Femme")), ("male", _("Homme"))],
         null=True,
         blank=True,
@@ -64,9 +67,9 @@ class CustomUser(AbstractUser):
     height = models.FloatField(_("taille (m)"), null=True, blank=True)
     smoker = models.BooleanField(_("fumeur"), default=False)
     children = models.PositiveIntegerField(_("nombre d'enfants"), default=0)
-    region = models.CharField(
+    region = CodedChoiceField(
         _("région"),
-        max_length=20,
+        codes=REGION_CODES,
         choices=[
             ("northeast", _("Nord-Est")),
             ("northwest", _("Nord-Ouest")),
@@ -77,11 +80,19 @@ class CustomUser(AbstractUser):
         blank=True,
     )
 
+    # Devis précalculé à partir des caractéristiques ci-dessus (voir predict.quotes)
+    quote = models.FloatField(_("devis"), null=True, blank=True)
+    quote_range_lower = models.FloatField(_("fourchette basse du devis"), null=True, blank=True)
+    quote_range_upper = models.FloatField(_("fourchette haute du devis"), null=True, blank=True)
+    quote_model_version = models.CharField(_("version du modèle du devis"), max_length=16, blank=True)
+    quote_updated_at = models.DateTimeField(_("devis calculé le"), null=True, blank=True)
+
+    # IMC enregistré pour les requêtes (ex : bmi_value__gte=30) ; `bmi` reste calculé à la volée
+    bmi_value = BMIField(_("IMC"))
+
     @property
     def bmi(self):
-        if self.height and self.height > 0 and self.weight:
-            return round(self.weight / (self.height**2), 2)
-        return None
+        return compute_bmi(self.weight, self.height)
 
     # Configuration
     USERNAME_FIELD = "email"
@@ -93,6 +104,9 @@ class CustomUser(AbstractUser):
         verbose_name = _("utilisateur")
         verbose_name_plural = _("utilisateurs")
         db_table = "accounts_customuser"
+        indexes = [
+            models.Index(fields=["bmi_value"], name="user_bmi_idx"),
+        ]
 
     def __str__(self):
         return f"{self.get_full_name()} ({self.email})"
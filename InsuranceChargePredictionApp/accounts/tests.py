@@ -1,6 +1,12 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db.utils import IntegrityError
+from django.urls import reverse
+from unittest.mock import patch
+from predict.services import model_version
+from .backends import CachedModelBackend, user_cache_key
+from .checks import check_auth_cache
 
 User = get_user_model()
 
@@ -58,3 +64,122 @@ class CustomUserTests(TestCase):
         user.weight = None
         user.height = 1.75
         self.assertIsNone(user.bmi)
+
+
+@override_settings(AUTHENTICATION_BACKENDS=["accounts.backends.CachedModelBackend"])
+class CachedModelBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="cache@example.com",
+            password="password123",
+            first_name="Cache",
+            last_name="User",
+        )
+
+    def test_user_is_loaded_once_then_served_from_cache(self):
+        backend = CachedModelBackend()
+        self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(backend.get_user(self.user.pk), self.user)
+
+    def test_unknown_user_is_not_cached(self):
+        self.assertIsNone(CachedModelBackend().get_user(9999))
+        self.assertIsNone(cache.get(user_cache_key(9999)))
+
+    def test_profile_form_save_invalidates_cached_user(self):
+        self.client.login(email="cache@example.com", password="password123")
+        self.client.get(reverse("accounts:profile"))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+
+        self.client.post(reverse("accounts:profile"), {
+            "first_name": "Nouveau",
+            "last_name": "User",
+            "children": 0,
+        })
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+
+        response = self.client.get(reverse("accounts:profile"))
+        self.assertEqual(response.context["user"].first_name, "Nouveau")
+
+
+class AuthCacheCheckTests(TestCase):
+    def test_default_settings_keep_auth_out_of_a_local_cache(self):
+        self.assertEqual(check_auth_cache(None), [])
+
+    @override_settings(AUTHENTICATION_BACKENDS=["accounts.backends.CachedModelBackend"],
+                       SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_cached_auth_with_a_local_cache_is_an_error(self):
+        self.assertEqual([error.id for error in check_auth_cache(None)], ["accounts.E001", "accounts.E002"])
+
+    @override_settings(AUTHENTICATION_BACKENDS=["accounts.backends.CachedModelBackend"],
+                       SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+                       CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                                           "LOCATION": "/tmp/assuraimant-check"}})
+    def test_cached_auth_with_a_shared_cache_is_accepted(self):
+        self.assertEqual(check_auth_cache(None), [])
+
+
+class ProfileQuoteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="quote@example.com",
+            password="password123",
+            first_name="Alice",
+            last_name="Marchand",
+        )
+        self.client.login(email="quote@example.com", password="password123")
+        self.profile = {
+            "first_name": "Alice",
+            "last_name": "Marchand",
+            "age": 30,
+            "gender": "female",
+            "height": 1.65,
+            "weight": 60,
+            "children": 1,
+            "region": "northwest",
+        }
+
+    def test_saving_insurance_fields_stores_a_quote(self):
+        self.client.post(reverse("accounts:profile"), self.profile)
+
+        self.user.refresh_from_db()
+        self.assertGreater(self.user.quote, 0)
+        self.assertLess(self.user.quote_range_lower, self.user.quote)
+        self.assertEqual(self.user.quote_model_version, model_version())
+
+        # Lecture : devis affiché sans appel au modèle
+        with patch("predict.quotes.predict_charges") as predict:
+            response = self.client.get(reverse("accounts:profile"))
+            predict.assert_not_called()
+
+        self.assertEqual(response.context["quote"]["prediction"], self.user.quote)
+        self.assertContains(response, "Devis actuel")
+
+    def test_saving_other_fields_does_not_rescore(self):
+        self.client.post(reverse("accounts:profile"), self.profile)
+
+        with patch("predict.quotes.predict_charges") as predict:
+            self.client.post(reverse("accounts:profile"), {**self.profile, "first_name": "Alicia"})
+            predict.assert_not_called()
+
+    def test_incomplete_profile_has_no_quote(self):
+        self.client.post(reverse("accounts:profile"), {**self.profile, "region": ""})
+
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.quote)
+        self.assertIsNone(self.client.get(reverse("accounts:profile")).context["quote"])
+
+    def test_quote_from_another_model_version_is_hidden(self):
+        self.client.post(reverse("accounts:profile"), self.profile)
+        User.objects.filter(pk=self.user.pk).update(quote_model_version="ancienne")
+        cache.delete(user_cache_key(self.user.pk))
+
+        self.assertIsNone(self.client.get(reverse("accounts:profile")).context["quote"])
+
+    def test_invalid_profile_is_rendered_with_errors(self):
+        response = self.client.post(reverse("accounts:profile"), {**self.profile, "age": "abc"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("age", response.context["form"].errors)
+
@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.views.generic import FormView, RedirectView
+from predict.quotes import QUOTE_FIELDS, current_quote, refresh_quote
 from .forms import CustomAuthenticationForm, CustomUserCreationForm, UserProfileForm
 
 
@@ -64,11 +65,21 @@ def profile(request):
     if request.method == "POST":
         form = UserProfileForm(request.POST, instance=request.user)
         if form.is_valid():
-            form.save()
+            user = form.save()
+
+            # Devis recalculé ici, une fois, plutôt qu'à chaque affichage
+            if set(form.changed_data) & set(QUOTE_FIELDS):
+                refresh_quote(user)
+
             messages.success(request, "Profil mis à jour avec succès !")
             return redirect("accounts:profile")
         else:
             messages.error(request, "Erreur lors de la mise à jour.")
     else:
         form = UserProfileForm(instance=request.user)
-        return render(request, "accounts/profile.html", {"user": request.user, "form": form})
\ No newline at end of file
+
+    return render(request, "accounts/profile.html", {
+        "user": request.user,
+        "form": form,
+        "quote": current_quote(request.user),
+    })
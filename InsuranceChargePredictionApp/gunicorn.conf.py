@@ -0,0 +1,37 @@
+"""
+Configuration gunicorn (chargée automatiquement depuis ce répertoire) :
+
+    gunicorn InsuranceChargePredictionApp.wsgi
+
+Chaque worker bride ses threads natifs puis préchauffe le modèle avant
+d'accepter des requêtes. /predict/ready/ renvoie 200 une fois le worker prêt.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count())))
+# Le modèle est chargé après le fork : pas de pages partagées copiées à l'écriture
+preload_app = False
+
+# Threads BLAS/OpenMP par worker : avec un worker par cœur, 1 évite la sur-souscription
+native_threads = int(os.getenv('PREDICT_NATIVE_THREADS', '1'))
+
+
+def post_fork(server, worker):
+    # Avant l'import de numpy dans le worker (l'application n'est pas encore chargée)
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(native_threads)
+
+
+def post_worker_init(worker):
+    # Application chargée, le worker n'accepte pas encore de connexions
+    from predict.warmup import limit_native_threads, warm_up
+
+    threads = limit_native_threads(native_threads)
+    duration = warm_up()
+    if duration is None:
+        # Erreur déjà journalisée : le worker sert les pages, /predict/ready/ reste à 503
+        worker.log.warning("Modèle non préchauffé (threads natifs : %s)", threads)
+    else:
+        worker.log.info("Modèle préchauffé en %.1f ms (threads natifs : %s)", duration, threads)
@@ -1,5 +1,151 @@
 from django.contrib import admin
-from .models import ClientInfos, Predictions
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+from .models import ClientInfos, Job, Predictions
 
-admin.site.register(Predictions)
-admin.site.register(ClientInfos)
\ No newline at end of file
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator qui évite le COUNT(*) complet sur les grosses tables.
+
+    Sans filtre, le nombre de lignes est estimé par la plus grande clé primaire
+    (lecture directe de l'index) : une page au-delà des données renvoie la dernière page
+    réelle, le total étant alors compté. Avec filtre, le comptage s'arrête `count_window`
+    lignes après la page demandée : la fenêtre avance avec la navigation, toutes les
+    lignes restent accessibles. `estimated` indique un total approché (affiché « environ »).
+    """
+
+    count_window = 10000
+
+    def __init__(self, *args, current_page=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.current_page = current_page
+        self.estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+
+        if not queryset.query.where:
+            self.estimated = True
+            return queryset.model._default_manager.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+
+        limit = self.current_page * self.per_page + self.count_window
+        count = queryset[:limit + 1].count()
+        self.estimated = count > limit
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if int(number) < 1:
+                raise
+            return self.num_pages
+
+    def page(self, number):
+        page = super().page(number)
+
+        if page.number > 1 and not page.object_list:
+            # Estimation trop haute (clés supprimées) : total réel, et sa dernière page
+            self.count = self.object_list.count()
+            self.__dict__.pop('num_pages', None)
+            self.estimated = False
+            page = super().page(self.num_pages)
+
+        return page
+
+
+class EstimatedCountChangeList(ChangeList):
+
+    def get_results(self, request):
+        super().get_results(request)
+
+        # Total éventuellement corrigé par paginator.page(), page ramenée à la dernière réelle
+        self.result_count = self.paginator.count
+        self.multi_page = self.result_count > self.list_per_page
+        self.can_show_all = self.result_count <= self.list_max_show_all
+        self.page_num = self.paginator.validate_number(self.page_num)
+
+
+class EstimatedCountMixin:
+    """Liste paginée sans COUNT(*) complet (EstimatedCountPaginator)."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return EstimatedCountChangeList
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            current_page = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            current_page = 1
+
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, current_page=current_page)
+
+
+def prefix_search(queryset, field, term):
+    """Recherche par préfixe sous forme d'intervalle, pour rester sur l'index de `field`."""
+    return queryset.filter(**{f'{field}__gte': term, f'{field}__lt': term + '\uffff'})
+
+
+class ScalableSearchMixin:
+    """Recherche restreinte aux index : email exact, ou préfixe du nom de famille."""
+
+    email_field = 'email'
+    last_name_field = 'last_name'
+    search_help_text = 'Email complet, ou début du nom de famille (ex : Dup).'
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+
+        if not term:
+            return queryset, False
+
+        if '@' in term:
+            return queryset.filter(**{self.email_field: term}), False
+
+        # Les noms sont enregistrés capitalisés par la vue de prédiction
+        return prefix_search(queryset, self.last_name_field, term.capitalize()), False
+
+
+@admin.register(Predictions)
+class PredictionsAdmin(EstimatedCountMixin, ScalableSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'date', 'client', 'prediction', 'region', 'smoker', 'created_by')
+    list_select_related = ('client',)
+    list_filter = ('region', 'smoker')
+    date_hierarchy = 'date'
+    search_fields = ('client__email', 'client__last_name')
+    email_field = 'client__email'
+    last_name_field = 'client__last_name'
+    raw_id_fields = ('client', 'created_by')
+    readonly_fields = ('date',)
+
+    def get_queryset(self, request):
+        # Utilisateurs sur une autre base : pas de jointure possible, une requête groupée
+        return super().get_queryset(request).prefetch_related('created_by')
+
+
+@admin.register(ClientInfos)
+class ClientInfosAdmin(EstimatedCountMixin, ScalableSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'last_name', 'first_name', 'email', 'user')
+    list_select_related = ()
+    search_fields = ('email', 'last_name')
+    raw_id_fields = ('user',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('user')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'state', 'progress', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('state', 'kind')
+    raw_id_fields = ('created_by',)
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at', 'worker')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('created_by')
@@ -0,0 +1,108 @@
+import hmac
+import math
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .forms import PredictionForm, normalize_name
+
+
+SCORE_FIELDS = ('age', 'gender', 'smoker', 'weight', 'height', 'children', 'region')
+CLIENT_FIELDS = ('first_name', 'last_name', 'email')
+
+
+def _compile_rule(name, field):
+    """Règle (nom, type, choix, min, max, pas, messages) tirée d'un champ de PredictionForm."""
+    messages = {code: str(message) for code, message in field.error_messages.items()}
+
+    if isinstance(field, forms.ChoiceField):
+        choices = frozenset(value for value, _ in field.choices if value)
+        return (name, 'choice', choices, None, None, None, messages)
+
+    # FloatField hérite d'IntegerField : tester le flottant en premier
+    kind = 'float' if isinstance(field, forms.FloatField) else 'int'
+    return (name, kind, None, field.min_value, field.max_value, field.step_size, messages)
+
+
+# Compilé une fois au chargement : mêmes bornes et mêmes messages que le formulaire HTML
+SCORE_SCHEMA = tuple(_compile_rule(name, PredictionForm.base_fields[name]) for name in SCORE_FIELDS)
+
+
+def _check_value(kind, choices, min_value, max_value, step, value):
+    """Renvoie (valeur convertie, None) ou (None, code d'erreur)."""
+    if kind == 'choice':
+        if not isinstance(value, str) or value not in choices:
+            return None, 'invalid_choice'
+        return value, None
+
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return None, 'invalid'
+
+    if kind == 'int':
+        if isinstance(value, float) and not value.is_integer():
+            return None, 'invalid'
+        value = int(value)
+    else:
+        value = float(value)
+
+    if min_value is not None and value < min_value:
+        return None, 'min_value'
+
+    if max_value is not None and value > max_value:
+        return None, 'max_value'
+
+    # Même tolérance que StepValueValidator
+    if step is not None and not math.isclose(math.remainder(value, step), 0, abs_tol=1e-9):
+        return None, 'step_size'
+
+    return value, None
+
+
+def validate_score_payload(payload):
+    """Valide les caractéristiques du client. Renvoie (données, erreurs par champ)."""
+    data, errors = {}, {}
+
+    for name, kind, choices, min_value, max_value, step, messages in SCORE_SCHEMA:
+        value = payload.get(name)
+
+        if value is None or value == '':
+            errors[name] = [messages['required']]
+            continue
+
+        value, code = _check_value(kind, choices, min_value, max_value, step, value)
+        if code:
+            errors[name] = [messages[code]]
+        else:
+            data[name] = value
+
+    return data, errors
+
+
+def validate_client_payload(payload):
+    """Identité du client, requise seulement pour enregistrer la prédiction."""
+    data, errors = {}, {}
+
+    for name in CLIENT_FIELDS:
+        try:
+            data[name] = PredictionForm.base_fields[name].clean(payload.get(name))
+        except ValidationError as error:
+            errors[name] = error.messages
+
+    # Mêmes noms normalisés qu'avec le formulaire
+    for name in ('first_name', 'last_name'):
+        if name in data:
+            data[name] = normalize_name(data[name])
+
+    return data, errors
+
+
+def check_api_token(authorization):
+    """Vérifie un en-tête `Authorization: Bearer <jeton>` contre settings.PREDICT_API_TOKENS."""
+    scheme, _, token = authorization.partition(' ')
+    token = token.strip()
+
+    if scheme.lower() != 'bearer' or not token:
+        return False
+
+    return any(hmac.compare_digest(token.encode(), expected.encode()) for expected in settings.PREDICT_API_TOKENS)
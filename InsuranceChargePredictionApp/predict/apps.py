@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PredictConfig(AppConfig):
     name = 'predict'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
+
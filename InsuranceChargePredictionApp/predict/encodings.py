@@ -0,0 +1,135 @@
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.functional import cached_property
+
+
+# Code entier de chaque catégorie = sa position dans l'encodeur du modèle (ordre alphabétique),
+# ce qui garde aussi l'ordre de tri des anciennes colonnes texte
+GENDER_CODES = {'female': 0, 'male': 1}
+SMOKER_CODES = {'no': 0, 'yes': 1}
+REGION_CODES = {'northeast': 0, 'northwest': 1, 'southeast': 2, 'southwest': 3}
+
+# Colonnes catégorielles du modèle, dans l'ordre de l'encodeur
+CATEGORY_CODES = (('sex', GENDER_CODES), ('smoker', SMOKER_CODES), ('region', REGION_CODES))
+
+
+class CodedChoiceField(models.PositiveSmallIntegerField):
+    """Choix stocké en petit entier, manipulé en Python sous sa valeur texte ('female', 'yes'...).
+
+    Formulaires, filtres (`region='southeast'`), exports et libellés des choix sont inchangés ;
+    seuls la colonne et ses index rétrécissent.
+    """
+
+    description = 'Choix stocké sous forme de code entier'
+
+    def __init__(self, *args, codes=None, **kwargs):
+        self.codes = dict(codes or {})
+        self.values = {code: value for value, code in self.codes.items()}
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['codes'] = self.codes
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self):
+        # Pas de bornes d'entier : la valeur Python est le texte, vérifié par les choix
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self.values[value]
+
+    def to_python(self, value):
+        if value is None or value in self.codes:
+            return value
+
+        if isinstance(value, int) and value in self.values:
+            return self.values[value]
+
+        raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value})
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, models.expressions.Combinable):
+            return value
+
+        if value in self.codes:
+            return self.codes[value]
+
+        if isinstance(value, int) and value in self.values:
+            return value
+
+        raise ValueError(f"Valeur inconnue pour {self.name} : {value!r}")
+
+
+def compute_bmi(weight, height):
+    """IMC arrondi comme à l'entraînement du modèle, None si le poids ou la taille manquent."""
+    if not weight or not height or height <= 0:
+        return None
+
+    return round(weight / (height ** 2), 2)
+
+
+class BMIField(models.FloatField):
+    """IMC enregistré (et indexable), recalculé à chaque écriture de la ligne par compute_bmi.
+
+    Les écritures qui ne passent pas par l'instance (QuerySet.update, bulk_update) doivent
+    le recalculer elles-mêmes.
+    """
+
+    def __init__(self, *args, weight_field='weight', height_field='height', **kwargs):
+        self.weight_field = weight_field
+        self.height_field = height_field
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        for attribute, default in (('weight_field', 'weight'), ('height_field', 'height')):
+            if getattr(self, attribute) != default:
+                kwargs[attribute] = getattr(self, attribute)
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        # Appelé aussi par bulk_create
+        value = compute_bmi(getattr(model_instance, self.weight_field), getattr(model_instance, self.height_field))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def model_categories_match(model):
+    """Vrai si le modèle est le pipeline attendu et que son encodeur utilise exactement
+    les catégories (et l'ordre) des codes. Sinon, passer par le pipeline complet."""
+    try:
+        encoder = model.named_steps['preprocessing'].named_transformers_['cat']
+        categories = [list(categories) for categories in encoder.categories_]
+    except (AttributeError, KeyError, TypeError):
+        return False
+
+    return categories == [list(codes) for _, codes in CATEGORY_CODES]
+
+
+def encode_codes(model, age, bmi, children, gender, smoker, region):
+    """Matrice d'entrée du régresseur à partir de colonnes numériques et de codes entiers.
+
+    Équivalent du préprocesseur du pipeline (standardisation, puis one-hot sans la
+    première catégorie) sans DataFrame ni comparaison de chaînes.
+    """
+    scaler = model.named_steps['preprocessing'].named_transformers_['num']
+    numeric = np.column_stack([age, bmi, children]).astype(np.float64)
+    numeric -= scaler.mean_
+    numeric /= scaler.scale_
+
+    one_hot = [
+        (np.asarray(codes)[:, None] == np.arange(1, len(categories))).astype(np.float64)
+        for codes, (_, categories) in zip((gender, smoker, region), CATEGORY_CODES)
+    ]
+    return np.hstack([numeric, *one_hot])
+
+
+def predict_codes(model, age, bmi, children, gender, smoker, region):
+    """Prédictions brutes (non arrondies) pour des colonnes de codes."""
+    return model.steps[-1][1].predict(encode_codes(model, age, bmi, children, gender, smoker, region))
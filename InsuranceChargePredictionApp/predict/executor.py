@@ -0,0 +1,54 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class PredictionBusyError(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+
+
+def get_executor():
+    """Pool de threads dédié au modèle, créé au premier appel avec la taille des settings."""
+    global _executor, _slots
+
+    with _lock:
+        if _executor is None:
+            workers = settings.PREDICT_EXECUTOR_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='predict')
+            _slots = threading.BoundedSemaphore(workers + settings.PREDICT_EXECUTOR_MAX_PENDING)
+
+    return _executor, _slots
+
+
+def shutdown_executor():
+    """Arrête le pool (il sera recréé, avec les settings courants, au prochain appel)."""
+    global _executor, _slots
+
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = _slots = None
+
+
+async def run_prediction(func, *args):
+    """Exécute `func(*args)` dans le pool dédié sans bloquer la boucle d'événements.
+
+    Au-delà de PREDICT_EXECUTOR_WORKERS + PREDICT_EXECUTOR_MAX_PENDING appels en cours,
+    l'appel est refusé tout de suite plutôt que d'allonger indéfiniment la file.
+    """
+    executor, slots = get_executor()
+
+    if not slots.acquire(blocking=False):
+        raise PredictionBusyError('Le service de prédiction est saturé.')
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        slots.release()
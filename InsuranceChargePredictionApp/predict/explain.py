@@ -0,0 +1,168 @@
+import logging
+import os
+import tempfile
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES, encode_codes, model_categories_match
+from .services import ModelNotFoundError, load_model, model_version, validated_bmi
+
+
+logger = logging.getLogger(__name__)
+
+# Champs du formulaire auxquels les contributions sont ramenées, et colonne d'origine
+# de chaque variable du préprocesseur
+FIELDS = ('age', 'bmi', 'children', 'gender', 'smoker', 'region')
+FIELD_LABELS = {'age': 'Âge', 'bmi': 'IMC', 'children': 'Enfants', 'gender': 'Genre', 'smoker': 'Fumeur', 'region': 'Région'}
+SOURCE_FIELDS = {'sex': 'gender'}
+
+
+def build_path_tables(pipeline):
+    """Arbres du modèle à plat, avec pour chaque nœud l'écart de valeur attendue avec son parent.
+
+    Contributions de Saabas : en suivant le chemin d'une ligne dans un arbre, chaque
+    séparation déplace la valeur attendue du parent vers l'enfant ; cet écart (multiplié par
+    le taux d'apprentissage) est attribué à la variable de la séparation. La somme des
+    contributions et de la valeur de départ redonne exactement la prédiction.
+    """
+    preprocessing = pipeline.named_steps['preprocessing']
+    model = pipeline.named_steps['model']
+
+    if model.loss != 'squared_error' or not hasattr(model.init_, 'constant_'):
+        raise ValueError("Seul un GradientBoostingRegressor (perte quadratique, init constante) est explicable.")
+
+    # Champ du formulaire de chaque colonne encodée
+    columns = list(preprocessing.transformers_[0][2])
+    categorical = preprocessing.named_transformers_['cat']
+    for i, (feature, categories) in enumerate(zip(preprocessing.transformers_[1][2], categorical.categories_)):
+        dropped = 0 if categorical.drop_idx_ is None or categorical.drop_idx_[i] is None else 1
+        columns += [SOURCE_FIELDS.get(feature, feature)] * (len(categories) - dropped)
+
+    learning_rate = model.learning_rate
+    roots, feature, threshold, left, right, gain = [], [], [], [], [], []
+    base = float(model.init_.constant_[0][0])
+    offset = 0
+
+    for estimator in model.estimators_[:, 0]:
+        tree = estimator.tree_
+        value = tree.value[:, 0, 0]
+        node_gain = np.zeros(tree.node_count)
+
+        for node in range(tree.node_count):
+            for child in (tree.children_left[node], tree.children_right[node]):
+                if child != -1:
+                    node_gain[child] = learning_rate * (value[child] - value[node])
+
+        roots.append(offset)
+        base += learning_rate * value[0]
+        feature.append(tree.feature)
+        threshold.append(tree.threshold)
+        left.append(np.where(tree.children_left == -1, -1, tree.children_left + offset))
+        right.append(np.where(tree.children_right == -1, -1, tree.children_right + offset))
+        gain.append(node_gain)
+        offset += tree.node_count
+
+    return {
+        'roots': np.asarray(roots, dtype=np.int32),
+        # Feuilles : -2 dans scikit-learn, ramené à -1
+        'feature': np.maximum(np.concatenate(feature), -1).astype(np.int32),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'gain': np.concatenate(gain),
+        'columns': np.asarray([FIELDS.index(column) for column in columns], dtype=np.int8),
+        'base': np.float64(base),
+    }
+
+
+def _save(tables, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Fichier temporaire propre à cet appel : deux workers ne s'écrivent pas l'un sur l'autre
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', suffix='.part', delete=False) as output:
+        try:
+            np.savez(output, **tables)
+        except BaseException:
+            os.unlink(output.name)
+            raise
+    os.replace(output.name, path)
+
+
+@lru_cache(maxsize=1)
+def _path_tables(version, path):
+    if path is not None and path.exists():
+        try:
+            with np.load(path) as archive:
+                if str(archive['model_version']) == version:
+                    return dict(archive)
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            logger.warning('Tables des chemins illisibles (%s) : recalculées', path)
+
+    tables = build_path_tables(load_model())
+    tables['model_version'] = np.asarray(version)
+
+    if path is not None:
+        try:
+            _save(tables, path)
+        except OSError:
+            logger.exception('Sauvegarde des tables des chemins impossible')
+
+    return tables
+
+
+def load_path_tables():
+    """Tables des chemins du modèle déployé : relues de PREDICT_EXPLAIN_TABLES_PATH si elles
+    correspondent à sa version, sinon calculées (predict.warmup le fait au démarrage)."""
+    path = settings.PREDICT_EXPLAIN_TABLES_PATH
+    return _path_tables(model_version(), Path(path) if path else None)
+
+
+def contributions(tables, row):
+    """Contribution de chaque champ (ordre de FIELDS) pour une ligne encodée, tous arbres à la fois."""
+    feature, threshold, gain = tables['feature'], tables['threshold'], tables['gain']
+    # Comparaisons en float32, comme les arbres de scikit-learn
+    row = np.asarray(row, dtype=np.float32)
+    totals = np.zeros(len(FIELDS))
+    nodes = tables['roots'].copy()
+
+    while True:
+        split = feature[nodes] >= 0
+        if not split.any():
+            return totals
+
+        current = nodes[split]
+        features = feature[current]
+        children = np.where(row[features] <= threshold[current], tables['left'][current], tables['right'][current])
+        np.add.at(totals, tables['columns'][features], gain[children])
+        nodes[split] = children
+
+
+def explain_prediction(age, gender, smoker, weight, height, children, region):
+    """Part de chaque champ dans la prédiction, depuis les chemins suivis dans les arbres.
+
+    Renvoie {'base': valeur de départ du modèle, 'contributions': [{'field', 'label', 'value'}]}
+    (les plus fortes d'abord, en valeur absolue), ou None si le modèle n'est pas explicable.
+    """
+    try:
+        pipeline = load_model()
+        tables = load_path_tables()
+    except (FileNotFoundError, ModelNotFoundError, ValueError):
+        return None
+
+    if not model_categories_match(pipeline):
+        return None
+
+    row = encode_codes(pipeline, [age], [validated_bmi(weight, height)], [children],
+                       [GENDER_CODES[gender]], [SMOKER_CODES[smoker]], [REGION_CODES[region]])[0]
+    totals = contributions(tables, row)
+
+    return {
+        'base': round(float(tables['base']), 2),
+        'contributions': sorted(
+            ({'field': field, 'label': FIELD_LABELS[field], 'value': round(float(value), 2)}
+             for field, value in zip(FIELDS, totals)),
+            key=lambda contribution: -abs(contribution['value'])),
+    }
@@ -0,0 +1,81 @@
+import csv
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Predictions
+
+
+# Colonnes exportées : (en-tête CSV, lookup ORM). Les jointures restent limitées à ClientInfos.
+EXPORT_COLUMNS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('client_first_name', 'client__first_name'),
+    ('client_last_name', 'client__last_name'),
+    ('client_email', 'client__email'),
+    ('created_by_id', 'created_by_id'),
+    ('age', 'age'),
+    ('gender', 'gender'),
+    ('weight', 'weight'),
+    ('height', 'height'),
+    ('children', 'children'),
+    ('smoker', 'smoker'),
+    ('region', 'region'),
+    ('prediction', 'prediction'),
+    ('range_lower', 'range_lower'),
+    ('range_upper', 'range_upper'),
+]
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Pseudo-buffer pour csv.writer : renvoie la ligne au lieu de la stocker."""
+
+    def write(self, value):
+        return value
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_predictions(start=None, end=None, region=None):
+    """Filtre les prédictions sur une plage de dates (bornes incluses) et une région.
+
+    Les bornes sont converties en datetimes pour comparer directement la colonne
+    `date` plutôt qu'une expression calculée sur celle-ci.
+    """
+    queryset = Predictions.objects.all()
+
+    if start:
+        queryset = queryset.filter(date__gte=_start_of_day(start))
+
+    if end:
+        queryset = queryset.filter(date__lt=_start_of_day(end + timedelta(days=1)))
+
+    if region:
+        queryset = queryset.filter(region=region)
+
+    return queryset
+
+
+def iter_export_rows(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Génère l'en-tête puis les lignes, lues par paquets de `chunk_size`."""
+    yield [header for header, _ in EXPORT_COLUMNS]
+
+    rows = (
+        queryset
+        .order_by('pk')
+        .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield row
+
+
+def stream_csv(rows):
+    """Convertit un itérable de lignes en morceaux de texte CSV, sans rien accumuler."""
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow(row)
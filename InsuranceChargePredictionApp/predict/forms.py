@@ -1,5 +1,18 @@
+import secrets
+
 from django import forms
 
+from .portfolio import decode_cursor
+
+
+def new_submission_token():
+    return secrets.token_urlsafe(16)
+
+
+def normalize_name(value):
+    """Prénom ou nom tel qu'enregistré dans ClientInfos (clé unique du client)."""
+    return value.capitalize()
+
 class PredictionForm(forms.Form):
     """ Formulaire pour générer une prédiction des charges d'assurance. """
     
@@ -105,3 +118,112 @@ class PredictionForm(forms.Form):
             'required': 'Veuillez sélectionner une région.',
             'invalid_choice': 'Ce choix n\'est pas valide.'
         })
+
+    # Nouveau jeton à chaque affichage : une soumission renvoyée réutilise le résultat enregistré
+    submission_token = forms.CharField(
+        required=False,
+        max_length=64,
+        initial=new_submission_token,
+        widget=forms.HiddenInput)
+
+    def clean_first_name(self):
+        return normalize_name(self.cleaned_data['first_name'])
+
+    def clean_last_name(self):
+        return normalize_name(self.cleaned_data['last_name'])
+
+
+class PredictionExportForm(forms.Form):
+    """ Filtres de l'export CSV des prédictions. """
+
+    start = forms.DateField(
+        label='Du',
+        required=False,
+        error_messages={'invalid': 'La date de début doit être au format AAAA-MM-JJ.'})
+
+    end = forms.DateField(
+        label='Au',
+        required=False,
+        error_messages={'invalid': 'La date de fin doit être au format AAAA-MM-JJ.'})
+
+    region = forms.ChoiceField(
+        label='Région',
+        required=False,
+        choices=PredictionForm.REGION_CHOICES,
+        error_messages={'invalid_choice': 'Ce choix n\'est pas valide.'})
+
+    chunk_size = forms.IntegerField(
+        label='Taille des lots',
+        required=False,
+        min_value=1,
+        max_value=50000,
+        error_messages={
+            'min_value': 'La taille des lots doit être positive.',
+            'max_value': 'La taille des lots ne peut pas dépasser 50000.',
+            'invalid': 'La taille des lots doit être un nombre entier.'
+        })
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+
+        if start and end and start > end:
+            raise forms.ValidationError('La date de début doit précéder la date de fin.')
+
+        return cleaned_data
+
+
+class PortfolioForm(forms.Form):
+    """ Filtres et tri du portefeuille conseiller. """
+
+    SORT_CHOICES = [('-date', 'Plus récentes'), ('-charge', 'Charges décroissantes'), ('charge', 'Charges croissantes')]
+
+    region = forms.ChoiceField(
+        label='Région',
+        required=False,
+        choices=PredictionForm.REGION_CHOICES,
+        error_messages={'invalid_choice': 'Ce choix n\'est pas valide.'})
+
+    smoker = forms.ChoiceField(
+        label='Fumeur',
+        required=False,
+        choices=PredictionForm.SMOKER_CHOICES,
+        error_messages={'invalid_choice': 'Ce choix n\'est pas valide.'})
+
+    sort = forms.ChoiceField(
+        label='Tri',
+        required=False,
+        choices=SORT_CHOICES,
+        error_messages={'invalid_choice': 'Ce choix n\'est pas valide.'})
+
+    after = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean_sort(self):
+        return self.cleaned_data['sort'] or '-date'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        after = cleaned_data.get('after')
+
+        if after and cleaned_data.get('sort'):
+            try:
+                cleaned_data['after'] = decode_cursor(cleaned_data['sort'], after)
+            except ValueError:
+                raise forms.ValidationError('La page demandée est invalide.')
+        else:
+            cleaned_data['after'] = None
+
+        return cleaned_data
+
+
+
+class ScenarioForm(forms.Form):
+    """ Profil de base des courbes « et si » : mêmes champs et mêmes bornes que PredictionForm. """
+
+    age = PredictionForm.base_fields['age']
+    gender = PredictionForm.base_fields['gender']
+    smoker = PredictionForm.base_fields['smoker']
+    weight = PredictionForm.base_fields['weight']
+    height = PredictionForm.base_fields['height']
+    children = PredictionForm.base_fields['children']
+    region = PredictionForm.base_fields['region']
@@ -0,0 +1,39 @@
+import hashlib
+
+from django.core.cache import caches
+
+
+# Données du formulaire qui ne décrivent pas la demande elle-même
+IGNORED_FIELDS = ('submission_token',)
+
+
+def submission_key(token, data, user=None):
+    """Clé d'une soumission : jeton du formulaire et empreinte des valeurs envoyées.
+
+    Un formulaire ré-affiché garde son jeton : une nouvelle soumission avec des valeurs
+    modifiées a donc une autre clé, et elle est recalculée normalement.
+    """
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    values = sorted((name, value) for name, value in data.items() if name not in IGNORED_FIELDS)
+    digest = hashlib.sha256(repr((token, values, user_id)).encode()).hexdigest()
+    return f'predict:submission:{digest}'
+
+
+def _result(prediction, range_lower, range_upper):
+    return {'prediction': prediction, 'range_lower': range_lower, 'range_upper': range_upper}
+
+
+def get_submission(key):
+    return caches['idempotency'].get(key)
+
+
+def store_submission(key, prediction, range_lower, range_upper):
+    caches['idempotency'].set(key, _result(prediction, range_lower, range_upper))
+
+
+async def aget_submission(key):
+    return await caches['idempotency'].aget(key)
+
+
+async def astore_submission(key, prediction, range_lower, range_upper):
+    await caches['idempotency'].aset(key, _result(prediction, range_lower, range_upper))
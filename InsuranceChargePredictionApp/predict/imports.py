@@ -0,0 +1,251 @@
+import csv
+import math
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES
+from .forms import PredictionForm, normalize_name
+from .models import ClientInfos, Predictions
+from .services import validated_bmi
+
+
+DEFAULT_BATCH_SIZE = 5000
+INSERT_BATCH_SIZE = 500
+# Paramètres par requête IN (limite historique de SQLite : 999)
+LOOKUP_BATCH_SIZE = 500
+
+# Client rattaché aux lignes sans coordonnées (jeu de données d'assurance standard)
+HISTORICAL_CLIENT = ('Historique', 'Import', 'historique@import.invalid')
+# Taille retenue quand seul l'IMC est connu : le poids en est déduit
+REFERENCE_HEIGHT = 1.70
+
+# En-têtes acceptés : ceux de l'export de l'application et ceux du jeu de données standard
+COLUMN_ALIASES = {
+    'sex': 'gender',
+    'charges': 'prediction',
+    'client_first_name': 'first_name',
+    'client_last_name': 'last_name',
+    'client_email': 'email',
+}
+REQUIRED_COLUMNS = {'age', 'gender', 'smoker', 'children', 'region', 'prediction'}
+MAX_CHARGE = Decimal('1000000')
+
+
+class ImportFormatError(ValueError):
+    """Fichier inexploitable (colonnes manquantes)."""
+
+
+def _normalize_header(name):
+    name = name.strip().lower()
+    return COLUMN_ALIASES.get(name, name)
+
+
+def _choice(row, name, codes):
+    value = (row.get(name) or '').strip().lower()
+    if value not in codes:
+        raise ValueError(f'{name} invalide : {value!r}')
+    return value
+
+
+def _positive_int(row, name):
+    try:
+        value = int(float(row[name]))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{name} invalide : {row.get(name)!r}')
+
+    if value < 0:
+        raise ValueError(f'{name} négatif : {value}')
+    return value
+
+
+def _form_int(row, name):
+    """Entier borné comme le champ `name` du formulaire de prédiction (âge, enfants)."""
+    value = _positive_int(row, name)
+    field = PredictionForm.base_fields[name]
+
+    if not (field.min_value <= value <= field.max_value):
+        raise ValueError(f'{name} hors limites : {value}')
+    return value
+
+
+def _amount(row, name, required=False):
+    value = (row.get(name) or '').strip()
+    if not value:
+        if required:
+            raise ValueError(f'{name} manquant')
+        return None
+
+    try:
+        amount = Decimal(value)
+        if not amount.is_finite():
+            raise InvalidOperation
+        amount = amount.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'{name} invalide : {value!r}')
+
+    if not (0 <= amount < MAX_CHARGE):
+        raise ValueError(f'{name} hors limites : {amount}')
+    return amount
+
+
+def _body(row, reference_height):
+    """(poids, taille) de la ligne ; déduits de l'IMC et de la taille de référence à défaut."""
+    try:
+        if row.get('weight') and row.get('height'):
+            weight, height = float(row['weight']), float(row['height'])
+        else:
+            weight, height = float(row['bmi']) * reference_height ** 2, reference_height
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('poids et taille, ou IMC, manquants')
+
+    if not (math.isfinite(weight) and math.isfinite(height)):
+        raise ValueError('poids, taille ou IMC non fini')
+
+    # Mêmes bornes que le formulaire de prédiction
+    validated_bmi(weight, height)
+    return weight, height
+
+
+def _client_key(row):
+    first_name = (row.get('first_name') or '').strip()
+    last_name = (row.get('last_name') or '').strip()
+    email = (row.get('email') or '').strip()
+
+    if not (first_name or last_name or email):
+        return HISTORICAL_CLIENT
+
+    key = (normalize_name(first_name), normalize_name(last_name), email)
+    if not all(key) or max(len(key[0]), len(key[1])) > 50 or len(email) > 254:
+        raise ValueError('infos client incomplètes ou trop longues')
+    return key
+
+
+def parse_row(row, reference_height=REFERENCE_HEIGHT):
+    """(clé client, champs de la prédiction) d'une ligne du CSV ; ValueError si elle est invalide.
+
+    L'auteur (created_by_id) n'est vérifié qu'au niveau du lot, par _existing_users.
+    """
+    weight, height = _body(row, reference_height)
+
+    fields = {
+        'age': _form_int(row, 'age'),
+        'gender': _choice(row, 'gender', GENDER_CODES),
+        'smoker': _choice(row, 'smoker', SMOKER_CODES),
+        'region': _choice(row, 'region', REGION_CODES),
+        'children': _form_int(row, 'children'),
+        'weight': weight,
+        'height': height,
+        'prediction': _amount(row, 'prediction', required=True),
+        'range_lower': _amount(row, 'range_lower'),
+        'range_upper': _amount(row, 'range_upper'),
+    }
+
+    if row.get('date'):
+        date = parse_datetime(row['date'].strip())
+        if date is None:
+            raise ValueError(f"date invalide : {row['date']!r}")
+        fields['date'] = timezone.make_aware(date) if timezone.is_naive(date) else date
+
+    if row.get('created_by_id'):
+        fields['created_by_id'] = _positive_int(row, 'created_by_id')
+
+    return _client_key(row), fields
+
+
+def _resolve_clients(keys, known, db):
+    """Complète `known` (clé -> pk) avec les clients du lot, créés s'ils n'existent pas encore."""
+    missing = [key for key in keys if key not in known]
+    if not missing:
+        return
+
+    ClientInfos.objects.using(db).bulk_create(
+        [ClientInfos(first_name=first_name, last_name=last_name, email=email) for first_name, last_name, email in missing],
+        batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+
+    # ignore_conflicts ne renvoie pas les clés : relecture par email
+    emails = sorted({email for _, _, email in missing})
+    for start in range(0, len(emails), LOOKUP_BATCH_SIZE):
+        rows = (ClientInfos.objects.using(db)
+                .filter(email__in=emails[start:start + LOOKUP_BATCH_SIZE])
+                .values_list('pk', 'first_name', 'last_name', 'email'))
+        for pk, *key in rows:
+            known[tuple(key)] = pk
+
+
+def _existing_users(ids):
+    """Clés des utilisateurs existants parmi `ids` (base `default` : pas de contrainte SQL)."""
+    ids = sorted(ids)
+    users = get_user_model().objects
+    existing = set()
+    for start in range(0, len(ids), LOOKUP_BATCH_SIZE):
+        existing.update(users.filter(pk__in=ids[start:start + LOOKUP_BATCH_SIZE]).values_list('pk', flat=True))
+    return existing
+
+
+def import_predictions(lines, batch_size=DEFAULT_BATCH_SIZE, reference_height=REFERENCE_HEIGHT, on_error=None):
+    """Importe un CSV de prédictions historiques, lu et écrit par lots de `batch_size` lignes.
+
+    `lines` : fichier texte ouvert (ou tout itérable de lignes). Génère (lignes importées,
+    lignes ignorées : invalides ou déjà présentes) après chaque lot validé. Les clients sont
+    dédoublonnés sur leur clé unique, par la base (_resolve_clients relit ceux qui existent
+    déjà) : seul le lot courant et ses clients sont gardés en mémoire.
+    `on_error(numéro de ligne, message)` est appelé pour chaque ligne ignorée.
+    """
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+
+    reader.fieldnames = [_normalize_header(name) for name in reader.fieldnames]
+    missing = REQUIRED_COLUMNS - set(reader.fieldnames)
+    if missing:
+        raise ImportFormatError(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+    if not {'weight', 'height'} <= set(reader.fieldnames) and 'bmi' not in reader.fieldnames:
+        raise ImportFormatError('Colonnes manquantes : weight et height, ou bmi')
+
+    db = router.db_for_write(Predictions)
+
+    while True:
+        batch = list(islice(reader, batch_size))
+        if not batch:
+            return
+
+        first_line = reader.line_num - len(batch) + 1
+        parsed = []
+        for line, row in enumerate(batch, start=first_line):
+            try:
+                parsed.append((line, *parse_row(row, reference_height)))
+            except (ValueError, ArithmeticError) as error:
+                if on_error is not None:
+                    on_error(line, str(error))
+
+        authors = _existing_users({fields['created_by_id'] for _, _, fields in parsed if 'created_by_id' in fields})
+        rows = []
+        for line, key, fields in parsed:
+            author = fields.get('created_by_id')
+            if author is not None and author not in authors:
+                if on_error is not None:
+                    on_error(line, f'auteur inconnu : {author}')
+                continue
+            rows.append((key, fields))
+
+        with transaction.atomic(using=db):
+            # Index limité au lot : sa taille ne dépend pas de celle du fichier
+            known_clients = {}
+            _resolve_clients({key for key, _ in rows}, known_clients, db)
+
+            # ignore_conflicts ne dit pas quelles lignes ont été écartées : on compte les
+            # lignes insérées au-delà de la dernière clé
+            predictions = Predictions.objects.using(db)
+            last_pk = predictions.aggregate(last=Max('pk'))['last'] or 0
+            predictions.bulk_create(
+                [Predictions(client_id=known_clients[key], **fields) for key, fields in rows],
+                batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+            imported = predictions.filter(pk__gt=last_pk).count()
+
+        yield imported, len(batch) - imported
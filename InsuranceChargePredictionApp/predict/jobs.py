@@ -0,0 +1,198 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+# Type de tâche -> fonction handler(context, **params), enregistrée par @job_handler
+HANDLERS = {}
+
+
+def job_handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, params=None, user=None, max_attempts=3):
+    if kind not in HANDLERS:
+        raise ValueError(f"Type de tâche inconnu : {kind}")
+
+    return Job.objects.create(
+        kind=kind,
+        params=params or {},
+        created_by=user if user is not None and user.is_authenticated else None,
+        max_attempts=max_attempts,
+        run_after=timezone.now())
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next(worker):
+    """Prend la prochaine tâche exécutable, ou None.
+
+    Sur une base qui le permet : SELECT ... FOR UPDATE SKIP LOCKED. Sur SQLite (sans
+    verrou de ligne), prise par compare-and-set : l'UPDATE ne modifie la ligne que si
+    elle est toujours en attente, sinon un autre worker l'a prise et on passe à la suivante.
+    """
+    now = timezone.now()
+    pending = Job.objects.filter(state=Job.PENDING, run_after__lte=now).order_by('run_after', 'pk')
+    claim = {'state': Job.RUNNING, 'worker': worker, 'started_at': now, 'heartbeat_at': now}
+    db = router.db_for_write(Job)
+
+    if connections[db].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=db):
+            job = pending.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(attempts=F('attempts') + 1, **claim)
+        return Job.objects.get(pk=job.pk)
+
+    for pk in pending.values_list('pk', flat=True)[:10]:
+        if Job.objects.filter(pk=pk, state=Job.PENDING).update(attempts=F('attempts') + 1, **claim):
+            return Job.objects.get(pk=pk)
+
+    return None
+
+
+def requeue_stale():
+    """Remet en attente les tâches dont le worker ne donne plus signe de vie (arrêt brutal)."""
+    limit = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+    stale = Job.objects.filter(state=Job.RUNNING, heartbeat_at__lt=limit)
+
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        state=Job.FAILED, finished_at=timezone.now(), message='Worker arrêté pendant la tâche.')
+    requeued = stale.update(state=Job.PENDING, worker='', run_after=timezone.now())
+    return requeued + failed
+
+
+def owned(job):
+    """La tâche, tant qu'elle est en cours chez le worker qui l'a prise (pas reprise depuis)."""
+    return Job.objects.filter(pk=job.pk, worker=job.worker, state=Job.RUNNING)
+
+
+class Heartbeat(threading.Thread):
+    """Met à jour heartbeat_at pendant toute la tâche, même quand le handler ne reporte
+    pas d'avancement (une étape plus longue que JOB_STALE_AFTER la ferait reprendre)."""
+
+    def __init__(self, job):
+        super().__init__(name=f'heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.interval = max(settings.JOB_STALE_AFTER / 3, 0.1)
+        self._done = threading.Event()
+
+    def run(self):
+        try:
+            # Plus de ligne à nous : tâche reprise par un autre worker, inutile d'insister
+            while not self._done.wait(self.interval):
+                if not owned(self.job).update(heartbeat_at=timezone.now()):
+                    return
+        except Exception:
+            logger.exception('Battement de cœur de la tâche %s interrompu', self.job)
+        finally:
+            connections.close_all()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class JobContext:
+    """Passé au handler : la tâche, et le report d'avancement."""
+
+    min_interval = 1.0
+
+    def __init__(self, job):
+        self.job = job
+        self._last_report = 0.0
+
+    def progress(self, done, total=None, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.min_interval:
+            return
+
+        self._last_report = now
+        fields = {'progress_done': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            fields['progress_total'] = total
+        if message is not None:
+            fields['message'] = message
+
+        owned(self.job).update(**fields)
+
+
+def run_job(job):
+    """Exécute une tâche prise par claim_next. Renvoie True si elle a réussi.
+
+    L'état final n'est écrit que si la tâche est toujours à ce worker : une tâche reprise
+    entre-temps (requeue_stale) appartient à l'exécution qui l'a reprise.
+    """
+    handler = HANDLERS.get(job.kind)
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+
+    try:
+        try:
+            if handler is None:
+                raise LookupError(f"Type de tâche inconnu : {job.kind}")
+            result = handler(JobContext(job), **job.params)
+        finally:
+            heartbeat.stop()
+
+    except Exception as error:
+        logger.exception("Échec de la tâche %s (tentative %s/%s)", job, job.attempts, job.max_attempts)
+        now = timezone.now()
+
+        if job.attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            owned(job).update(
+                state=Job.PENDING, worker='', message=str(error), run_after=now + timedelta(seconds=delay))
+        else:
+            owned(job).update(state=Job.FAILED, message=str(error), finished_at=now)
+        return False
+
+    return bool(owned(job).update(
+        state=Job.SUCCEEDED,
+        result=result,
+        message='',
+        progress_done=Coalesce(F('progress_total'), F('progress_done')),
+        finished_at=timezone.now()))
+
+
+def run_worker(poll_interval=1.0, burst=False, should_stop=lambda: False):
+    """Boucle d'un worker : prend et exécute les tâches une à une.
+
+    En mode `burst`, s'arrête dès que la file est vide. Renvoie le nombre de tâches traitées.
+    """
+    worker = worker_name()
+    processed = 0
+
+    while not should_stop():
+        requeue_stale()
+        job = claim_next(worker)
+
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        run_job(job)
+        processed += 1
+
+    return processed
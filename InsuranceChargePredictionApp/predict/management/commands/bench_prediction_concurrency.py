@@ -0,0 +1,147 @@
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import path
+
+from InsuranceChargePredictionApp import urls as project_urls
+from predict.executor import shutdown_executor
+from predict.services import load_model, load_rmse
+from predict.views import AsyncPredictionView, PredictionView
+
+
+class BenchURLConf:
+    urlpatterns = project_urls.urlpatterns + [
+        path('bench/sync/', PredictionView.as_view()),
+        path('bench/async/', AsyncPredictionView.as_view()),
+    ]
+
+
+# (libellé, handler, URL) : la même vue synchrone sous WSGI et sous ASGI, puis la vue async
+MODES = [
+    ('WSGI sync', 'wsgi', '/bench/sync/'),
+    ('ASGI sync', 'asgi', '/bench/sync/'),
+    ('ASGI async', 'asgi', '/bench/async/'),
+]
+
+# Réponse JSON : on mesure le modèle, l'enregistrement et le modèle de concurrence, pas le rendu HTML
+HEADERS = {'X-Prediction-Fragment': 'json'}
+
+
+def _payload(i):
+    return {
+        'first_name': 'Bench',
+        'last_name': 'Client',
+        'email': f'bench{i}@bench.local',
+        'age': 18 + i % 60,
+        'gender': 'female' if i % 2 else 'male',
+        'smoker': 'yes' if i % 5 == 0 else 'no',
+        'weight': 60 + i % 40,
+        'height': 1.75,
+        'children': i % 4,
+        'region': 'southeast',
+    }
+
+
+def _is_error(response):
+    return response.status_code != 200 or response.json()['save_error']
+
+
+def run_wsgi(url, concurrency, requests):
+    """Un thread par client simultané, comme un serveur WSGI à threads."""
+    local = threading.local()
+
+    def call(i):
+        # Un client par thread : les middlewares ne sont chargés qu'une fois, comme dans un worker
+        if not hasattr(local, 'client'):
+            local.client = Client()
+
+        start = time.perf_counter()
+        response = local.client.post(url, _payload(i), headers=HEADERS)
+        return time.perf_counter() - start, _is_error(response)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(call, range(requests)))
+
+
+def run_asgi(url, concurrency, requests):
+    """Clients simultanés sur une seule boucle d'événements, comme un serveur ASGI."""
+    async def scenario():
+        client = AsyncClient()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def call(i):
+            async with gate:
+                start = time.perf_counter()
+                response = await client.post(url, _payload(i), headers=HEADERS)
+                return time.perf_counter() - start, _is_error(response)
+
+        return await asyncio.gather(*(call(i) for i in range(requests)))
+
+    return asyncio.run(scenario())
+
+
+class Command(BaseCommand):
+    help = ("Compare la vue de prédiction synchrone sous WSGI, synchrone sous ASGI et native "
+            "asynchrone sous ASGI, à plusieurs niveaux de concurrence. Les handlers Django sont "
+            "appelés dans le processus, sur des bases temporaires.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--levels', default='1,10,50,100,500',
+                            help='Niveaux de concurrence, séparés par des virgules.')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Requêtes par niveau (au moins le niveau de concurrence).')
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['levels'].split(',')]
+
+        # Modèle chargé avant la mesure : on compare les modes de service, pas le démarrage
+        load_model()
+        load_rmse()
+
+        with tempfile.TemporaryDirectory() as directory:
+            for alias in connections:
+                connections[alias].settings_dict['TEST']['NAME'] = os.path.join(directory, f'{alias}.sqlite3')
+
+            old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+            try:
+                # Les échecs d'enregistrement (traces de la vue) sont comptés, pas affichés
+                with override_settings(ROOT_URLCONF=BenchURLConf,
+                                       ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), \
+                        contextlib.redirect_stderr(io.StringIO()):
+                    self._run(levels, options['requests'])
+            finally:
+                shutdown_executor()
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+
+    def _run(self, levels, requests):
+        runners = {'wsgi': run_wsgi, 'asgi': run_asgi}
+
+        self.stdout.write(f"{'mode':<11} {'clients':>7} {'req/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'erreurs':>8}")
+        for label, handler, url in MODES:
+            for concurrency in levels:
+                count = max(requests, concurrency)
+
+                start = time.perf_counter()
+                results = runners[handler](url, concurrency, count)
+                elapsed = time.perf_counter() - start
+
+                latencies = sorted(latency * 1000 for latency, _ in results)
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                errors = sum(1 for _, error in results if error)
+
+                self.stdout.write(
+                    f"{label:<11} {concurrency:>7} {count / elapsed:>8.0f} "
+                    f"{statistics.median(latencies):>9.1f} {p95:>9.1f} {errors:>8}")
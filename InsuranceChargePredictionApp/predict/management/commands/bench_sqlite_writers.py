@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from InsuranceChargePredictionApp.sqlite import pragma_statements
+
+
+# Réglages SQLite par défaut avant optimisation (journal rollback, transactions différées)
+DEFAULT_PROFILE = {
+    'pragmas': {},
+    'begin': 'BEGIN',
+    'timeout': 5.0,
+}
+
+
+def _tuned_profile():
+    options = settings.DATABASES['default'].get('OPTIONS', {})
+    return {
+        'pragmas': settings.SQLITE_PRAGMAS,
+        'begin': f"BEGIN {options.get('transaction_mode') or 'DEFERRED'}",
+        'timeout': options.get('timeout', 5.0),
+    }
+
+
+def _create_schema(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE client (id INTEGER PRIMARY KEY, email TEXT NOT NULL UNIQUE);
+        CREATE TABLE prediction (
+            id INTEGER PRIMARY KEY,
+            client_id INTEGER NOT NULL REFERENCES client (id),
+            prediction REAL NOT NULL,
+            date TEXT NOT NULL
+        );
+    """)
+    conn.close()
+
+
+def _writer(path, profile, worker, writes, results):
+    """Rejoue le schéma d'écriture de form_valid : lecture puis insertion dans une transaction."""
+    conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None)
+    for statement in pragma_statements(profile['pragmas']):
+        conn.execute(statement)
+
+    ok = errors = 0
+    for i in range(writes):
+        email = f'client{worker}-{i}@bench.local'
+        try:
+            conn.execute(profile['begin'])
+            row = conn.execute('SELECT id FROM client WHERE email = ?', (email,)).fetchone()
+            client_id = row[0] if row else conn.execute(
+                'INSERT INTO client (email) VALUES (?)', (email,)).lastrowid
+            conn.execute(
+                "INSERT INTO prediction (client_id, prediction, date) VALUES (?, ?, datetime('now'))",
+                (client_id, 1000.0 + i))
+            conn.execute('COMMIT')
+            ok += 1
+        except sqlite3.OperationalError as error:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            if 'locked' not in str(error) and 'busy' not in str(error):
+                raise
+            errors += 1
+
+    conn.close()
+    results.put((ok, errors))
+
+
+def run_profile(profile, workers, writes, directory):
+    path = os.path.join(directory, f'bench-{time.monotonic_ns()}.sqlite3')
+    _create_schema(path)
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_writer, args=(path, profile, worker, writes, results))
+        for worker in range(workers)
+    ]
+
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    ok = sum(t[0] for t in totals)
+    errors = sum(t[1] for t in totals)
+    return {'ok': ok, 'errors': errors, 'elapsed': elapsed, 'throughput': ok / elapsed if elapsed else 0}
+
+
+class Command(BaseCommand):
+    help = ("Compare les écritures concurrentes sur SQLite avec les réglages par défaut "
+            "et avec les réglages de settings.SQLITE_PRAGMAS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Nombre de processus écrivains.')
+        parser.add_argument('--writes', type=int, default=200, help='Transactions par processus.')
+        parser.add_argument('--dir', help='Répertoire des bases temporaires (tmp par défaut).')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(dir=options['dir']) as directory:
+            rows = [
+                ('défaut', run_profile(DEFAULT_PROFILE, options['workers'], options['writes'], directory)),
+                ('optimisé', run_profile(_tuned_profile(), options['workers'], options['writes'], directory)),
+            ]
+
+        self.stdout.write(f"{options['workers']} écrivains x {options['writes']} transactions")
+        self.stdout.write(f"{'profil':<10} {'réussies':>9} {'verrous':>8} {'durée (s)':>10} {'écritures/s':>12}")
+        for name, result in rows:
+            self.stdout.write(
+                f"{name:<10} {result['ok']:>9} {result['errors']:>8} "
+                f"{result['elapsed']:>10.2f} {result['throughput']:>12.0f}")
@@ -0,0 +1,113 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from predict.imports import LOOKUP_BATCH_SIZE
+from predict.models import ClientInfos, Predictions
+
+
+DEFAULT_BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = ("Recopie les infos clients et prédictions restées dans la base `default` (avant le "
+            "passage à la base `predictions`) vers la base des prédictions. À lancer après "
+            "migrate_all ; les clients sont rapprochés sur (prénom, nom, email) et une relance "
+            "ne recopie pas les prédictions déjà présentes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='default',
+                            help='Base qui contient les anciennes tables predict_*.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Nombre de lignes insérées par transaction.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être positif.')
+
+        source = connections[options['source']]
+        self.target = router.db_for_write(Predictions)
+        if source.alias == self.target:
+            raise CommandError(f"La base source « {source.alias} » est déjà celle des prédictions.")
+
+        tables = set(source.introspection.table_names())
+        missing = {ClientInfos._meta.db_table, Predictions._meta.db_table} - tables
+        if missing:
+            self.stdout.write(f"Pas d'anciennes tables dans « {source.alias} » ({', '.join(sorted(missing))}) : rien à recopier.")
+            return
+
+        clients = self.copy_clients(source, options['batch_size'])
+        read, copied = self.copy_predictions(source, clients, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(clients)} client(s) rapproché(s), {copied} prédiction(s) recopiée(s) sur {read} '
+            f'({read - copied} déjà présente(s)).'))
+
+    def legacy_rows(self, source, model, batch_size, exclude=('bmi',)):
+        """Lignes de l'ancienne table du modèle, par lots de dicts (colonnes communes aux deux schémas)."""
+        table = model._meta.db_table
+        with source.cursor() as cursor:
+            legacy = {column.name for column in source.introspection.get_table_description(cursor, table)}
+        fields = [field for field in model._meta.concrete_fields if field.column in legacy and field.name not in exclude]
+        names = [field.attname for field in fields]
+
+        with source.cursor() as cursor:
+            cursor.execute('SELECT {} FROM {} ORDER BY {}'.format(
+                ', '.join(source.ops.quote_name(field.column) for field in fields),
+                source.ops.quote_name(table),
+                source.ops.quote_name(model._meta.pk.column)))
+
+            while rows := cursor.fetchmany(batch_size):
+                yield [dict(zip(names, row)) for row in rows]
+
+    def copy_clients(self, source, batch_size):
+        """Crée les clients absents de la base cible ; renvoie {ancienne clé : nouvelle clé}."""
+        manager = ClientInfos.objects.using(self.target)
+        clients = {}
+
+        for rows in self.legacy_rows(source, ClientInfos, batch_size):
+            with transaction.atomic(using=self.target):
+                manager.bulk_create([ClientInfos(**{name: value for name, value in row.items() if name != 'id'})
+                                     for row in rows], ignore_conflicts=True)
+
+            # Clés de la base cible : un client déjà présent garde la sienne
+            emails = sorted({row['email'] for row in rows})
+            known = {}
+            for start in range(0, len(emails), LOOKUP_BATCH_SIZE):
+                for pk, *key in (manager.filter(email__in=emails[start:start + LOOKUP_BATCH_SIZE])
+                                 .values_list('pk', 'first_name', 'last_name', 'email')):
+                    known[tuple(key)] = pk
+
+            for row in rows:
+                clients[row['id']] = known[row['first_name'], row['last_name'], row['email']]
+
+        return clients
+
+    def copy_predictions(self, source, clients, batch_size):
+        """Recopie les prédictions, rattachées aux clients de la base cible ; renvoie (lues, insérées)."""
+        manager = Predictions.objects.using(self.target)
+        before = manager.count()
+        read = 0
+
+        for rows in self.legacy_rows(source, Predictions, batch_size, exclude=('id', 'bmi')):
+            read += len(rows)
+            for row in rows:
+                row['client_id'] = clients[row['client_id']]
+                row['date'] = self.clean_date(row.get('date'))
+
+            # Contrainte (client, prédiction) : une relance n'ajoute pas de doublon
+            with transaction.atomic(using=self.target):
+                manager.bulk_create([Predictions(**row) for row in rows], ignore_conflicts=True)
+
+        return read, manager.count() - before
+
+    def clean_date(self, date):
+        # Lue en texte ou naïve (UTC) selon le pilote
+        if isinstance(date, str):
+            date = parse_datetime(date)
+        if isinstance(date, datetime) and timezone.is_naive(date):
+            date = timezone.make_aware(date, dt_timezone.utc)
+        return date or timezone.now()
@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from predict.model_export import LIVE_MODEL_ASSET, export_model
+from predict.services import MODEL_PATH, RMSE_PATH
+
+
+class Command(BaseCommand):
+    help = ("Exporte le modèle de prédiction en JSON compact pour l'estimation en direct "
+            "dans le navigateur. À relancer après chaque réentraînement, puis collectstatic.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help=f'Fichier de sortie (static/{LIVE_MODEL_ASSET} par défaut).')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'] or settings.BASE_DIR / 'static' / LIVE_MODEL_ASSET)
+
+        try:
+            pipeline = joblib.load(MODEL_PATH)
+        except FileNotFoundError:
+            raise CommandError(f"Modèle introuvable : {MODEL_PATH}")
+
+        rmse = joblib.load(RMSE_PATH) if RMSE_PATH.exists() else None
+
+        try:
+            exported = export_model(pipeline, rmse=rmse)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        content = json.dumps(exported, separators=(',', ':'))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(content, encoding='utf-8')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(exported['trees']['roots'])} arbres exportés dans {output} ({len(content)} octets)."))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from predict.exports import DEFAULT_CHUNK_SIZE, filter_predictions, iter_export_rows, stream_csv
+from predict.forms import PredictionExportForm
+
+
+class Command(BaseCommand):
+    help = "Exporte les prédictions et les infos clients associées au format CSV, par lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Date de début incluse (AAAA-MM-JJ).')
+        parser.add_argument('--end', help='Date de fin incluse (AAAA-MM-JJ).')
+        parser.add_argument('--region', help='Région (northeast, northwest, southeast, southwest).')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Nombre de lignes lues par requête.')
+        parser.add_argument('--output', '-o', help='Fichier de sortie (sortie standard par défaut).')
+
+    def handle(self, *args, **options):
+        form = PredictionExportForm({
+            'start': options['start'],
+            'end': options['end'],
+            'region': options['region'],
+            'chunk_size': options['chunk_size'],
+        })
+
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+
+        data = form.cleaned_data
+        queryset = filter_predictions(data['start'], data['end'], data['region'])
+        chunks = stream_csv(iter_export_rows(queryset, chunk_size=data['chunk_size']))
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                count = self._write(output.write, chunks)
+            self.stderr.write(self.style.SUCCESS(f"{count} prédiction(s) exportée(s) dans {options['output']}."))
+        else:
+            self._write(lambda chunk: self.stdout.write(chunk, ending=''), chunks)
+
+    def _write(self, write, chunks):
+        count = -1  # L'en-tête n'est pas une prédiction
+        for chunk in chunks:
+            write(chunk)
+            count += 1
+        return count
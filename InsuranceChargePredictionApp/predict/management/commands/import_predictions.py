@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from predict.imports import DEFAULT_BATCH_SIZE, REFERENCE_HEIGHT, ImportFormatError, import_predictions
+
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = ("Importe des prédictions historiques depuis un CSV (export de l'application ou jeu de "
+            "données d'assurance standard : age, sex, bmi, children, smoker, region, charges), "
+            "par lots insérés en masse.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Fichier CSV à importer.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Nombre de lignes lues et insérées par transaction.')
+        parser.add_argument('--reference-height', type=float, default=REFERENCE_HEIGHT,
+                            help="Taille (m) retenue pour les lignes qui n'ont que l'IMC.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size doit être positif.')
+
+        self.errors = 0
+        imported = skipped = 0
+        start = time.perf_counter()
+
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as lines:
+                batches = import_predictions(lines, batch_size=options['batch_size'],
+                                             reference_height=options['reference_height'],
+                                             on_error=self._report_error)
+                for batch_imported, batch_skipped in batches:
+                    imported += batch_imported
+                    skipped += batch_skipped
+                    if options['verbosity'] > 1:
+                        self.stderr.write(f'{imported + skipped} ligne(s) lue(s)...')
+        except (OSError, ImportFormatError) as error:
+            raise CommandError(str(error))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{imported} prédiction(s) importée(s), {skipped} ligne(s) ignorée(s) en {elapsed:.1f} s '
+            f'({(imported + skipped) / elapsed if elapsed else 0:.0f} lignes/s).'))
+
+    def _report_error(self, line, message):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Ligne {line} ignorée : {message}')
+        elif self.errors == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write('Autres erreurs non affichées.')
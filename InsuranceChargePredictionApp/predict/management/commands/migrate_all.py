@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from predict.models import Predictions
+
+
+class Command(BaseCommand):
+    help = "Applique les migrations sur chacune des bases déclarées dans settings.DATABASES."
+
+    def handle(self, *args, **options):
+        for alias in settings.DATABASES:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Base « {alias} »"))
+            call_command('migrate', database=alias, interactive=False,
+                         verbosity=options['verbosity'], stdout=self.stdout)
+
+        # Installation antérieure à la base `predictions` : historique resté dans `default`
+        if Predictions._meta.db_table in connections['default'].introspection.table_names():
+            self.stdout.write(self.style.WARNING(
+                "Anciennes tables predict_* trouvées dans la base « default » : "
+                "lancez `manage.py copy_legacy_predictions` pour recopier l'historique."))
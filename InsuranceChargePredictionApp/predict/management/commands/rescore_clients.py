@@ -0,0 +1,111 @@
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+
+def _init_scoring_process():
+    import django
+    django.setup()
+
+    from predict.services import load_model, load_rmse
+
+    load_model()
+    load_rmse()
+
+
+def _score_chunk(rows):
+    from predict.quotes import score_rows
+
+    return score_rows(rows)
+
+
+def pooled_scoring(pool, window):
+    """Équivalent de map() réparti sur `pool`, avec au plus `window` lots en cours.
+
+    Les lectures et écritures en base restent dans le processus principal, dans l'ordre
+    des lots : le point de reprise reste exact.
+    """
+    def score_chunks(func, chunks):
+        pending = deque()
+
+        for rows in chunks:
+            pending.append(pool.apply_async(_score_chunk, (rows,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+
+    return score_chunks
+
+
+class Command(BaseCommand):
+    help = ("Re-score les devis des clients après le déploiement d'un nouveau modèle : lecture "
+            "par lots, un appel vectorisé au modèle par lot, écriture groupée. Reprise possible "
+            "avec --checkpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Nombre de clients par lot.')
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Processus de scoring (la base reste dans le processus principal).')
+        parser.add_argument('--checkpoint',
+                            help='Fichier de reprise : dernier client traité, pour la version courante du modèle.')
+        parser.add_argument('--all', action='store_true', dest='rescore_all',
+                            help='Re-scorer aussi les devis déjà à jour.')
+
+    def handle(self, *args, **options):
+        from predict.quotes import rescore_clients
+        from predict.services import model_version
+
+        version = model_version()
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+        start_after = self._read_checkpoint(checkpoint, version)
+        if start_after:
+            self.stdout.write(f'Reprise après le client {start_after}.')
+
+        processes = options['processes']
+        batches = dict(chunk_size=options['chunk_size'], start_after=start_after,
+                       rescore_all=options['rescore_all'])
+
+        start = time.perf_counter()
+        total = 0
+
+        if processes > 1:
+            with multiprocessing.Pool(processes, initializer=_init_scoring_process) as pool:
+                for last_pk, count in rescore_clients(score_chunks=pooled_scoring(pool, processes * 2), **batches):
+                    total += count
+                    self._write_checkpoint(checkpoint, version, last_pk)
+        else:
+            for last_pk, count in rescore_clients(**batches):
+                total += count
+                self._write_checkpoint(checkpoint, version, last_pk)
+
+        # Passe terminée : la prochaine repartira des devis périmés
+        if checkpoint is not None and checkpoint.exists():
+            checkpoint.unlink()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{total} client(s) re-scoré(s) en {elapsed:.1f} s '
+                          f'({total / elapsed if elapsed else 0:.0f}/s), modèle {version}.')
+
+    def _read_checkpoint(self, checkpoint, version):
+        if checkpoint is None or not checkpoint.exists():
+            return 0
+
+        state = json.loads(checkpoint.read_text())
+        # Point de reprise d'une autre version du modèle : on repart du début
+        return state['last_pk'] if state.get('model_version') == version else 0
+
+    def _write_checkpoint(self, checkpoint, version, last_pk):
+        if checkpoint is None:
+            return
+
+        partial = checkpoint.with_suffix('.part')
+        partial.write_text(json.dumps({'model_version': version, 'last_pk': last_pk}))
+        os.replace(partial, checkpoint)
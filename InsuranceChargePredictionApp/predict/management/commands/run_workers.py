@@ -0,0 +1,68 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_process(stop, poll_interval, burst):
+    # Ctrl-C est envoyé à tout le groupe : seul le parent décide de l'arrêt,
+    # le worker termine la tâche en cours
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import django
+    django.setup()
+
+    from predict.jobs import run_worker
+
+    try:
+        run_worker(poll_interval=poll_interval, burst=burst, should_stop=stop.is_set)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Exécute les tâches de fond (predict.Job) avec N processus. La file est la table "
+            "des tâches elle-même : aucun broker externe n'est nécessaire.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Nombre de processus workers.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Attente (secondes) quand la file est vide.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Vider la file puis s\'arrêter.')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        poll_interval = options['poll_interval']
+        burst = options['burst']
+
+        if processes <= 1:
+            from predict.jobs import run_worker
+
+            processed = run_worker(poll_interval=poll_interval, burst=burst)
+            self.stdout.write(f'{processed} tâche(s) traitée(s).')
+            return
+
+        # Pas de connexion ouverte héritée par les processus fils
+        connections.close_all()
+
+        stop = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(target=_worker_process, args=(stop, poll_interval, burst))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+
+        def request_stop(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+
+        for worker in workers:
+            worker.join()
+
+        self.stdout.write(f'{processes} workers arrêtés.')
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predict', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='clientinfos',
+            options={'verbose_name': 'Infos clients', 'verbose_name_plural': 'Infos clients'},
+        ),
+        migrations.AlterModelOptions(
+            name='predictions',
+            options={'verbose_name': 'Prédictions', 'verbose_name_plural': 'Prédictions'},
+        ),
+        migrations.AddIndex(
+            model_name='clientinfos',
+            index=models.Index(fields=['last_name'], name='client_last_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='clientinfos',
+            index=models.Index(fields=['email'], name='client_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='predictions',
+            index=models.Index(fields=['date'], name='prediction_date_idx'),
+        ),
+    ]
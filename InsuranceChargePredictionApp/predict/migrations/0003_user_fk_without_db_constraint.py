@@ -0,0 +1,26 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predict', '0002_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clientinfos',
+            name='user',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='client_profiles', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='predictions',
+            name='created_by',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='prediction_creator', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
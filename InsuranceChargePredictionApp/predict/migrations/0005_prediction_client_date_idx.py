@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predict', '0004_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='predictions',
+            index=models.Index(fields=['client', 'date'], name='prediction_client_date_idx'),
+        ),
+    ]
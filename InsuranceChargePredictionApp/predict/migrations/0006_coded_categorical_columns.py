@@ -0,0 +1,130 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:40
+
+from django.db import migrations, models, transaction
+
+import predict.encodings
+from predict.encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES
+
+
+BATCH_SIZE = 5000
+CODED_FIELDS = {'gender': GENDER_CODES, 'smoker': SMOKER_CODES, 'region': REGION_CODES}
+
+
+def _batches(queryset):
+    """Intervalles de clés primaires de BATCH_SIZE lignes : une transaction courte par lot."""
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        yield queryset.filter(pk__gte=pks[0], pk__lte=last_pk)
+
+
+def encode_columns(apps, schema_editor):
+    Predictions = apps.get_model('predict', 'Predictions')
+    db = schema_editor.connection.alias
+
+    for batch in _batches(Predictions.objects.using(db)):
+        with transaction.atomic(using=db):
+            for name, codes in CODED_FIELDS.items():
+                for value, code in codes.items():
+                    batch.filter(**{name: value}).update(**{f'{name}_code': code})
+
+
+def decode_columns(apps, schema_editor):
+    Predictions = apps.get_model('predict', 'Predictions')
+    db = schema_editor.connection.alias
+
+    for batch in _batches(Predictions.objects.using(db)):
+        with transaction.atomic(using=db):
+            for name, codes in CODED_FIELDS.items():
+                for value, code in codes.items():
+                    batch.filter(**{f'{name}_code': code}).update(**{name: value})
+
+
+class Migration(migrations.Migration):
+
+    # Conversion par lots validés au fur et à mesure
+    atomic = False
+
+    dependencies = [
+        ('predict', '0005_prediction_client_date_idx'),
+    ]
+
+    operations = [
+        # Anciennes colonnes nullables le temps de la conversion : la migration reste réversible
+        migrations.AlterField(
+            model_name='predictions',
+            name='gender',
+            field=models.CharField(choices=[('male', 'Homme'), ('female', 'Femme')], max_length=6, null=True, verbose_name='Genre'),
+        ),
+        migrations.AlterField(
+            model_name='predictions',
+            name='smoker',
+            field=models.CharField(choices=[('yes', 'Oui'), ('no', 'Non')], max_length=3, null=True, verbose_name='Fumeur'),
+        ),
+        migrations.AlterField(
+            model_name='predictions',
+            name='region',
+            field=models.CharField(choices=[('southwest', 'Sud-Ouest'), ('southeast', 'Sud-Est'), ('northwest', 'Nord-Ouest'), ('northeast', 'Nord-Est')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictions',
+            name='gender_code',
+            field=predict.encodings.CodedChoiceField(choices=[('male', 'Homme'), ('female', 'Femme')], codes={'female': 0, 'male': 1}, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictions',
+            name='smoker_code',
+            field=predict.encodings.CodedChoiceField(choices=[('yes', 'Oui'), ('no', 'Non')], codes={'no': 0, 'yes': 1}, null=True),
+        ),
+        migrations.AddField(
+            model_name='predictions',
+            name='region_code',
+            field=predict.encodings.CodedChoiceField(choices=[('southwest', 'Sud-Ouest'), ('southeast', 'Sud-Est'), ('northwest', 'Nord-Ouest'), ('northeast', 'Nord-Est')], codes={'northeast': 0, 'northwest': 1, 'southeast': 2, 'southwest': 3}, null=True),
+        ),
+        migrations.RunPython(encode_columns, decode_columns),
+        migrations.RemoveField(
+            model_name='predictions',
+            name='gender',
+        ),
+        migrations.RemoveField(
+            model_name='predictions',
+            name='smoker',
+        ),
+        migrations.RemoveField(
+            model_name='predictions',
+            name='region',
+        ),
+        migrations.RenameField(
+            model_name='predictions',
+            old_name='gender_code',
+            new_name='gender',
+        ),
+        migrations.RenameField(
+            model_name='predictions',
+            old_name='smoker_code',
+            new_name='smoker',
+        ),
+        migrations.RenameField(
+            model_name='predictions',
+            old_name='region_code',
+            new_name='region',
+        ),
+        migrations.AlterField(
+            model_name='predictions',
+            name='gender',
+            field=predict.encodings.CodedChoiceField(choices=[('male', 'Homme'), ('female', 'Femme')], codes={'female': 0, 'male': 1}, verbose_name='Genre'),
+        ),
+        migrations.AlterField(
+            model_name='predictions',
+            name='smoker',
+            field=predict.encodings.CodedChoiceField(choices=[('yes', 'Oui'), ('no', 'Non')], codes={'no': 0, 'yes': 1}, verbose_name='Fumeur'),
+        ),
+        migrations.AlterField(
+            model_name='predictions',
+            name='region',
+            field=predict.encodings.CodedChoiceField(choices=[('southwest', 'Sud-Ouest'), ('southeast', 'Sud-Est'), ('northwest', 'Nord-Ouest'), ('northeast', 'Nord-Est')], codes={'northeast': 0, 'northwest': 1, 'southeast': 2, 'southwest': 3}),
+        ),
+    ]
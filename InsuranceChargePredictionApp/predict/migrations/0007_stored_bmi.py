@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:05
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+import predict.encodings
+from predict.encodings import compute_bmi
+
+
+BATCH_SIZE = 5000
+
+
+def backfill_bmi(apps, schema_editor):
+    """IMC des lignes existantes, calculé par compute_bmi (mêmes arrondis que le modèle), par lots."""
+    Predictions = apps.get_model('predict', 'Predictions')
+    db = schema_editor.connection.alias
+    last_pk = 0
+
+    while True:
+        rows = list(Predictions.objects.using(db).filter(pk__gt=last_pk).order_by('pk')
+                    .only('pk', 'weight', 'height')[:BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1].pk
+
+        for row in rows:
+            row.bmi = compute_bmi(row.weight, row.height)
+        with transaction.atomic(using=db):
+            Predictions.objects.using(db).bulk_update(rows, ['bmi'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    # Remplissage par lots validés au fur et à mesure
+    atomic = False
+
+    dependencies = [
+        ('predict', '0006_coded_categorical_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='predictions',
+            name='bmi',
+            field=predict.encodings.BMIField(blank=True, editable=False, null=True, verbose_name='IMC'),
+        ),
+        migrations.RunPython(backfill_bmi, migrations.RunPython.noop),
+        # Index créé après le remplissage
+        migrations.AddIndex(
+            model_name='predictions',
+            index=models.Index(fields=['bmi'], name='prediction_bmi_idx'),
+        ),
+    ]
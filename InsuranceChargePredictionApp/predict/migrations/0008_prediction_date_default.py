@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predict', '0007_stored_bmi'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='predictions',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
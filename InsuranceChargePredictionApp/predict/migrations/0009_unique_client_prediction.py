@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-19 13:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def remove_duplicate_predictions(apps, schema_editor):
+    """Doublons (client, prédiction) laissés par des soumissions concurrentes : on garde le premier."""
+    Predictions = apps.get_model('predict', 'Predictions')
+    predictions = Predictions.objects.using(schema_editor.connection.alias)
+
+    earlier = predictions.filter(client=OuterRef('client'), prediction=OuterRef('prediction'), pk__lt=OuterRef('pk'))
+    predictions.filter(Exists(earlier)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predict', '0008_prediction_date_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_predictions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='predictions',
+            constraint=models.UniqueConstraint(fields=('client', 'prediction'), name='unique_client_prediction'),
+        ),
+    ]
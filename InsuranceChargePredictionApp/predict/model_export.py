@@ -0,0 +1,82 @@
+from django.templatetags.static import static
+
+
+# Chemin de l'export dans les fichiers statiques (servi avec un nom hashé par WhiteNoise)
+LIVE_MODEL_ASSET = 'models/insurance_model.json'
+LIVE_MODEL_VERSION = 1
+
+
+def _tree_arrays(tree, offset):
+    """Nœuds d'un arbre à plat. Pour une feuille : left = -1 et threshold porte la valeur."""
+    feature, threshold, left, right = [], [], [], []
+
+    for node in range(tree.node_count):
+        if tree.children_left[node] == -1:
+            feature.append(-1)
+            threshold.append(float(tree.value[node][0][0]))
+            left.append(-1)
+            right.append(-1)
+        else:
+            feature.append(int(tree.feature[node]))
+            threshold.append(float(tree.threshold[node]))
+            left.append(int(tree.children_left[node]) + offset)
+            right.append(int(tree.children_right[node]) + offset)
+
+    return feature, threshold, left, right
+
+
+def export_model(pipeline, rmse=None):
+    """Exporte l'encodeur et les arbres du pipeline en structure JSON compacte.
+
+    Le format suit exactement le calcul de scikit-learn (standardisation en float64,
+    comparaisons des arbres en float32, cumul arbre par arbre) pour que l'évaluateur
+    JavaScript donne le même résultat que le serveur.
+    """
+    preprocessing = pipeline.named_steps['preprocessing']
+    model = pipeline.named_steps['model']
+
+    if model.loss != 'squared_error' or not hasattr(model.init_, 'constant_'):
+        raise ValueError("Seul un GradientBoostingRegressor (perte quadratique, init constante) est exportable.")
+
+    numeric = preprocessing.named_transformers_['num']
+    categorical = preprocessing.named_transformers_['cat']
+    numeric_features = list(preprocessing.transformers_[0][2])
+    categorical_features = list(preprocessing.transformers_[1][2])
+
+    trees = {'roots': [], 'feature': [], 'threshold': [], 'left': [], 'right': []}
+    for estimator in model.estimators_[:, 0]:
+        trees['roots'].append(len(trees['feature']))
+        feature, threshold, left, right = _tree_arrays(estimator.tree_, len(trees['feature']))
+        trees['feature'] += feature
+        trees['threshold'] += threshold
+        trees['left'] += left
+        trees['right'] += right
+
+    return {
+        'version': LIVE_MODEL_VERSION,
+        'numeric': {
+            'features': numeric_features,
+            'mean': [float(value) for value in numeric.mean_],
+            'scale': [float(value) for value in numeric.scale_],
+        },
+        'categorical': [
+            {
+                'feature': feature,
+                'categories': [str(category) for category in categories],
+                'drop': None if categorical.drop_idx_ is None else int(categorical.drop_idx_[i]),
+            }
+            for i, (feature, categories) in enumerate(zip(categorical_features, categorical.categories_))
+        ],
+        'init': float(model.init_.constant_[0][0]),
+        'learning_rate': float(model.learning_rate),
+        'rmse': None if rmse is None else float(rmse),
+        'trees': trees,
+    }
+
+
+def live_model_url():
+    """URL hashée de l'export, ou None s'il n'est pas encore collecté (estimation désactivée)."""
+    try:
+        return static(LIVE_MODEL_ASSET)
+    except ValueError:
+        return None
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
+
+from .encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES, BMIField, CodedChoiceField
 
 
 class ClientInfos(models.Model):
@@ -10,10 +13,13 @@ class ClientInfos(models.Model):
     email = models.EmailField()
 
     # Client supprimé : on garde ses infos comme un client non connecté
+    # Utilisateurs dans la base `default` : pas de contrainte SQL entre les deux fichiers,
+    # la remise à NULL est faite par predict.signals à la suppression de l'utilisateur
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         null=True, blank=True, 
-        on_delete=models.SET_NULL, 
+        on_delete=models.DO_NOTHING, 
+        db_constraint=False,
         related_name='client_profiles')
 
     class Meta:
@@ -22,6 +28,11 @@ class ClientInfos(models.Model):
                 fields = ['first_name', 'last_name', 'email'],
                 name = 'unique_client_profile'
             )]
+        # Recherches de l'admin : email exact et préfixe du nom de famille
+        indexes = [
+            models.Index(fields=['last_name'], name='client_last_name_idx'),
+            models.Index(fields=['email'], name='client_email_idx'),
+        ]
         verbose_name = 'Infos clients'
         verbose_name_plural = 'Infos clients'
 
@@ -33,18 +44,20 @@ class ClientInfos(models.Model):
 class Predictions(models.Model):
     """Modèle avec les informations utilisées pour générer une prédiction et les résultats associés. """
     
-    date = models.DateTimeField(auto_now_add=True)
+    # Date de création, sauf import de prédictions historiques (predict.imports)
+    date = models.DateTimeField(default=timezone.now, editable=False)
 
     # Infos de contact client supprimées : inutile de garder les prédictions associées
     client = models.ForeignKey('ClientInfos', 
                                on_delete=models.CASCADE,
                                related_name='predictions')
     
-    # Conseiller supprimé : on garde les prédictions liées
+    # Conseiller supprimé : on garde les prédictions liées (remise à NULL par predict.signals)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, 
                                    null=True,
                                    blank=True,
-                                   on_delete=models.SET_NULL,
+                                   on_delete=models.DO_NOTHING,
+                                   db_constraint=False,
                                    related_name='prediction_creator')
 
     prediction = models.DecimalField(max_digits=8, decimal_places=2)
@@ -55,19 +68,30 @@ class Predictions(models.Model):
     weight = models.FloatField()
     height = models.FloatField()
     children = models.PositiveIntegerField(default=0)
+    # Calculé à l'enregistrement, comme dans predict_charges
+    bmi = BMIField(verbose_name='IMC')
 
-    gender = models.CharField(max_length=6, verbose_name='Genre', choices=[('male', 'Homme'), ('female', 'Femme')])
-    smoker = models.CharField(max_length=3, verbose_name='Fumeur', choices=[('yes', 'Oui'), ('no', 'Non')])
+    # Stockés en petits entiers (predict.encodings), manipulés sous leur valeur texte
+    gender = CodedChoiceField(codes=GENDER_CODES, verbose_name='Genre', choices=[('male', 'Homme'), ('female', 'Femme')])
+    smoker = CodedChoiceField(codes=SMOKER_CODES, verbose_name='Fumeur', choices=[('yes', 'Oui'), ('no', 'Non')])
     
     REGION_CHOICES = [('southwest', 'Sud-Ouest'), ('southeast', 'Sud-Est'), ('northwest', 'Nord-Ouest'), ('northeast', 'Nord-Est')]
-    region = models.CharField(max_length=10, choices=REGION_CHOICES)
+    region = CodedChoiceField(codes=REGION_CODES, choices=REGION_CHOICES)
 
     class Meta:
+        # Une soumission répétée pour le même client n'ajoute pas de ligne (save_prediction)
         constraints = [
             models.UniqueConstraint(
-                fields = ['created_by', 'prediction'],
-                name = 'unique_prediction'
+                fields = ['client', 'prediction'],
+                name = 'unique_client_prediction'
             )]
+        # Hiérarchie par date de l'admin et filtres de l'export ;
+        # dernière prédiction de chaque client (portefeuille conseiller)
+        indexes = [
+            models.Index(fields=['date'], name='prediction_date_idx'),
+            models.Index(fields=['client', 'date'], name='prediction_client_date_idx'),
+            models.Index(fields=['bmi'], name='prediction_bmi_idx'),
+        ]
         verbose_name = 'Prédictions'
         verbose_name_plural = 'Prédictions'
 
@@ -75,3 +99,60 @@ class Predictions(models.Model):
         return f'Client {self.client} : {self.prediction} €'
 
 
+
+
+
+class Job(models.Model):
+    """Tâche de fond (export, re-scoring...) exécutée par `manage.py run_workers`. """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATE_CHOICES = [(PENDING, 'En attente'), (RUNNING, 'En cours'), (SUCCEEDED, 'Terminée'), (FAILED, 'Échouée')]
+
+    kind = models.CharField(max_length=50, verbose_name='Type')
+    params = models.JSONField(default=dict, blank=True)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=PENDING, verbose_name='État')
+
+    # Nouvelle tentative différée après un échec, jusqu'à max_attempts
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(verbose_name='Exécutable à partir de')
+
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+
+    # Utilisateurs dans la base `default` : pas de contrainte SQL (voir ClientInfos.user)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                   null=True,
+                                   blank=True,
+                                   on_delete=models.DO_NOTHING,
+                                   db_constraint=False,
+                                   related_name='jobs')
+
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Recherche de la prochaine tâche à prendre
+        indexes = [
+            models.Index(fields=['state', 'run_after'], name='job_state_run_after_idx'),
+        ]
+        verbose_name = 'Tâche'
+        verbose_name_plural = 'Tâches'
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.get_state_display()})'
+
+    @property
+    def progress(self):
+        """Avancement en pourcentage, None si le total n'est pas connu."""
+        if not self.progress_total:
+            return 100.0 if self.state == self.SUCCEEDED else None
+        return round(100 * self.progress_done / self.progress_total, 1)
@@ -0,0 +1,211 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+
+from .models import Predictions
+
+
+logger = logging.getLogger(__name__)
+
+# En dessous, un rang dans le segment n'a pas de sens
+MIN_SEGMENT_SIZE = 20
+CATCH_UP_CHUNK = 10000
+# Intervalle minimal (secondes) entre deux sauvegardes sur disque
+SAVE_INTERVAL = 60
+
+EMPTY = np.empty(0)
+
+
+def segment_name(smoker, region):
+    return f'{smoker}-{region}'
+
+
+class SegmentRanks:
+    """Prédictions enregistrées, triées par segment (fumeur, région) : rang d'un montant
+    par recherche dichotomique, sans ORDER BY sur Predictions.
+
+    Chaque processus tient ses tableaux à jour en lisant les prédictions de clé supérieure
+    à la dernière intégrée (au plus toutes les PREDICT_PERCENTILES_REFRESH secondes) ; avec
+    PREDICT_PERCENTILES_PATH, l'état est sauvegardé et relu au redémarrage. Les prédictions
+    supprimées restent comptées jusqu'à la suppression de ce fichier.
+
+    Les requêtes ne lisent jamais la base : rank() fait une recherche dichotomique dans les
+    tableaux publiés et, s'ils sont périmés, lance le rattrapage dans un thread de fond. Un
+    seul thread rattrape la base à la fois, sur une copie publiée à la fin. Le premier
+    rattrapage (toute la table, sans fichier) est fait par predict.warmup avant l'arrivée
+    du trafic ; sans préchauffage, les rangs apparaissent une fois le thread terminé.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+
+    def _clear(self):
+        self._values = {}
+        self._last_pk = 0
+        self._loaded = False
+        self._refreshed_at = None
+        self._saved_pk = 0
+        self._saved_at = None
+
+
+    def reset(self):
+        """Oublie l'état en mémoire (relu du fichier ou de la base au prochain appel)."""
+        with self._lock:
+            self._clear()
+
+
+    def _path(self):
+        path = settings.PREDICT_PERCENTILES_PATH
+        return Path(path) if path else None
+
+
+    def _load(self):
+        """(tableaux, dernière clé) du fichier de sauvegarde, ou None."""
+        path = self._path()
+        if path is None or not path.exists():
+            return None
+
+        try:
+            with np.load(path) as archive:
+                last_pk = int(archive['last_pk'])
+                values = {name: archive[name] for name in archive.files if name != 'last_pk'}
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            logger.warning('Rangs par segment illisibles (%s) : reconstruction depuis la base', path)
+            return None
+
+        # Fichier d'une autre base (ou base vidée) : on repart de zéro
+        if last_pk == 0 or Predictions.objects.filter(pk__gte=last_pk).exists():
+            return values, last_pk
+        return None
+
+
+    def _save(self):
+        path = self._path()
+        if path is None:
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Fichier temporaire propre à cet appel : deux workers ne s'écrivent pas l'un sur l'autre
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f'.{path.name}.', suffix='.part', delete=False) as output:
+            try:
+                np.savez(output, last_pk=self._last_pk, **self._values)
+            except BaseException:
+                os.unlink(output.name)
+                raise
+        os.replace(output.name, path)
+
+        self._saved_pk = self._last_pk
+        self._saved_at = time.monotonic()
+
+
+    def _merge(self, values, rows):
+        added = defaultdict(list)
+        for _, smoker, region, prediction in rows:
+            added[segment_name(smoker, region)].append(float(prediction))
+
+        for segment, new in added.items():
+            new = np.sort(np.asarray(new))
+            current = values.get(segment, EMPTY)
+            values[segment] = np.insert(current, np.searchsorted(current, new), new)
+
+
+    def _is_fresh(self, now):
+        return self._loaded and now - self._refreshed_at < settings.PREDICT_PERCENTILES_REFRESH
+
+
+    def refresh(self, force=False):
+        """Intègre les prédictions enregistrées depuis le dernier appel.
+
+        Sans `force`, rend la main tout de suite si un autre thread est déjà en train de le faire.
+        """
+        now = time.monotonic()
+        if not force and self._is_fresh(now):
+            return
+
+        if not self._lock.acquire(blocking=force):
+            return
+
+        try:
+            values, last_pk = dict(self._values), self._last_pk
+            if not self._loaded:
+                values, last_pk = self._load() or ({}, 0)
+                self._saved_pk = last_pk
+
+            while True:
+                rows = list(Predictions.objects.filter(pk__gt=last_pk).order_by('pk')
+                            .values_list('pk', 'smoker', 'region', 'prediction')[:CATCH_UP_CHUNK])
+                if not rows:
+                    break
+
+                self._merge(values, rows)
+                last_pk = rows[-1][0]
+
+            # Publication : les lectures en cours gardent l'ancien dictionnaire, cohérent
+            self._values, self._last_pk = values, last_pk
+            self._refreshed_at = now
+            self._loaded = True
+
+            if self._last_pk != self._saved_pk and (self._saved_at is None or now - self._saved_at >= SAVE_INTERVAL):
+                try:
+                    self._save()
+                except OSError:
+                    logger.exception('Sauvegarde des rangs par segment impossible')
+        finally:
+            self._lock.release()
+
+
+    def refresh_in_background(self):
+        """Lance refresh() dans un thread si les tableaux sont périmés et qu'aucun rattrapage
+        n'est en cours ; rend la main tout de suite."""
+        if self._is_fresh(time.monotonic()) or self._lock.locked():
+            return
+        self._spawn()
+
+
+    def _spawn(self):
+        threading.Thread(target=self._background_refresh, name='segment-ranks', daemon=True).start()
+
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            # Base indisponible : nouvel essai à la prochaine lecture
+            logger.exception('Rattrapage des rangs par segment impossible')
+        finally:
+            connections.close_all()
+
+
+    def rank(self, smoker, region, prediction):
+        """{'percentile', 'count'} du montant parmi les prédictions du segment, ou None s'il
+        y en a moins de MIN_SEGMENT_SIZE. Percentile au rang moyen des ex æquo.
+
+        Aucune requête SQL : lecture des tableaux publiés, rattrapage éventuel en arrière-plan.
+        """
+        self.refresh_in_background()
+        values = self._values.get(segment_name(smoker, region), EMPTY)
+
+        count = len(values)
+        if count < MIN_SEGMENT_SIZE:
+            return None
+
+        below = np.searchsorted(values, prediction, side='left')
+        up_to = np.searchsorted(values, prediction, side='right')
+        return {
+            'percentile': int(round(100 * (below + up_to) / 2 / count)),
+            'count': count,
+        }
+
+
+segment_ranks = SegmentRanks()
@@ -0,0 +1,78 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Predictions
+
+
+PAGE_SIZE = 50
+
+# Tri proposé -> (champ, décroissant). La clé primaire départage les égalités.
+SORTS = {
+    '-date': ('date', True),
+    '-charge': ('prediction', True),
+    'charge': ('prediction', False),
+}
+
+
+def latest_predictions(advisor=None):
+    """Dernière prédiction de chaque client, client compris, en une seule requête.
+
+    La sous-requête corrélée remonte l'index (client, date) du client et s'arrête à la
+    première ligne. Avec `advisor`, seuls les clients pour lesquels il a fait une prédiction.
+    """
+    latest = Predictions.objects.filter(client=OuterRef('client')).order_by('-date', '-pk').values('pk')[:1]
+    queryset = Predictions.objects.filter(pk=Subquery(latest)).select_related('client')
+
+    if advisor is not None:
+        queryset = queryset.filter(client__in=Predictions.objects.filter(created_by=advisor).values('client'))
+
+    return queryset
+
+
+def encode_cursor(sort, row):
+    field, _ = SORTS[sort]
+    value = getattr(row, field)
+    return f'{value.isoformat() if field == "date" else value}~{row.pk}'
+
+
+def decode_cursor(sort, cursor):
+    """(valeur, pk) de la dernière ligne de la page précédente ; ValueError si le curseur est invalide."""
+    field, _ = SORTS[sort]
+    value, _, pk = cursor.rpartition('~')
+
+    if field == 'date':
+        return datetime.fromisoformat(value), int(pk)
+
+    try:
+        value = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(cursor)
+
+    if not value.is_finite():
+        raise ValueError(cursor)
+
+    return value, int(pk)
+
+
+def portfolio_page(queryset, sort='-date', after=None, page_size=PAGE_SIZE):
+    """Une page par pagination à curseur (keyset) : pas d'OFFSET ni de COUNT, coût constant quelle que soit la page.
+
+    Renvoie (lignes, curseur de la page suivante ou None).
+    """
+    field, descending = SORTS[sort]
+    lookup = 'lt' if descending else 'gt'
+
+    if after is not None:
+        value, pk = after
+        queryset = queryset.filter(Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk}))
+
+    order = [f'-{field}', '-pk'] if descending else [field, 'pk']
+    rows = list(queryset.order_by(*order)[:page_size + 1])
+
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    return rows, encode_cursor(sort, rows[-1])
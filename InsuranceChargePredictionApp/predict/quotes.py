@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from accounts.backends import user_cache_key
+from .services import ModelNotFoundError, model_version, predict_batch, predict_charges
+
+
+User = get_user_model()
+
+
+# Champs du profil qui entrent dans le devis
+QUOTE_FIELDS = ('age', 'gender', 'weight', 'height', 'smoker', 'children', 'region')
+
+QUOTE_UPDATE_FIELDS = ['quote', 'quote_range_lower', 'quote_range_upper', 'quote_model_version', 'quote_updated_at']
+
+
+def profile_inputs(age, gender, weight, height, smoker, children, region):
+    """Arguments de predict_charges tirés des champs du profil, None si le profil est incomplet."""
+    if None in (age, gender, weight, height, region):
+        return None
+
+    return age, gender, 'yes' if smoker else 'no', weight, height, children or 0, region
+
+
+def quote_inputs(user):
+    return profile_inputs(*(getattr(user, field) for field in QUOTE_FIELDS))
+
+
+def refresh_quote(user):
+    """Recalcule et enregistre le devis de l'utilisateur (effacé si le profil ne permet pas de le calculer).
+
+    L'enregistrement invalide l'utilisateur en cache (accounts.signals).
+    """
+    prediction = range_lower = range_upper = None
+    inputs = quote_inputs(user)
+
+    if inputs is not None:
+        try:
+            prediction, range_lower, range_upper = predict_charges(*inputs)
+        except (ModelNotFoundError, ValueError):
+            pass
+
+    user.quote = prediction
+    user.quote_range_lower = range_lower
+    user.quote_range_upper = range_upper
+    # Noté même sans devis : le re-scoring ne relit pas ce profil tant que le modèle ne change pas
+    user.quote_model_version = model_version()
+    user.quote_updated_at = timezone.now()
+    user.save(update_fields=QUOTE_UPDATE_FIELDS)
+    return prediction
+
+
+def current_quote(user):
+    """Devis enregistré, s'il a été calculé par le modèle actuellement déployé. Aucun appel au modèle."""
+    if user is None or getattr(user, 'quote', None) is None:
+        return None
+
+    if user.quote_model_version != model_version():
+        return None
+
+    return {
+        'prediction': user.quote,
+        'range_lower': user.quote_range_lower,
+        'range_upper': user.quote_range_upper,
+        'updated_at': user.quote_updated_at,
+    }
+
+
+def score_rows(rows):
+    """Devis d'un lot de lignes (pk, *QUOTE_FIELDS), en un seul appel au modèle.
+
+    Renvoie [(pk, (prediction, range_lower, range_upper) ou None)]. N'accède pas à la base :
+    peut tourner dans un processus séparé.
+    """
+    complete = [(row[0], inputs) for row in rows if (inputs := profile_inputs(*row[1:])) is not None]
+    quotes = dict(zip([pk for pk, _ in complete], predict_batch([inputs for _, inputs in complete])))
+    return [(row[0], quotes.get(row[0])) for row in rows]
+
+
+def iter_client_rows(chunk_size, start_after=0, rescore_all=False):
+    """Lots de clients à re-scorer, parcourus par clé primaire (reprise possible après `start_after`).
+
+    Par défaut, seuls les clients que la version actuelle du modèle n'a pas encore évalués
+    (write_quotes enregistre la version même quand le profil ne permet pas de devis).
+    """
+    queryset = User.objects.filter(role='Client').order_by('pk')
+    if not rescore_all:
+        queryset = queryset.exclude(quote_model_version=model_version())
+
+    last_pk = start_after
+    while True:
+        rows = list(queryset.filter(pk__gt=last_pk).values_list('pk', *QUOTE_FIELDS)[:chunk_size])
+        if not rows:
+            return
+
+        last_pk = rows[-1][0]
+        yield rows
+
+
+def write_quotes(scored):
+    """Enregistre un lot de devis, puis invalide les utilisateurs en cache.
+
+    Un seul UPDATE préparé, exécuté pour tout le lot (executemany) : bulk_update construit
+    un CASE WHEN par ligne et par champ, dont la compilation coûte plus cher que le scoring.
+    """
+    db = router.db_for_write(User)
+    connection = connections[db]
+    quote_name = connection.ops.quote_name
+    fields = [User._meta.get_field(name) for name in QUOTE_UPDATE_FIELDS]
+
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote_name(User._meta.db_table),
+        ', '.join(f'{quote_name(field.column)} = %s' for field in fields),
+        quote_name(User._meta.pk.column))
+
+    version = model_version()
+    now = timezone.now()
+    params = []
+
+    for pk, quote in scored:
+        # Profil incomplet ou hors bornes : pas de devis, mais version notée pour ne pas le relire
+        prediction, range_lower, range_upper = quote or (None, None, None)
+        values = (prediction, range_lower, range_upper, version, now)
+        params.append([field.get_db_prep_save(value, connection) for field, value in zip(fields, values)] + [pk])
+
+    with transaction.atomic(using=db), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+    # Pas de post_save : invalidation explicite
+    cache.delete_many([user_cache_key(pk) for pk, _ in scored])
+    return len(params)
+
+
+def rescore_clients(chunk_size=2000, start_after=0, rescore_all=False, score_chunks=map):
+    """Re-score les clients par lots. Génère (dernier pk écrit, nombre de clients du lot).
+
+    `score_chunks(score_rows, lots)` applique le scoring aux lots : `map` dans le processus,
+    ou une version répartie sur plusieurs processus (voir la commande rescore_clients).
+    """
+    for scored in score_chunks(score_rows, iter_client_rows(chunk_size, start_after, rescore_all)):
+        yield scored[-1][0], write_quotes(scored)
+
@@ -1,30 +1,90 @@
+import hashlib
+from functools import lru_cache
 from pathlib import Path
 import pandas as pd
 import joblib
+from .encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES, compute_bmi, model_categories_match, predict_codes
+from .models import ClientInfos, Predictions
+
+MODEL_PATH = Path(__file__).parent / 'utils' / 'insurance_model.joblib'
+RMSE_PATH = Path(__file__).parent / 'utils' / 'rmse.joblib'
 
 class ModelNotFoundError(Exception):
     pass
 
-def predict_charges(age, gender, smoker, weight, height, children, region):
+
+@lru_cache(maxsize=1)
+def load_model():
+    """Pipeline de prédiction, chargé une seule fois par processus."""
+    return joblib.load(MODEL_PATH)
+
+
+@lru_cache(maxsize=1)
+def load_rmse():
+    return joblib.load(RMSE_PATH)
+
+
+@lru_cache(maxsize=1)
+def model_version():
+    """Empreinte des fichiers du modèle déployé ('' s'ils sont absents).
+
+    Enregistrée avec chaque devis précalculé : un devis d'une autre version est périmé.
+    """
+    digest = hashlib.sha256()
 
     try:
-        prediction_model_path = Path(__file__).parent / 'utils' / 'insurance_model.joblib'
-        prediction_model = joblib.load(prediction_model_path)
+        for path in (MODEL_PATH, RMSE_PATH):
+            digest.update(path.read_bytes())
     except FileNotFoundError:
-        raise ModelNotFoundError('Le service de prédiction est introuvable.')
+        return ''
 
-    
+    return digest.hexdigest()[:16]
+
+
+def clear_model_cache():
+    """Oublie le modèle chargé (après un réentraînement, ou entre deux tests)."""
+    load_model.cache_clear()
+    load_rmse.cache_clear()
+    model_version.cache_clear()
+
+
+def validated_bmi(weight, height):
+    """IMC arrondi comme à l'entraînement ; ValueError si le poids ou la taille sont incohérents."""
     if not(30 <= weight <= 250):
         raise ValueError('Le poids renseigné est incorrect.')
     
     if not(1 <= height <= 2.5):
         raise ValueError('La taille renseignée est incorrecte.')
     
-    bmi = round(weight / (height ** 2), 2)
+    bmi = compute_bmi(weight, height)
 
     if bmi < 13:
         raise ValueError('Le BMI n\'est pas valide.')
 
+    return bmi
+
+
+def prediction_range(prediction):
+    """Fourchette (basse, haute) autour de la prédiction, (None, None) sans RMSE."""
+    try:
+        rmse = load_rmse()
+
+        range_lower = max(float(1000), round(prediction - rmse, 2))
+        range_upper = round(prediction + rmse, 2)
+    except Exception:
+        return None, None
+
+    return range_lower, range_upper
+
+
+def predict_charges(age, gender, smoker, weight, height, children, region):
+
+    try:
+        prediction_model = load_model()
+    except FileNotFoundError:
+        raise ModelNotFoundError('Le service de prédiction est introuvable.')
+
+    bmi = validated_bmi(weight, height)
 
     new_data = pd.DataFrame({
         "age": [age],
@@ -37,15 +97,106 @@ def predict_charges(age, gender, smoker, weight, height, children, region):
 
     prediction = round(prediction_model.predict(new_data)[0], 2)
 
+    return (prediction, *prediction_range(prediction))
+
 
+def predict_batch(profiles):
+    """Prédit une liste de profils (age, gender, smoker, weight, height, children, region) en un seul appel au modèle.
+
+    Renvoie un (prediction, range_lower, range_upper) par profil, ou None pour un profil
+    invalide. Mêmes validations et mêmes arrondis que predict_charges.
+    """
     try:
-        rmse_model_path = Path(__file__).parent / 'utils' / 'rmse.joblib'
-        rmse = joblib.load(rmse_model_path)
+        prediction_model = load_model()
+    except FileNotFoundError:
+        raise ModelNotFoundError('Le service de prédiction est introuvable.')
+
+    results = [None] * len(profiles)
+    valid = []
+    columns = {"age": [], "children": [], "smoker": [], "bmi": [], "sex": [], "region": []}
+
+    for index, (age, gender, smoker, weight, height, children, region) in enumerate(profiles):
+        try:
+            bmi = validated_bmi(weight, height)
+        except ValueError:
+            continue
+
+        valid.append(index)
+        columns["age"].append(age)
+        columns["children"].append(children)
+        columns["smoker"].append(smoker)
+        columns["bmi"].append(bmi)
+        columns["sex"].append(gender)
+        columns["region"].append(region)
+
+    if not valid:
+        return results
+
+    if model_categories_match(prediction_model):
+        # Catégories passées en codes entiers directement au régresseur, sans DataFrame
+        predictions = predict_codes(
+            prediction_model, columns["age"], columns["bmi"], columns["children"],
+            [GENDER_CODES[value] for value in columns["sex"]],
+            [SMOKER_CODES[value] for value in columns["smoker"]],
+            [REGION_CODES[value] for value in columns["region"]])
+    else:
+        predictions = prediction_model.predict(pd.DataFrame(columns))
+
+    for index, value in zip(valid, predictions):
+        prediction = round(value, 2)
+        results[index] = (prediction, *prediction_range(prediction))
+
+    return results
+
+
+def _client(data, user):
+    is_client = user is not None and user.is_authenticated and getattr(user, 'role', None) == 'Client'
+    return ClientInfos(
+        first_name=data['first_name'],
+        last_name=data['last_name'],
+        email=data['email'],
+        user=user if is_client else None)
+
+
+def _prediction(client, data, prediction, range_lower, range_upper, user):
+    return Predictions(
+        client=client,
+        prediction=prediction,
+        created_by=user if user is not None and user.is_authenticated else None, # Gérer les priorités
+        range_lower=range_lower if range_lower else None,
+        range_upper=range_upper if range_upper else None,
+        age=data['age'],
+        gender=data['gender'],
+        smoker=data['smoker'],
+        weight=data['weight'],
+        height=data['height'],
+        children=data['children'],
+        region=data['region'])
+
+
+# Upsert du client : la mise à jour (sans effet) d'un client existant renvoie sa clé,
+# sans toucher à son utilisateur, comme get_or_create
+CLIENT_UPSERT = dict(
+    update_conflicts=True,
+    unique_fields=['first_name', 'last_name', 'email'],
+    update_fields=['first_name'])
+
+
+def save_prediction(data, prediction, range_lower, range_upper, user=None):
+    """Enregistre le client et sa prédiction. `data` : données nettoyées de PredictionForm.
+
+    Deux requêtes (upsert du client, insertion de la prédiction ignorée si elle existe déjà),
+    sans transaction ni IntegrityError entre soumissions identiques concurrentes.
+    """
+    client, = ClientInfos.objects.bulk_create([_client(data, user)], **CLIENT_UPSERT)
+
+    Predictions.objects.bulk_create(
+        [_prediction(client, data, prediction, range_lower, range_upper, user)], ignore_conflicts=True)
 
-        range_lower = max(float(1000), round(prediction - rmse, 2))
-        range_upper = round(prediction + rmse, 2)
-    except Exception:
-        return prediction, None, None
 
+async def asave_prediction(data, prediction, range_lower, range_upper, user=None):
+    """Variante de save_prediction pour l'ORM asynchrone."""
+    client, = await ClientInfos.objects.abulk_create([_client(data, user)], **CLIENT_UPSERT)
 
-    return prediction, range_lower, range_upper
\ No newline at end of file
+    await Predictions.objects.abulk_create(
+        [_prediction(client, data, prediction, range_lower, range_upper, user)], ignore_conflicts=True)
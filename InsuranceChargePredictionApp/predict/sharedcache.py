@@ -0,0 +1,267 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+from django.conf import settings
+
+from .encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES
+from .services import model_version
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de cache partagé
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x41435350
+
+# En-tête : magic, nombre d'emplacements, puis compteurs 64 bits aux positions ci-dessous
+HEADER = struct.Struct('<II')
+HEADER_SIZE = 64
+HAND, USED, HITS, MISSES, EVICTIONS = 8, 16, 24, 32, 40
+COUNTER = struct.Struct('<Q')
+
+# Clé : entrées du modèle (mêmes arrondis que prediction_key) puis version du modèle (8 octets)
+INPUTS = struct.Struct('<HHHBBBB')
+KEY_SIZE = INPUTS.size + 8
+
+# Emplacement : numéro de séquence (impair pendant une écriture), bit de référence CLOCK,
+# clé, puis prédiction et fourchette (NaN pour une borne absente)
+SLOT = struct.Struct(f'<IB3x{KEY_SIZE}s6x3d')
+SEQ = struct.Struct('<I')
+SLOT_HEAD = struct.Struct(f'<IB3x{KEY_SIZE}s')
+REFERENCE_OFFSET = 4
+
+# Emplacements examinés pour une clé (sondage linéaire), et relectures d'un emplacement
+# en cours d'écriture avant de le considérer comme absent
+PROBES = 8
+READ_RETRIES = 3
+
+
+def pack_key(data, version):
+    """Clé binaire d'un profil pour une version du modèle."""
+    return INPUTS.pack(
+        int(data['age']),
+        round(float(data['weight']) * 10),
+        round(float(data['height']) * 100),
+        GENDER_CODES[data['gender']],
+        SMOKER_CODES[data['smoker']],
+        REGION_CODES[data['region']],
+        int(data['children']),
+    ) + bytes.fromhex(version)
+
+
+def _bound(value):
+    return None if math.isnan(value) else value
+
+
+class SharedPredictionCache:
+    """Table de hachage à adressage ouvert, de taille fixe, dans une mémoire partagée
+    (multiprocessing.shared_memory) : les workers d'une même machine partagent leurs résultats.
+
+    Lectures sans verrou, validées par le numéro de séquence de l'emplacement (seqlock) ;
+    écritures sérialisées par un verrou fichier. Une clé occupe l'un des PROBES emplacements
+    qui suivent son hachage ; quand ils sont tous pris, l'éviction suit l'algorithme CLOCK
+    (seconde chance aux entrées relues depuis le dernier passage).
+
+    Activée par settings.PREDICT_SHM_CACHE_SLOTS (0 : désactivée). Les compteurs de succès
+    et de défauts sont incrémentés sans verrou : ils sont approximatifs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._shm = None
+        self._lock_file = None
+        self._config = None
+        self.slots = 0
+
+
+    def _settings(self):
+        return settings.PREDICT_SHM_CACHE_SLOTS, settings.PREDICT_SHM_CACHE_NAME
+
+
+    def _buffer(self):
+        """Mémoire partagée du processus, ouverte (ou créée) au premier appel ; None si désactivée."""
+        config = self._settings()
+        if config == self._config:
+            return self._shm.buf if self._shm is not None else None
+
+        with self._lock:
+            if config != self._config:
+                self.close()
+                self._config = config
+                slots, name = config
+                if slots > 0 and fcntl is not None:
+                    try:
+                        self._open(name, slots)
+                    except (OSError, ValueError):
+                        logger.exception('Cache de prédictions partagé indisponible')
+                        self.close()
+                        self._config = config
+
+        return self._shm.buf if self._shm is not None else None
+
+
+    def _open(self, name, slots):
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a+b')
+
+        with self._file_lock():
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_SIZE + slots * SLOT.size)
+                HEADER.pack_into(shm.buf, 0, MAGIC, slots)
+
+        # La table survit au worker qui l'a créée : pas de suppression par le resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        self._shm = shm
+
+        magic, existing_slots = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or existing_slots != slots:
+            raise ValueError(f'Mémoire partagée {name} : format ou taille différents ({existing_slots} emplacements)')
+        self.slots = slots
+
+
+    @contextmanager
+    def _file_lock(self):
+        # flock n'exclut pas les threads d'un même processus (même descripteur)
+        with self._write_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+
+    def close(self, unlink=False):
+        """Détache la mémoire partagée (et la supprime avec `unlink=True`)."""
+        if self._shm is not None:
+            if unlink:
+                # unlink() retire l'enregistrement fait à la création, annulé dans _open
+                resource_tracker.register(self._shm._name, 'shared_memory')
+                self._shm.unlink()
+            self._shm.close()
+            self._shm = None
+
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+        self._config = None
+        self.slots = 0
+
+
+    def _key(self, data):
+        version = model_version()
+        return pack_key(data, version) if version else None
+
+
+    def _window(self, key):
+        start = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') % self.slots
+        return [(start + probe) % self.slots for probe in range(min(PROBES, self.slots))]
+
+
+    def _incr(self, buf, offset, amount=1):
+        COUNTER.pack_into(buf, offset, COUNTER.unpack_from(buf, offset)[0] + amount)
+
+
+    def get(self, data):
+        """(prédiction, borne basse, borne haute) enregistrés pour ce profil, ou None."""
+        buf = self._buffer()
+        key = self._key(data) if buf is not None else None
+        if key is None:
+            return None
+
+        for index in self._window(key):
+            offset = HEADER_SIZE + index * SLOT.size
+
+            for _ in range(READ_RETRIES):
+                seq, reference, slot_key, prediction, lower, upper = SLOT.unpack_from(buf, offset)
+                if not seq & 1 and SEQ.unpack_from(buf, offset)[0] == seq:
+                    break
+            else:
+                continue
+
+            # Emplacement jamais écrit : la clé n'est pas plus loin
+            if seq == 0:
+                break
+
+            if slot_key == key:
+                if not reference:
+                    buf[offset + REFERENCE_OFFSET] = 1
+                self._incr(buf, HITS)
+                return prediction, _bound(lower), _bound(upper)
+
+        self._incr(buf, MISSES)
+        return None
+
+
+    def put(self, data, result):
+        """Enregistre le résultat de predict_charges pour ce profil."""
+        buf = self._buffer()
+        key = self._key(data) if buf is not None else None
+        if key is None:
+            return
+
+        prediction, lower, upper = result
+        window = self._window(key)
+
+        with self._file_lock():
+            heads = [SLOT_HEAD.unpack_from(buf, HEADER_SIZE + index * SLOT.size) for index in window]
+            victim = next((position for position, (seq, _, slot_key) in enumerate(heads)
+                           if seq == 0 or slot_key == key), None)
+
+            if victim is None:
+                hand = COUNTER.unpack_from(buf, HAND)[0]
+                COUNTER.pack_into(buf, HAND, hand + 1)
+
+                # Premier emplacement sans bit de référence ; ceux qui l'ont le perdent au passage
+                for step in range(2 * len(window)):
+                    position = (hand + step) % len(window)
+                    offset = HEADER_SIZE + window[position] * SLOT.size
+                    if not buf[offset + REFERENCE_OFFSET]:
+                        victim = position
+                        break
+                    buf[offset + REFERENCE_OFFSET] = 0
+
+                self._incr(buf, EVICTIONS)
+
+            seq = heads[victim][0]
+            if seq == 0:
+                self._incr(buf, USED)
+
+            offset = HEADER_SIZE + window[victim] * SLOT.size
+            SEQ.pack_into(buf, offset, seq + 1)
+            SLOT.pack_into(buf, offset, seq + 1, 0, key, prediction,
+                           math.nan if lower is None else lower, math.nan if upper is None else upper)
+            SEQ.pack_into(buf, offset, seq + 2)
+
+
+    def stats(self):
+        buf = self._buffer()
+        if buf is None:
+            return {'enabled': False}
+
+        used, hits, misses, evictions = (COUNTER.unpack_from(buf, offset)[0] for offset in (USED, HITS, MISSES, EVICTIONS))
+        return {
+            'enabled': True,
+            'slots': self.slots,
+            'used': used,
+            'occupancy': round(used / self.slots, 4),
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'evictions': evictions,
+        }
+
+
+shared_cache = SharedPredictionCache()
@@ -0,0 +1,13 @@
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ClientInfos, Job, Predictions
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def detach_deleted_user(sender, instance, **kwargs):
+    """Équivalent de SET_NULL : les utilisateurs et les prédictions sont sur deux bases différentes."""
+    ClientInfos.objects.filter(user_id=instance.pk).update(user=None)
+    Predictions.objects.filter(created_by_id=instance.pk).update(created_by=None)
+    Job.objects.filter(created_by_id=instance.pk).update(created_by=None)
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows : regroupement limité au worker courant
+    fcntl = None
+
+
+# Intervalle minimal (secondes) entre deux purges des fichiers verrous expirés d'un worker
+SWEEP_INTERVAL = 60
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Regroupe les calculs identiques en cours : le premier calcule, les doublons
+    simultanés attendent et réutilisent son résultat (ou son exception).
+
+    Avec `cross_worker=True` et settings.PREDICT_SINGLEFLIGHT_LOCK_DIR, le calcul est
+    aussi protégé par un verrou fichier propre à la clé, partagé entre workers : un worker
+    prend le verrou, puis relit le résultat déposé s'il est encore frais
+    (PREDICT_SINGLEFLIGHT_RESULT_TTL) avant de calculer. Le résultat doit alors être
+    sérialisable en JSON. Les fichiers expirés sont purgés au fil de l'eau.
+    """
+
+    def __init__(self, name, cross_worker=False):
+        self.name = name
+        self.cross_worker = cross_worker
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'computed': 0, 'shared': 0, 'shared_cross_worker': 0}
+        self._swept_at = time.monotonic()
+
+
+    def do(self, key, func):
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, func)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+
+        stats['avoided'] = stats['shared'] + stats['shared_cross_worker']
+        stats['in_flight'] = len(self._calls)
+        return stats
+
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+    def _run(self, key, func):
+        lock_dir = settings.PREDICT_SINGLEFLIGHT_LOCK_DIR if self.cross_worker else None
+
+        if not lock_dir or fcntl is None:
+            self._count('computed')
+            return func()
+
+        # Un fichier par clé : des clés différentes ne s'attendent jamais
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        lock_file = self._acquire(Path(lock_dir) / f'{self.name}-{digest[:32]}.lock')
+
+        try:
+            # Résultat déposé par un autre worker, pendant notre attente ou juste avant
+            shared = self._read_shared(lock_file, digest)
+            if shared is not None:
+                self._count('shared_cross_worker')
+                return shared
+
+            self._count('computed')
+            result = func()
+            self._write_shared(lock_file, digest, result)
+            return result
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+            self._sweep(Path(lock_dir))
+
+
+    def _acquire(self, path):
+        """Ouvre et verrouille le fichier de la clé (recréé s'il a été purgé entre-temps)."""
+        while True:
+            lock_file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            try:
+                if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+
+    def _sweep(self, lock_dir):
+        """Supprime les fichiers dont le résultat a expiré (ceux d'un calcul en cours sont laissés)."""
+        now = time.monotonic()
+        if now - self._swept_at < SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+
+        expired = time.time() - settings.PREDICT_SINGLEFLIGHT_RESULT_TTL
+        for path in lock_dir.glob(f'{self.name}-*.lock'):
+            try:
+                if path.stat().st_mtime >= expired:
+                    continue
+                with open(path, 'r+') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    # Verrou tenu : _acquire rouvrira un nouveau fichier
+                    if os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino:
+                        path.unlink()
+            except (BlockingIOError, FileNotFoundError):
+                continue
+
+
+    def _read_shared(self, lock_file, digest):
+        lock_file.seek(0)
+        try:
+            content = json.loads(lock_file.read() or 'null')
+        except ValueError:
+            return None
+
+        if not content or content['key'] != digest:
+            return None
+
+        if time.time() - content['time'] > settings.PREDICT_SINGLEFLIGHT_RESULT_TTL:
+            return None
+
+        return tuple(content['result'])
+
+
+    def _write_shared(self, lock_file, digest, result):
+        # Écrit sous verrou exclusif : les lecteurs attendent sa libération
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(json.dumps({'key': digest, 'time': time.time(), 'result': list(result)}))
+        lock_file.flush()
+
+
+def prediction_key(data):
+    """Clé normalisée des caractéristiques utilisées par le modèle."""
+    return (
+        int(data['age']),
+        data['gender'],
+        data['smoker'],
+        round(float(data['weight']), 1),
+        round(float(data['height']), 2),
+        int(data['children']),
+        data['region'],
+    )
+
+
+def save_key(data, prediction, user=None):
+    """Clé d'un enregistrement : même client, même prédiction, même auteur."""
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    return (
+        data['email'],
+        data['first_name'],
+        data['last_name'],
+        prediction_key(data),
+        prediction,
+        user_id,
+    )
+
+
+prediction_flight = SingleFlight('predictions', cross_worker=True)
+save_flight = SingleFlight('saves')
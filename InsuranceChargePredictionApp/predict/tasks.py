@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+from .exports import DEFAULT_CHUNK_SIZE, filter_predictions, iter_export_rows, stream_csv
+from .forms import PredictionExportForm
+from .jobs import job_handler
+from .quotes import rescore_clients
+
+
+def job_output_path(name):
+    """Chemin d'un fichier produit par une tâche (le nom est celui enregistré dans Job.result)."""
+    return Path(settings.JOB_OUTPUT_DIR) / name
+
+
+@job_handler('export_predictions')
+def export_predictions(context, **params):
+    """Export CSV des prédictions vers un fichier, pour les volumes trop longs à diffuser en direct."""
+    data = export_params(params)
+    queryset = filter_predictions(data['start'], data['end'], data['region'])
+    return write_export(context, queryset, data['chunk_size'] or DEFAULT_CHUNK_SIZE, 'predictions')
+
+
+@job_handler('export_own_predictions')
+def export_own_predictions(context, **params):
+    """Export CSV des seules prédictions faites par l'auteur de la tâche (ouvert aux conseillers)."""
+    if context.job.created_by_id is None:
+        raise ValueError('Export sans auteur : aucune prédiction à exporter.')
+
+    data = export_params(params)
+    queryset = (filter_predictions(data['start'], data['end'], data['region'])
+                .filter(created_by_id=context.job.created_by_id))
+    return write_export(context, queryset, data['chunk_size'] or DEFAULT_CHUNK_SIZE, 'mes-predictions')
+
+
+def export_params(params):
+    form = PredictionExportForm(params)
+
+    if not form.is_valid():
+        raise ValueError(form.errors.as_text())
+
+    return form.cleaned_data
+
+
+def write_export(context, queryset, chunk_size, prefix):
+    context.progress(0, queryset.count(), force=True)
+
+    path = job_output_path(f'{prefix}-{context.job.pk}.csv')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix('.part')
+
+    rows = -1  # la première ligne est l'en-tête
+    with open(partial, 'w', encoding='utf-8', newline='') as output:
+        for line in stream_csv(iter_export_rows(queryset, chunk_size=chunk_size)):
+            output.write(line)
+            rows += 1
+            if rows % chunk_size == 0:
+                context.progress(rows)
+
+    # Fichier publié en entier ou pas du tout
+    os.replace(partial, path)
+    return {'file': path.name, 'rows': rows}
+
+
+@job_handler('rescore_clients')
+def rescore_client_quotes(context, chunk_size=2000, rescore_all=False):
+    """Re-scoring des devis dans un worker (un processus : les workers sont déjà parallèles)."""
+    total = 0
+
+    for _, count in rescore_clients(chunk_size=chunk_size, rescore_all=rescore_all):
+        total += count
+        context.progress(total)
+
+    return {'rows': total}
+
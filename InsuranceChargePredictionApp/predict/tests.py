@@ -1,12 +1,69 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+import asyncio
+import csv
+import importlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+import joblib
+import pandas as pd
+from threadpoolctl import threadpool_info
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command, CommandError
+from django.db import connections
+from django.http import QueryDict
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse, path
+from django.utils import timezone
+
+from accounts.backends import user_cache_key
+from InsuranceChargePredictionApp import urls as project_urls
+
+from . import explain, jobs, warmup
+from .admin import EstimatedCountPaginator, PredictionsAdmin
+from .encodings import GENDER_CODES, REGION_CODES, SMOKER_CODES, compute_bmi, model_categories_match, predict_codes
+from .executor import PredictionBusyError, run_prediction, shutdown_executor
 from .forms import PredictionForm
-from .services import predict_charges, ModelNotFoundError
-from unittest.mock import patch, MagicMock
+from .imports import _resolve_clients
+from .model_export import LIVE_MODEL_ASSET, export_model, live_model_url
+from .models import ClientInfos, Job, Predictions
+from .percentiles import SegmentRanks, segment_name, segment_ranks
+from .quotes import current_quote, refresh_quote
+from .services import (MODEL_PATH, RMSE_PATH, ModelNotFoundError, clear_model_cache, load_model, model_version,
+                       predict_batch, predict_charges, save_prediction, validated_bmi)
+from .sharedcache import SharedPredictionCache, shared_cache
+from .singleflight import SingleFlight, prediction_flight, prediction_key
+from .views import AsyncPredictionView, PortfolioView
 
 User = get_user_model()
 
+# Rangs par segment rattrapés sur place : un thread ne verrait pas les données de la transaction du test
+SPAWN_THREAD = SegmentRanks._spawn
+synchronous_ranks = patch.object(SegmentRanks, '_spawn', SegmentRanks.refresh)
+
+
+def setUpModule():
+    synchronous_ranks.start()
+
+
+def tearDownModule():
+    synchronous_ranks.stop()
+
 class PredictionViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -161,6 +218,7 @@ class PredictionViewTest(TestCase):
 
 
 class PredictionViewFormTests(TestCase):
+    databases = {'default', 'predictions'}
 
     def setUp(self):
         self.data = {
@@ -176,6 +234,9 @@ class PredictionViewFormTests(TestCase):
             'region': 'southeast',
             }
 
+        clear_model_cache()
+        self.addCleanup(clear_model_cache)
+
 
     def test_prediction_form_incomplete_returns_error(self):
         data_incomplete = {
@@ -313,6 +374,84 @@ class PredictionViewFormTests(TestCase):
 
 
 
+class PredictionFragmentTests(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.data = {
+            'first_name': 'Alice',
+            'last_name': 'Marchand',
+            'email': 'alice.marchand@gmail.com',
+            'age': 20,
+            'gender': 'female',
+            'smoker': 'no',
+            'weight': 78.5,
+            'height': 1.78,
+            'children': 2,
+            'region': 'southeast',
+            }
+
+
+    @patch('predict.views.predict_charges')
+    def test_html_fragment_returns_only_result_block(self, mock_predict):
+        mock_predict.return_value = (3000.50, 1000, 7000.50)
+
+        response = self.client.post(reverse('prediction'), data=self.data, headers={'X-Prediction-Fragment': 'html'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'predict/includes/result.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertContains(response, 'id="prediction-result"')
+        self.assertContains(response, 'Fourchette')
+        self.assertNotContains(response, '<form')
+
+
+    @patch('predict.views.predict_charges')
+    def test_json_fragment_via_accept_header(self, mock_predict):
+        mock_predict.return_value = (3000.50, 1000, 7000.50)
+
+        response = self.client.post(reverse('prediction'), data=self.data, headers={'Accept': 'application/json'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'prediction': 3000.50,
+            'range_lower': 1000,
+            'range_upper': 7000.50,
+            'errors': {},
+            'save_error': False,
+        })
+        self.assertEqual(Predictions.objects.count(), 1)
+
+
+    def test_invalid_form_fragment_returns_errors(self):
+        data = self.data.copy()
+        data['age'] = 17
+
+        response = self.client.post(reverse('prediction'), data=data, headers={'X-Prediction-Fragment': 'json'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], {'age': ['Le client doit avoir 18 ans minimum.']})
+        self.assertIsNone(response.json()['prediction'])
+
+        response = self.client.post(reverse('prediction'), data=data, headers={'X-Prediction-Fragment': 'html'})
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(response, 'Le client doit avoir 18 ans minimum.', status_code=400)
+
+
+    @patch('predict.views.predict_charges')
+    def test_advisor_fragment_skips_clients_query(self, mock_predict):
+        mock_predict.return_value = (3000.50, 1000, 7000.50)
+        advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+        self.client.force_login(advisor)
+
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.post(reverse('prediction'), data=self.data, headers={'X-Prediction-Fragment': 'html'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if '"role" = \'Client\'' in q['sql']])
+
+
+
 class PredictChargesTest(TestCase):
 
     def setUp(self):
@@ -336,6 +475,10 @@ class PredictChargesTest(TestCase):
             region='southeast'
         )
 
+        # Les tests qui simulent joblib.load doivent recharger le modèle
+        clear_model_cache()
+        self.addCleanup(clear_model_cache)
+
 
     def test_predict_charges_output_format(self):
         self.assertIsInstance(self.prediction, float)
@@ -429,4 +572,1790 @@ class PredictChargesTest(TestCase):
 
         self.assertEqual(prediction, 3658.90)
         self.assertIsNone(range_lower)
-        self.assertIsNone(range_upper)
\ No newline at end of file
+        self.assertIsNone(range_upper)
+
+
+
+class PredictionExportTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.staff = User.objects.create_user(
+            email='staff@test.fr',
+            password='Test_Staff_159',
+            role='Advisor',
+            is_staff=True
+        )
+
+        client = ClientInfos.objects.create(first_name='Alice', last_name='Marchand', email='alice@test.fr')
+        common = {'client': client, 'age': 30, 'weight': 70, 'height': 1.75, 'children': 1, 'gender': 'female', 'smoker': 'no'}
+
+        self.old = Predictions.objects.create(prediction=4000, region='southeast', **common)
+        self.recent = Predictions.objects.create(prediction=5000, region='southeast', **common)
+        self.other_region = Predictions.objects.create(prediction=6000, region='northwest', **common)
+
+        Predictions.objects.filter(pk=self.old.pk).update(date=timezone.make_aware(datetime(2025, 1, 15, 12)))
+        Predictions.objects.filter(pk__in=[self.recent.pk, self.other_region.pk]).update(
+            date=timezone.make_aware(datetime(2026, 3, 10, 23, 30)))
+
+
+    def _read_csv(self, response):
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.DictReader(StringIO(content)))
+
+
+    def test_export_requires_staff(self):
+        response = self.client.get(reverse('prediction_export'))
+        self.assertEqual(response.status_code, 302)
+
+
+    def test_export_streams_all_predictions_with_client_infos(self):
+        self.client.login(email='staff@test.fr', password='Test_Staff_159')
+        response = self.client.get(reverse('prediction_export'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        rows = self._read_csv(response)
+        self.assertEqual([int(row['id']) for row in rows], [self.old.pk, self.recent.pk, self.other_region.pk])
+        self.assertEqual(rows[0]['client_email'], 'alice@test.fr')
+
+
+    def test_export_filters_by_date_range_and_region(self):
+        self.client.login(email='staff@test.fr', password='Test_Staff_159')
+        response = self.client.get(reverse('prediction_export'), {
+            'start': '2026-03-10', 'end': '2026-03-10', 'region': 'southeast', 'chunk_size': 1})
+
+        rows = self._read_csv(response)
+        self.assertEqual([int(row['id']) for row in rows], [self.recent.pk])
+
+
+    def test_export_rejects_invalid_filters(self):
+        self.client.login(email='staff@test.fr', password='Test_Staff_159')
+        response = self.client.get(reverse('prediction_export'), {'start': '2026-03-11', 'end': '2026-03-10'})
+        self.assertEqual(response.status_code, 400)
+
+
+    def test_export_command_writes_csv(self):
+        out = StringIO()
+        call_command('export_predictions', region='northwest', stdout=out)
+
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual([int(row['id']) for row in rows], [self.other_region.pk])
+
+
+
+
+class PredictionsAdminTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@test.fr', password='Test_Admin_159')
+        self.client.login(email='admin@test.fr', password='Test_Admin_159')
+
+        self.dupont = ClientInfos.objects.create(first_name='Marie', last_name='Dupont', email='marie@test.fr')
+        self.durand = ClientInfos.objects.create(first_name='Paul', last_name='Durand', email='paul@test.fr')
+
+        for client in (self.dupont, self.durand):
+            for prediction in (3000, 4000):
+                Predictions.objects.create(
+                    client=client, created_by=None, prediction=prediction, age=30, weight=70, height=1.75,
+                    children=0, gender='male', smoker='no', region='northeast')
+
+
+    def _changelist_results(self, params=None):
+        response = self.client.get(reverse('admin:predict_predictions_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+
+    def test_changelist_query_count_does_not_depend_on_rows(self):
+        with CaptureQueriesContext(connections['predictions']) as ctx:
+            self._changelist_results()
+
+        for client in (self.dupont, self.durand):
+            Predictions.objects.create(
+                client=client, prediction=9000, age=30, weight=70, height=1.75,
+                children=0, gender='male', smoker='no', region='northeast')
+
+        with self.assertNumQueries(len(ctx.captured_queries), using='predictions'):
+            self._changelist_results()
+
+
+    def test_changelist_uses_estimated_count(self):
+        cl = self._changelist_results()
+        self.assertFalse(cl.show_full_result_count)
+        self.assertEqual(cl.paginator.count, Predictions.objects.order_by('-pk').first().pk)
+
+
+    @patch.object(PredictionsAdmin, 'list_per_page', 1)
+    def test_page_past_the_data_shows_the_last_real_page(self):
+        # Trous dans les clés : l'estimation dépasse le nombre de lignes
+        first, last = Predictions.objects.order_by('pk').first(), Predictions.objects.order_by('pk').last()
+        Predictions.objects.exclude(pk__in=[first.pk, last.pk]).delete()
+
+        response = self.client.get(reverse('admin:predict_predictions_changelist'), {'p': last.pk})
+        cl = response.context['cl']
+
+        # Liste par clé décroissante : la dernière page est celle de la plus petite
+        self.assertEqual([p.pk for p in cl.result_list], [first.pk])
+        self.assertEqual((cl.page_num, cl.result_count, cl.paginator.estimated), (2, 2, False))
+        self.assertNotContains(response, 'environ')
+
+
+    @patch.object(EstimatedCountPaginator, 'count_window', 1)
+    @patch.object(PredictionsAdmin, 'list_per_page', 1)
+    def test_filtered_count_window_follows_the_page(self):
+        cl = self._changelist_results({'region__exact': 'northeast'})
+        # Première page : comptage arrêté une ligne plus loin
+        self.assertEqual((cl.result_count, cl.paginator.estimated), (3, True))
+
+        response = self.client.get(reverse('admin:predict_predictions_changelist'), {'region__exact': 'northeast', 'p': 4})
+        cl = response.context['cl']
+        self.assertEqual(len(cl.result_list), 1)
+        self.assertEqual((cl.page_num, cl.result_count, cl.paginator.estimated), (4, 4, False))
+
+        self.assertContains(self.client.get(reverse('admin:predict_predictions_changelist'),
+                                            {'region__exact': 'northeast'}), 'environ 3')
+
+
+    def test_search_by_last_name_prefix(self):
+        cl = self._changelist_results({'q': 'dup'})
+        self.assertEqual({p.client_id for p in cl.result_list}, {self.dupont.pk})
+
+
+    def test_search_by_exact_email(self):
+        cl = self._changelist_results({'q': 'paul@test.fr'})
+        self.assertEqual({p.client_id for p in cl.result_list}, {self.durand.pk})
+
+        cl = self._changelist_results({'q': 'paul@test'})
+        self.assertEqual(len(cl.result_list), 0)
+
+
+
+class PredictRouterTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+        self.client_infos = ClientInfos.objects.create(
+            first_name='Alice', last_name='Marchand', email='alice@test.fr', user=self.advisor)
+        self.prediction = Predictions.objects.create(
+            client=self.client_infos, created_by=self.advisor, prediction=4000, age=30, weight=70,
+            height=1.75, children=0, gender='female', smoker='no', region='southeast')
+
+
+    def test_predict_models_are_stored_in_their_own_database(self):
+        self.assertEqual(self.prediction._state.db, 'predictions')
+        self.assertEqual(self.client_infos._state.db, 'predictions')
+        self.assertEqual(self.advisor._state.db, 'default')
+
+
+    def test_prediction_view_saves_into_predictions_database(self):
+        self.client.login(email='advisor@test.fr', password='Test_Advisor_159')
+        response = self.client.post(reverse('prediction'), data={
+            'first_name': 'paul', 'last_name': 'durand', 'email': 'paul@test.fr', 'age': 40,
+            'gender': 'male', 'smoker': 'yes', 'weight': 80, 'height': 1.8, 'children': 1, 'region': 'northwest'})
+
+        self.assertNotIn('save_error', response.context)
+        self.assertTrue(Predictions.objects.filter(client__email='paul@test.fr', created_by=self.advisor).exists())
+
+
+    def test_user_relation_resolves_across_databases(self):
+        prediction = Predictions.objects.get(pk=self.prediction.pk)
+        self.assertEqual(prediction.created_by, self.advisor)
+
+
+    def test_deleting_user_detaches_predictions(self):
+        self.advisor.delete()
+
+        self.prediction.refresh_from_db()
+        self.client_infos.refresh_from_db()
+        self.assertIsNone(self.prediction.created_by_id)
+        self.assertIsNone(self.client_infos.user_id)
+
+
+    def test_copy_legacy_predictions_from_default_database(self):
+        # Tables predict_* d'une installation antérieure, restées dans `default` (schéma 0002)
+        with connections['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE predict_clientinfos (id integer PRIMARY KEY, first_name varchar(50), '
+                           'last_name varchar(50), email varchar(254), user_id bigint NULL)')
+            cursor.execute('CREATE TABLE predict_predictions (id integer PRIMARY KEY, date datetime, '
+                           'prediction decimal, range_lower decimal NULL, range_upper decimal NULL, age integer, '
+                           'weight real, height real, children integer, gender varchar(6), smoker varchar(3), '
+                           'region varchar(10), client_id bigint, created_by_id bigint NULL)')
+            cursor.executemany('INSERT INTO predict_clientinfos VALUES (%s, %s, %s, %s, %s)', [
+                (1, 'Bruno', 'Petit', 'bruno@test.fr', None),
+                # Même clé qu'un client déjà présent dans la base des prédictions
+                (2, 'Alice', 'Marchand', 'alice@test.fr', self.advisor.pk),
+            ])
+            cursor.executemany('INSERT INTO predict_predictions VALUES (%s, %s, %s, NULL, NULL, %s, %s, %s, %s, %s, %s, %s, %s, %s)', [
+                (1, '2024-03-01 10:00:00', '12000.50', 50, 80, 1.8, 2, 'male', 'yes', 'northwest', 1, self.advisor.pk),
+                (2, '2024-03-02 11:00:00', '3000.00', 25, 60, 1.65, 0, 'female', 'no', 'southeast', 2, None),
+            ])
+
+        out = StringIO()
+        call_command('copy_legacy_predictions', stdout=out)
+        call_command('copy_legacy_predictions', stdout=out)
+
+        self.assertEqual(ClientInfos.objects.count(), 2)
+        self.assertEqual(Predictions.objects.count(), 3)
+
+        bruno = Predictions.objects.get(client__email='bruno@test.fr')
+        self.assertEqual(bruno.prediction, Decimal('12000.50'))
+        self.assertEqual((bruno.gender, bruno.smoker, bruno.region), ('male', 'yes', 'northwest'))
+        self.assertEqual(bruno.created_by, self.advisor)
+        self.assertEqual(bruno.bmi, compute_bmi(80, 1.8))
+        self.assertEqual(bruno.date, datetime.fromisoformat('2024-03-01 10:00:00+00:00'))
+        # Rattachée au client existant, pas à l'ancienne clé 2
+        self.assertTrue(Predictions.objects.filter(client=self.client_infos, prediction=3000).exists())
+        self.assertIn('0 prédiction(s) recopiée(s) sur 2', out.getvalue())
+
+
+
+class LiveModelExportTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pipeline = joblib.load(MODEL_PATH)
+        cls.asset_path = Path(settings.BASE_DIR) / 'static' / LIVE_MODEL_ASSET
+
+
+    def test_static_asset_matches_current_model(self):
+        # Échoue si le modèle a été réentraîné sans relancer export_live_model
+        exported = export_model(self.pipeline, rmse=joblib.load(RMSE_PATH))
+        self.assertEqual(json.loads(self.asset_path.read_text(encoding='utf-8')), exported)
+
+
+    @unittest.skipUnless(shutil.which('node'), 'node est requis pour évaluer le script JavaScript')
+    def test_js_evaluator_matches_python_predictions(self):
+        rng = random.Random(42)
+        inputs = [{
+            'age': rng.randint(18, 90),
+            'bmi': round(rng.uniform(15, 55), 2),
+            'children': rng.randint(0, 6),
+            'sex': rng.choice(['female', 'male']),
+            'smoker': rng.choice(['yes', 'no']),
+            'region': rng.choice(['northeast', 'northwest', 'southeast', 'southwest']),
+        } for _ in range(300)]
+
+        expected = self.pipeline.predict(pd.DataFrame(inputs))
+
+        script = (
+            "const live = require(process.argv[1]);"
+            "const payload = JSON.parse(require('fs').readFileSync(0, 'utf-8'));"
+            "const model = live.loadModel(payload.model);"
+            "process.stdout.write(JSON.stringify(payload.inputs.map(i => live.rawPredict(model, i))));"
+        )
+        js_file = Path(settings.BASE_DIR) / 'static' / 'javascript' / 'live_estimate.js'
+        result = subprocess.run(
+            ['node', '-e', script, str(js_file)],
+            input=json.dumps({'model': json.loads(self.asset_path.read_text(encoding='utf-8')), 'inputs': inputs}),
+            capture_output=True, text=True, check=True, timeout=30)
+
+        for row, js_value, py_value in zip(inputs, json.loads(result.stdout), expected):
+            self.assertAlmostEqual(js_value, py_value, places=6, msg=str(row))
+
+
+    @override_settings(STORAGES={
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}})
+    def test_live_model_url_enabled_when_asset_is_served(self):
+        self.assertEqual(live_model_url(), '/static/models/insurance_model.json')
+        response = self.client.get(reverse('prediction'))
+        self.assertContains(response, 'data-model-url="/static/models/insurance_model.json"')
+
+    def test_live_model_url_disabled_without_manifest_entry(self):
+        with patch('predict.model_export.static', side_effect=ValueError):
+            self.assertIsNone(live_model_url())
+            response = self.client.get(reverse('prediction'))
+            self.assertNotContains(response, 'data-model-url')
+
+
+
+@override_settings(PREDICT_API_TOKENS=['partner-token'])
+class ScoreAPITest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.payload = {
+            'age': 20,
+            'gender': 'female',
+            'smoker': 'no',
+            'weight': 78.5,
+            'height': 1.78,
+            'children': 2,
+            'region': 'southeast',
+        }
+
+
+    def post(self, payload, token='partner-token'):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return self.client.post(reverse('api_score'), data=json.dumps(payload),
+                                content_type='application/json', headers=headers)
+
+
+    def test_requires_valid_token(self):
+        self.assertEqual(self.post(self.payload, token=None).status_code, 401)
+
+        response = self.post(self.payload, token='wrong-token')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+
+
+    def test_returns_compact_prediction_without_saving(self):
+        response = self.post(self.payload)
+        prediction, range_lower, range_upper = predict_charges(20, 'female', 'no', 78.5, 1.78, 2, 'southeast')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'prediction': prediction, 'range': [range_lower, range_upper]})
+        self.assertNotIn(b' ', response.content)
+        self.assertNotIn('sessionid', response.cookies)
+        self.assertEqual(Predictions.objects.count(), 0)
+
+
+    def test_schema_mirrors_prediction_form_errors(self):
+        scenarios = [
+            ({'age': 17}, 'age'),
+            ({'age': 35.9}, 'age'),
+            ({'gender': 'Chat'}, 'gender'),
+            ({'weight': 65.89}, 'weight'),
+            ({'weight': 'soixante'}, 'weight'),
+            ({'height': 2.51}, 'height'),
+            ({'children': True}, 'children'),
+            ({'region': None}, 'region'),
+        ]
+
+        for invalid_input, field in scenarios:
+            payload = dict(self.payload, **invalid_input)
+            response = self.post(payload)
+
+            form = PredictionForm(data=dict(payload, first_name='Alice', last_name='Marchand', email='alice@test.fr'))
+            self.assertFalse(form.is_valid())
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['errors'], {field: form.errors[field]}, invalid_input)
+
+
+    def test_rejects_malformed_json(self):
+        response = self.client.post(reverse('api_score'), data='{age: 20', content_type='application/json',
+                                    headers={'Authorization': 'Bearer partner-token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'invalid_json'})
+
+
+    def test_persist_requires_client_identity_and_saves(self):
+        response = self.post(dict(self.payload, persist=True))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()['errors']), {'first_name', 'last_name', 'email'})
+
+        response = self.post(dict(self.payload, persist=True, first_name='alice', last_name='marchand',
+                                  email='alice@test.fr'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['saved'])
+
+        prediction = Predictions.objects.select_related('client').get()
+        self.assertEqual(prediction.client.last_name, 'Marchand')
+        self.assertIsNone(prediction.created_by_id)
+
+
+
+class AsyncPredictionURLConf:
+    urlpatterns = project_urls.urlpatterns + [
+        path('predict/async/', AsyncPredictionView.as_view(), name='async_prediction'),
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncPredictionURLConf)
+class AsyncPredictionViewTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.data = {
+            'first_name': 'alice',
+            'last_name': 'marchand',
+            'email': 'alice.marchand@gmail.com',
+            'age': 20,
+            'gender': 'female',
+            'smoker': 'no',
+            'weight': 78.5,
+            'height': 1.78,
+            'children': 2,
+            'region': 'southeast',
+            }
+        self.user_client = User.objects.create_user(
+            email='marie.dupont@gmail.com', first_name='Marie', last_name='Dupont', password='Marie_Dupont_123',
+            role='Client', age=19, gender='female', smoker=True, region='southwest', children=0, weight=65.8,
+            height=1.75)
+
+
+    async def test_get_prefills_form_for_logged_in_client(self):
+        await self.async_client.aforce_login(self.user_client)
+        response = await self.async_client.get(reverse('async_prediction'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].initial['email'], 'marie.dupont@gmail.com')
+        self.assertEqual(response.context['form'].initial['smoker'], 'yes')
+
+
+    async def test_post_predicts_and_saves_with_async_orm(self):
+        await self.async_client.aforce_login(self.user_client)
+        response = await self.async_client.post(reverse('async_prediction'), data=self.data)
+        expected = predict_charges(20, 'female', 'no', 78.5, 1.78, 2, 'southeast')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['prediction'], expected[0])
+        self.assertNotIn('save_error', response.context)
+
+        prediction = await Predictions.objects.select_related('client').aget()
+        self.assertEqual(prediction.client.last_name, 'Marchand')
+        self.assertEqual(prediction.client.user_id, self.user_client.pk)
+        self.assertEqual(prediction.created_by_id, self.user_client.pk)
+
+
+    async def test_invalid_form_is_rendered_with_errors(self):
+        data = dict(self.data, age=17)
+        response = await self.async_client.post(reverse('async_prediction'), data=data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('age', response.context['form'].errors)
+
+
+    @patch('predict.views.run_prediction', side_effect=PredictionBusyError)
+    def test_saturated_executor_returns_form_error(self, mock_run):
+        response = self.client.post(reverse('async_prediction'), data=self.data)
+
+        self.assertContains(response, 'Le service de prédiction est très sollicité')
+        self.assertEqual(Predictions.objects.count(), 0)
+
+
+    @patch('predict.views.run_prediction', wraps=run_prediction)
+    def test_explanation_is_computed_in_the_executor(self, mock_run):
+        response = self.client.post(reverse('async_prediction'), data=self.data)
+
+        self.assertContains(response, 'id="prediction-explanation"')
+        # Prédiction puis explication, toutes deux hors de la boucle d'événements
+        self.assertEqual([call.args[0].__name__ for call in mock_run.call_args_list],
+                         ['coalesced_predict', 'get_explanation'])
+
+
+class PredictionExecutorTest(TestCase):
+
+    def tearDown(self):
+        shutdown_executor()
+
+
+    @override_settings(PREDICT_EXECUTOR_WORKERS=1, PREDICT_EXECUTOR_MAX_PENDING=0)
+    def test_executor_rejects_calls_beyond_its_bound(self):
+        shutdown_executor()
+        release = threading.Event()
+
+        async def scenario():
+            first = asyncio.ensure_future(run_prediction(release.wait, 5))
+            await asyncio.sleep(0.05)
+
+            with self.assertRaises(PredictionBusyError):
+                await run_prediction(sum, [1, 2])
+
+            release.set()
+            self.assertTrue(await first)
+            self.assertEqual(await run_prediction(sum, [1, 2]), 3)
+
+        asyncio.run(scenario())
+
+
+
+class WarmupTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        warmup.reset()
+        clear_model_cache()
+        self.addCleanup(warmup.reset)
+        self.addCleanup(warmup.restore_native_threads)
+
+
+    def test_ready_endpoint_reports_cold_then_warm_worker(self):
+        response = self.client.get(reverse('prediction_ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['ready'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        duration = warmup.warm_up()
+
+        response = self.client.get(reverse('prediction_ready'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['ready'])
+        self.assertEqual(response.json()['warmup_ms'], duration)
+        self.assertGreater(duration, 0)
+
+
+    @patch('predict.warmup.predict_charges')
+    def test_warm_up_runs_every_canary_profile(self, mock_predict):
+        warmup.warm_up(rounds=2)
+        self.assertEqual(mock_predict.call_count, 2 * len(warmup.CANARY_PROFILES))
+
+
+    @patch('predict.warmup.load_model', side_effect=FileNotFoundError('insurance_model.pkl'))
+    def test_missing_model_leaves_worker_cold(self, mock_load):
+        with self.assertLogs('predict.warmup', level='ERROR'):
+            self.assertIsNone(warmup.warm_up())
+
+        self.assertFalse(warmup.state['warm'])
+        self.assertEqual(self.client.get(reverse('prediction_ready')).status_code, 503)
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+
+
+    @patch('predict.warmup.predict_charges', side_effect=ModelNotFoundError)
+    def test_unavailable_model_leaves_worker_cold(self, mock_predict):
+        with self.assertLogs('predict.warmup', level='ERROR'):
+            self.assertIsNone(warmup.warm_up())
+        self.assertFalse(warmup.state['warm'])
+
+
+    @patch('predict.warmup.warm_up')
+    @patch('predict.warmup.limit_native_threads')
+    def test_asgi_entry_point_warms_up_only_when_enabled(self, mock_limit, mock_warm_up):
+        from InsuranceChargePredictionApp import asgi
+
+        with override_settings(PREDICT_WARMUP_ASGI=False):
+            importlib.reload(asgi)
+        mock_warm_up.assert_not_called()
+
+        with override_settings(PREDICT_WARMUP_ASGI=True, PREDICT_NATIVE_THREADS=1):
+            importlib.reload(asgi)
+        mock_limit.assert_called_once_with(1)
+        mock_warm_up.assert_called_once_with()
+
+
+    def test_limit_native_threads_pins_blas_and_openmp_pools(self):
+        self.assertEqual(warmup.limit_native_threads(1), [1])
+        self.assertTrue(all(pool['num_threads'] == 1 for pool in threadpool_info()))
+
+
+
+class SingleFlightTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def run_concurrently(self, flight, key, func, count):
+        results, errors = [], []
+        barrier = threading.Barrier(count)
+
+        def worker():
+            barrier.wait()
+            try:
+                results.append(flight.do(key, func))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results, errors
+
+
+    def test_concurrent_duplicates_share_one_computation(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return (4200.0, 1000.0, 8400.0)
+
+        results, errors = self.run_concurrently(flight, ('profil',), compute, 8)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(4200.0, 1000.0, 8400.0)] * 8)
+        self.assertEqual(errors, [])
+        self.assertEqual(flight.stats(), {
+            'calls': 8, 'computed': 1, 'shared': 7, 'shared_cross_worker': 0, 'avoided': 7, 'in_flight': 0})
+
+
+    def test_leader_error_is_raised_to_waiters(self):
+        flight = SingleFlight('test')
+
+        def compute():
+            time.sleep(0.2)
+            raise ValueError('Le BMI n\'est pas valide.')
+
+        results, errors = self.run_concurrently(flight, ('profil',), compute, 4)
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(flight.stats()['computed'], 1)
+
+
+    def test_other_worker_reuses_result_through_lock_file(self):
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        worker_a, worker_b = SingleFlight('test', cross_worker=True), SingleFlight('test', cross_worker=True)
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.3)
+            return (4200.0, 1000.0, 8400.0)
+
+        with override_settings(PREDICT_SINGLEFLIGHT_LOCK_DIR=lock_dir.name):
+            thread = threading.Thread(target=worker_a.do, args=(('profil',), slow))
+            thread.start()
+            started.wait()
+
+            result = worker_b.do(('profil',), lambda: self.fail('le résultat aurait dû être partagé'))
+            thread.join()
+
+        self.assertEqual(result, (4200.0, 1000.0, 8400.0))
+        self.assertEqual(worker_b.stats()['shared_cross_worker'], 1)
+        self.assertEqual(worker_a.stats()['computed'], 1)
+
+
+    def test_lock_files_are_per_key_and_expire(self):
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        worker_a, worker_b = SingleFlight('test', cross_worker=True), SingleFlight('test', cross_worker=True)
+
+        with override_settings(PREDICT_SINGLEFLIGHT_LOCK_DIR=lock_dir.name, PREDICT_SINGLEFLIGHT_RESULT_TTL=60):
+            worker_a.do(('profil', 1), lambda: (1000.0, None, None))
+            worker_a.do(('profil', 2), lambda: (2000.0, None, None))
+            # Résultat frais relu sans concurrence
+            result = worker_b.do(('profil', 1), lambda: self.fail('le résultat aurait dû être partagé'))
+
+        self.assertEqual(result, (1000.0, None, None))
+        self.assertEqual(len(os.listdir(lock_dir.name)), 2)
+
+        hour_ago = time.time() - 3600
+        for name in os.listdir(lock_dir.name):
+            os.utime(os.path.join(lock_dir.name, name), (hour_ago, hour_ago))
+
+        with override_settings(PREDICT_SINGLEFLIGHT_LOCK_DIR=lock_dir.name, PREDICT_SINGLEFLIGHT_RESULT_TTL=60):
+            worker_b._swept_at -= 3600
+            self.assertEqual(worker_b.do(('profil', 3), lambda: (3000.0, None, None)), (3000.0, None, None))
+
+        # Seul le fichier encore frais reste
+        self.assertEqual(len(os.listdir(lock_dir.name)), 1)
+
+
+    def test_prediction_key_normalizes_inputs(self):
+        data = {'age': 30, 'gender': 'female', 'smoker': 'no', 'weight': 70.0, 'height': 1.7,
+                'children': 1, 'region': 'northeast'}
+        self.assertEqual(prediction_key(data), prediction_key(dict(data, weight=70, height=1.70000001)))
+
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('prediction_stats')).status_code, 302)
+
+        staff = User.objects.create_user(email='staff@test.fr', password='Staff_Test_159', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('prediction_stats'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['singleflight']['predictions'], prediction_flight.stats())
+
+
+
+class IdempotentSubmissionTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.data = {
+            'first_name': 'Alice',
+            'last_name': 'Marchand',
+            'email': 'alice.marchand@gmail.com',
+            'age': 20,
+            'gender': 'female',
+            'smoker': 'no',
+            'weight': 78.5,
+            'height': 1.78,
+            'children': 2,
+            'region': 'southeast',
+            'submission_token': 'jeton-de-test-1',
+            }
+        caches['idempotency'].clear()
+
+
+    def test_each_render_gets_a_new_hidden_token(self):
+        first = self.client.get(reverse('prediction')).context['form']['submission_token'].value()
+        second = self.client.get(reverse('prediction')).context['form']['submission_token'].value()
+
+        self.assertTrue(first)
+        self.assertNotEqual(first, second)
+        self.assertContains(self.client.get(reverse('prediction')), 'type="hidden" name="submission_token"')
+
+
+    @patch('predict.views.predict_charges')
+    def test_resubmitted_token_reuses_stored_result(self, mock_predict):
+        mock_predict.return_value = (3000.50, 1000, 7000.50)
+
+        first = self.client.post(reverse('prediction'), data=self.data)
+        with CaptureQueriesContext(connections['predictions']) as queries:
+            second = self.client.post(reverse('prediction'), data=self.data)
+
+        mock_predict.assert_called_once()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(second.context['prediction'], first.context['prediction'])
+        self.assertEqual(second.context['range_upper'], 7000.50)
+        self.assertEqual(Predictions.objects.count(), 1)
+
+
+    @patch('predict.views.predict_charges')
+    def test_same_token_with_changed_values_is_recomputed(self, mock_predict):
+        mock_predict.return_value = (3000.50, 1000, 7000.50)
+
+        self.client.post(reverse('prediction'), data=self.data)
+        self.client.post(reverse('prediction'), data=dict(self.data, weight=80))
+
+        self.assertEqual(mock_predict.call_count, 2)
+
+
+    @patch('predict.views.coalesced_save', side_effect=Exception)
+    @patch('predict.views.predict_charges')
+    def test_failed_save_is_not_replayed(self, mock_predict, mock_save):
+        mock_predict.return_value = (3000.50, 1000, 7000.50)
+
+        response = self.client.post(reverse('prediction'), data=self.data)
+        self.assertTrue(response.context['save_error'])
+
+        self.client.post(reverse('prediction'), data=self.data)
+        self.assertEqual(mock_predict.call_count, 2)
+
+
+
+
+class JobQueueTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor',
+                                                is_staff=True)
+        self.other_advisor = User.objects.create_user(email='other@test.fr', password='Test_Other_159', role='Advisor')
+        self.client_user = User.objects.create_user(email='client@test.fr', password='Test_Client_159', role='Client')
+
+        client = ClientInfos.objects.create(first_name='Alice', last_name='Marchand', email='alice@test.fr')
+        for amount, region in ((5000, 'southeast'), (5100, 'southeast'), (5200, 'northwest')):
+            Predictions.objects.create(client=client, age=30, weight=70, height=1.75, children=1,
+                                       gender='female', smoker='no', region=region, prediction=amount)
+
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir, ignore_errors=True)
+        output_settings = override_settings(JOB_OUTPUT_DIR=output_dir, JOB_RETRY_DELAY=30)
+        output_settings.enable()
+        self.addCleanup(output_settings.disable)
+
+
+    def _failing_handler(self, calls):
+        def handler(context, **params):
+            calls.append(params)
+            raise RuntimeError('base indisponible')
+
+        patcher = patch.dict(jobs.HANDLERS, {'flaky': handler})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_enqueue_rejects_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('inconnu')
+
+
+    def test_a_job_is_claimed_by_a_single_worker(self):
+        job = jobs.enqueue('export_predictions', user=self.advisor)
+
+        claimed = jobs.claim_next('worker-1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual((claimed.state, claimed.attempts, claimed.worker), (Job.RUNNING, 1, 'worker-1'))
+
+        self.assertIsNone(jobs.claim_next('worker-2'))
+
+
+    def test_worker_runs_export_and_records_result(self):
+        job = jobs.enqueue('export_predictions', {'region': 'southeast', 'chunk_size': '1'}, user=self.advisor)
+
+        self.assertEqual(jobs.run_worker(burst=True), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.SUCCEEDED)
+        self.assertEqual(job.result['rows'], 2)
+        self.assertEqual((job.progress_done, job.progress_total, job.progress), (2, 2, 100.0))
+
+        with open(Path(settings.JOB_OUTPUT_DIR) / job.result['file'], encoding='utf-8') as output:
+            self.assertEqual([row['region'] for row in csv.DictReader(output)], ['southeast', 'southeast'])
+
+
+    def test_failed_job_is_retried_with_backoff_then_marked_failed(self):
+        calls = []
+        self._failing_handler(calls)
+        job = jobs.enqueue('flaky', {'batch': 1}, max_attempts=2)
+
+        with self.assertLogs('predict.jobs', 'ERROR'):
+            jobs.run_job(jobs.claim_next('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts, job.message), (Job.PENDING, 1, 'base indisponible'))
+        self.assertGreater(job.run_after, timezone.now() + timezone.timedelta(seconds=25))
+
+        # Pas encore exécutable : le worker ne la reprend qu'après le délai
+        self.assertIsNone(jobs.claim_next('worker-1'))
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+        with self.assertLogs('predict.jobs', 'ERROR'):
+            jobs.run_job(jobs.claim_next('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, [{'batch': 1}, {'batch': 1}])
+
+
+    def test_stale_running_job_is_requeued(self):
+        job = jobs.enqueue('export_predictions')
+        jobs.claim_next('worker-mort')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timezone.timedelta(hours=1))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim_next('worker-2').pk, job.pk)
+
+
+    def test_heartbeat_runs_while_the_handler_is_silent(self):
+        jobs.enqueue('export_predictions')
+        claimed = jobs.claim_next('worker-1')
+        beats = []
+        two_beats = threading.Event()
+
+        def beat(**fields):
+            beats.append(fields)
+            if len(beats) == 2:
+                two_beats.set()
+            return 1
+
+        # Écritures depuis le thread : hors de la transaction du test, d'où le mock
+        with override_settings(JOB_STALE_AFTER=0.3), patch('predict.jobs.owned') as owned:
+            owned.return_value.update.side_effect = beat
+            heartbeat = jobs.Heartbeat(claimed)
+            heartbeat.start()
+            self.assertTrue(two_beats.wait(timeout=10))
+            heartbeat.stop()
+
+            self.assertIn('heartbeat_at', beats[0])
+            owned.assert_called_with(claimed)
+
+            # Tâche reprise par un autre worker : le battement s'arrête de lui-même
+            owned.return_value.update.side_effect = None
+            owned.return_value.update.return_value = 0
+            heartbeat = jobs.Heartbeat(claimed)
+            heartbeat.start()
+            heartbeat.join(timeout=10)
+            self.assertFalse(heartbeat.is_alive())
+
+
+    def test_requeued_job_is_not_overwritten_by_the_stale_worker(self):
+        job = jobs.enqueue('export_predictions', user=self.advisor)
+        stale_run = jobs.claim_next('worker-lent')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timezone.timedelta(hours=1))
+        jobs.requeue_stale()
+        jobs.claim_next('worker-2')
+
+        self.assertFalse(jobs.run_job(stale_run))
+
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.worker), (Job.RUNNING, 'worker-2'))
+
+
+    def test_advisor_enqueues_and_follows_an_export(self):
+        self.client.login(email='advisor@test.fr', password='Test_Advisor_159')
+
+        response = self.client.post(reverse('job_list'), {'kind': 'export_predictions', 'region': 'northwest'})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertEqual(response['Location'], status_url)
+        self.assertEqual(Job.objects.get().params, {'region': 'northwest'})
+
+        self.assertEqual(self.client.get(status_url).json()['state'], Job.PENDING)
+
+        call_command('run_workers', burst=True, stdout=StringIO())
+
+        status = self.client.get(status_url).json()
+        self.assertEqual(status['state'], Job.SUCCEEDED)
+
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        rows = list(csv.DictReader(StringIO(b''.join(download.streaming_content).decode('utf-8'))))
+        self.assertEqual([row['region'] for row in rows], ['northwest'])
+
+
+    def test_job_views_reject_invalid_params_and_other_users(self):
+        self.client.login(email='advisor@test.fr', password='Test_Advisor_159')
+        response = self.client.post(reverse('job_list'), {'kind': 'export_predictions', 'start': 'hier'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start', response.json()['errors'])
+
+        job = jobs.enqueue('export_predictions', user=self.advisor)
+
+        self.client.login(email='other@test.fr', password='Test_Other_159')
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+
+        self.client.login(email='client@test.fr', password='Test_Client_159')
+        self.assertEqual(self.client.post(reverse('job_list'), {'kind': 'export_predictions'}).status_code, 403)
+
+
+    def test_full_export_is_staff_only(self):
+        self.client.login(email='other@test.fr', password='Test_Other_159')
+        self.assertEqual(self.client.post(reverse('job_list'), {'kind': 'export_predictions'}).status_code, 403)
+        self.assertFalse(Job.objects.exists())
+
+        # Export lancé avant la restriction : pas de téléchargement non plus
+        job = jobs.enqueue('export_predictions', user=self.other_advisor)
+        jobs.run_worker(burst=True)
+        self.assertEqual(self.client.get(reverse('job_download', args=[job.pk])).status_code, 403)
+
+
+    def test_advisor_exports_only_their_own_predictions(self):
+        client = ClientInfos.objects.get()
+        Predictions.objects.create(client=client, age=31, weight=70, height=1.75, children=1, gender='female',
+                                   smoker='no', region='northeast', prediction=6000, created_by=self.other_advisor)
+        self.client.login(email='other@test.fr', password='Test_Other_159')
+
+        response = self.client.post(reverse('job_list'), {'kind': 'export_own_predictions'})
+        self.assertEqual(response.status_code, 202)
+        call_command('run_workers', burst=True, stdout=StringIO())
+
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual((status['state'], status['kind']), (Job.SUCCEEDED, 'export_own_predictions'))
+        download = self.client.get(status['download_url'])
+        rows = list(csv.DictReader(StringIO(b''.join(download.streaming_content).decode('utf-8'))))
+        self.assertEqual([row['prediction'] for row in rows], ['6000.00'])
+
+        # Sans auteur, l'export n'a pas de périmètre : la tâche échoue plutôt que de tout exporter
+        job = jobs.enqueue('export_own_predictions', max_attempts=1)
+        with self.assertLogs('predict.jobs', 'ERROR'):
+            jobs.run_worker(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.state, Job.FAILED)
+
+
+
+
+class PredictionPageQuoteTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(
+            email='client@test.fr', password='Test_Client_159', role='Client',
+            age=40, gender='male', weight=80, height=1.80, smoker=True, children=2, region='southwest')
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+        refresh_quote(self.client_user)
+
+
+    def test_client_sees_precomputed_quote_without_model_call(self):
+        self.client.login(email='client@test.fr', password='Test_Client_159')
+
+        with patch('predict.views.predict_charges') as predict, patch('predict.quotes.predict_charges') as quote_predict:
+            response = self.client.get(reverse('prediction'))
+            predict.assert_not_called()
+            quote_predict.assert_not_called()
+
+        self.assertEqual(response.context['quote']['prediction'], self.client_user.quote)
+        self.assertContains(response, 'id="current-quote"')
+
+
+    def test_advisor_sees_selected_client_quote(self):
+        self.client.login(email='advisor@test.fr', password='Test_Advisor_159')
+
+        response = self.client.get(reverse('prediction'))
+        self.assertIsNone(response.context['quote'])
+
+        response = self.client.get(reverse('prediction'), {'user_id': self.client_user.pk})
+        self.assertEqual(response.context['quote']['prediction'], self.client_user.quote)
+
+
+
+
+class RescoreClientsTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    PROFILES = [
+        (25, 'female', 'no', 60, 1.65, 0, 'northeast'),
+        (52, 'male', 'yes', 95, 1.80, 3, 'southeast'),
+        (38, 'female', 'yes', 72, 1.70, 1, 'southwest'),
+    ]
+
+    def setUp(self):
+        self.clients = [
+            User.objects.create_user(
+                email=f'client{i}@test.fr', password='Test_Client_159', role='Client',
+                age=age, gender=gender, smoker=smoker == 'yes', weight=weight, height=height,
+                children=children, region=region)
+            for i, (age, gender, smoker, weight, height, children, region) in enumerate(self.PROFILES)
+        ]
+        self.incomplete = User.objects.create_user(email='incomplet@test.fr', password='Test_Client_159', role='Client')
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+
+
+    def _rescore(self, *args, **options):
+        out = StringIO()
+        call_command('rescore_clients', *args, stdout=out, **options)
+        return out.getvalue()
+
+
+    def test_batch_matches_single_predictions(self):
+        profiles = self.PROFILES + [(30, 'male', 'no', 300, 1.80, 0, 'northwest')]
+
+        self.assertEqual(predict_batch(profiles), [predict_charges(*profile) for profile in self.PROFILES] + [None])
+
+
+    def test_command_rescores_clients_and_invalidates_cache(self):
+        cache.set(user_cache_key(self.clients[0].pk), self.clients[0])
+
+        self.assertIn('4 client(s)', self._rescore('--chunk-size', '2'))
+
+        for user, profile in zip(self.clients, self.PROFILES):
+            user.refresh_from_db()
+            self.assertEqual((user.quote, user.quote_range_lower, user.quote_range_upper), predict_charges(*profile))
+            self.assertEqual(user.quote_model_version, model_version())
+
+        self.incomplete.refresh_from_db()
+        self.assertIsNone(self.incomplete.quote)
+        self.assertIsNone(current_quote(self.incomplete))
+        self.assertIsNone(User.objects.get(pk=self.advisor.pk).quote_updated_at)
+        self.assertIsNone(cache.get(user_cache_key(self.clients[0].pk)))
+
+        # Devis à jour, profil incomplet compris : rien à refaire, sauf avec --all
+        self.assertIn('0 client(s)', self._rescore())
+        self.assertIn('4 client(s)', self._rescore('--all'))
+
+
+    def test_command_resumes_from_checkpoint(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        checkpoint = Path(directory) / 'rescore.json'
+        checkpoint.write_text(json.dumps({'model_version': model_version(), 'last_pk': self.clients[1].pk}))
+
+        output = self._rescore('--checkpoint', str(checkpoint))
+
+        self.assertIn(f'Reprise après le client {self.clients[1].pk}', output)
+        self.assertEqual(
+            list(User.objects.filter(role='Client').exclude(quote=None).values_list('pk', flat=True)),
+            [self.clients[2].pk])
+        self.assertFalse(checkpoint.exists())
+
+
+    def test_command_scores_in_worker_processes(self):
+        self._rescore('--processes', '2', '--chunk-size', '1')
+
+        self.assertEqual(
+            [User.objects.get(pk=user.pk).quote for user in self.clients],
+            [predict_charges(*profile)[0] for profile in self.PROFILES])
+
+
+
+
+class PortfolioViewTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+        self.other = User.objects.create_user(email='other@test.fr', password='Test_Other_159', role='Advisor')
+        self.client_user = User.objects.create_user(email='client@test.fr', password='Test_Client_159', role='Client')
+
+        self.latest = {}
+        self._add_clients(3)
+        self.foreign = self._prediction(ClientInfos.objects.create(first_name='Zoé', last_name='Autre', email='zoe@test.fr'),
+                                        9999, 'northeast', 'no', 2026, self.other)
+        self.client.login(email='advisor@test.fr', password='Test_Advisor_159')
+
+
+    def _prediction(self, client, amount, region, smoker, year, created_by):
+        prediction = Predictions.objects.create(
+            client=client, created_by=created_by, prediction=amount, region=region, smoker=smoker,
+            age=30, weight=70, height=1.75, children=0, gender='female')
+        Predictions.objects.filter(pk=prediction.pk).update(date=timezone.make_aware(datetime(year, 1, 1 + client.pk % 28)))
+        return prediction
+
+
+    def _add_clients(self, count):
+        start = len(self.latest)
+        for i in range(start, start + count):
+            client = ClientInfos.objects.create(first_name='Client', last_name=f'Numero{i}', email=f'client{i}@test.fr')
+            # Ancienne prédiction non-fumeur, puis la plus récente qui doit apparaître
+            self._prediction(client, 1000 + i, 'southwest', 'no', 2024, self.advisor)
+            region = 'southeast' if i % 2 else 'northwest'
+            self.latest[client.pk] = self._prediction(client, 5000 + i * 10, region, 'yes' if i % 3 == 0 else 'no', 2025, self.advisor)
+
+
+    def test_lists_latest_prediction_of_each_own_client(self):
+        response = self.client.get(reverse('prediction_portfolio'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row.pk for row in response.context['rows']}, {p.pk for p in self.latest.values()})
+        self.assertNotContains(response, 'zoe@test.fr')
+
+
+    def test_filters_and_sorts_on_latest_prediction(self):
+        response = self.client.get(reverse('prediction_portfolio'), {'region': 'northwest', 'sort': 'charge'})
+        expected = sorted((p for p in self.latest.values() if p.region == 'northwest'), key=lambda p: p.prediction)
+        self.assertEqual([row.pk for row in response.context['rows']], [p.pk for p in expected])
+
+        response = self.client.get(reverse('prediction_portfolio'), {'smoker': 'yes'})
+        self.assertEqual([row.pk for row in response.context['rows']],
+                         [p.pk for p in self.latest.values() if p.smoker == 'yes'])
+
+
+    def test_keyset_pages_cover_all_clients_once(self):
+        self._add_clients(4)
+        seen, query = [], {'sort': '-charge'}
+
+        with patch.object(PortfolioView, 'paginate_by', 3):
+            while True:
+                response = self.client.get(reverse('prediction_portfolio'), query)
+                seen += [row.pk for row in response.context['rows']]
+                if 'next_query' not in response.context:
+                    break
+                query = QueryDict(response.context['next_query'])
+
+        expected = sorted(self.latest.values(), key=lambda p: p.prediction, reverse=True)
+        self.assertEqual(seen, [p.pk for p in expected])
+
+
+    def test_query_count_does_not_grow_with_portfolio(self):
+        with CaptureQueriesContext(connections['predictions']) as small:
+            self.client.get(reverse('prediction_portfolio'))
+
+        self._add_clients(20)
+        with CaptureQueriesContext(connections['predictions']) as large:
+            response = self.client.get(reverse('prediction_portfolio'))
+
+        self.assertEqual(len(response.context['rows']), 23)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(large), 1)
+
+
+    def test_invalid_cursor_and_access(self):
+        response = self.client.get(reverse('prediction_portfolio'), {'sort': 'charge', 'after': 'abc~1'})
+        self.assertEqual(response.context['rows'], [])
+        self.assertContains(response, 'La page demandée est invalide.')
+
+        self.client.login(email='client@test.fr', password='Test_Client_159')
+        self.assertEqual(self.client.get(reverse('prediction_portfolio')).status_code, 403)
+
+
+
+
+class CategoricalEncodingTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        client = ClientInfos.objects.create(first_name='Alice', last_name='Marchand', email='alice@test.fr')
+        self.prediction = Predictions.objects.create(
+            client=client, prediction=5000, age=30, weight=70, height=1.75, children=1,
+            gender='male', smoker='yes', region='southwest')
+
+
+    def test_columns_store_codes_and_read_back_values(self):
+        with connections['predictions'].cursor() as cursor:
+            cursor.execute('SELECT gender, smoker, region FROM predict_predictions WHERE id = %s', [self.prediction.pk])
+            self.assertEqual(cursor.fetchone(), (1, 1, 3))
+
+        prediction = Predictions.objects.get(region='southwest', smoker='yes')
+        self.assertEqual((prediction.gender, prediction.get_region_display()), ('male', 'Sud-Ouest'))
+        self.assertEqual(list(Predictions.objects.values_list('region', flat=True)), ['southwest'])
+
+        with self.assertRaises(ValueError):
+            Predictions.objects.filter(region='atlantis').exists()
+
+
+    def test_user_fields_are_coded_too(self):
+        user = User.objects.create_user(email='client@test.fr', password='Test_Client_159', gender='female', region='northeast')
+
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT gender, region FROM accounts_customuser WHERE id = %s', [user.pk])
+            self.assertEqual(cursor.fetchone(), (0, 0))
+
+        self.assertEqual(User.objects.get(pk=user.pk).gender, 'female')
+
+
+    def test_codes_feed_the_model_like_the_pipeline(self):
+        model = load_model()
+        self.assertTrue(model_categories_match(model))
+
+        frame = pd.DataFrame({
+            'age': [25, 52, 38, 61],
+            'children': [0, 3, 1, 2],
+            'smoker': ['no', 'yes', 'yes', 'no'],
+            'bmi': [22.04, 29.32, 24.91, 33.5],
+            'sex': ['female', 'male', 'female', 'male'],
+            'region': ['northeast', 'southeast', 'southwest', 'northwest'],
+        })
+        codes = predict_codes(
+            model, frame['age'], frame['bmi'], frame['children'],
+            [GENDER_CODES[value] for value in frame['sex']],
+            [SMOKER_CODES[value] for value in frame['smoker']],
+            [REGION_CODES[value] for value in frame['region']])
+
+        self.assertEqual(list(codes), list(model.predict(frame)))
+
+
+
+class StoredBMITest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.client_infos = ClientInfos.objects.create(first_name='Alice', last_name='Marchand', email='alice@test.fr')
+
+
+    def _prediction(self, prediction, weight, height):
+        return Predictions(
+            client=self.client_infos, prediction=prediction, age=30, weight=weight, height=height, children=0,
+            gender='female', smoker='no', region='northeast')
+
+
+    def test_bmi_is_stored_with_model_rounding(self):
+        prediction = self._prediction(5000, 70, 1.75)
+        prediction.save()
+
+        self.assertEqual(Predictions.objects.get(pk=prediction.pk).bmi, validated_bmi(70, 1.75))
+
+        # Recalculé quand le poids change
+        prediction.weight = 95
+        prediction.save()
+        self.assertEqual(Predictions.objects.get(pk=prediction.pk).bmi, compute_bmi(95, 1.75))
+
+
+    def test_bulk_create_and_range_queries(self):
+        Predictions.objects.bulk_create([
+            self._prediction(5000, 60, 1.80),
+            self._prediction(6000, 90, 1.70),
+            self._prediction(7000, 120, 1.65),
+        ])
+
+        obese = Predictions.objects.filter(bmi__gte=30).order_by('bmi')
+        self.assertEqual(list(obese.values_list('prediction', flat=True)), [6000, 7000])
+
+
+    def test_user_bmi_value_follows_profile(self):
+        user = User.objects.create_user(email='client@test.fr', password='Test_Client_159', weight=80, height=1.80)
+        self.assertEqual(User.objects.get(pk=user.pk).bmi_value, user.bmi)
+
+        user.weight = None
+        user.save()
+        self.assertIsNone(User.objects.get(pk=user.pk).bmi_value)
+
+
+class ImportPredictionsTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+    def _import(self, content, **options):
+        path = Path(self.directory) / 'import.csv'
+        path.write_text(content, encoding='utf-8')
+        out, err = StringIO(), StringIO()
+        call_command('import_predictions', str(path), stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+
+    def test_imports_standard_dataset_and_skips_invalid_rows(self):
+        out, err = self._import(
+            'age,sex,bmi,children,smoker,region,charges\n'
+            '19,female,27.9,0,yes,southwest,16884.924\n'
+            '18,male,33.77,1,no,southeast,1725.5523\n'
+            '28,male,33,3,maybe,southeast,4449.462\n', batch_size=2)
+
+        self.assertIn('2 prédiction(s) importée(s), 1 ligne(s) ignorée(s)', out)
+        self.assertIn('Ligne 4 ignorée', err)
+
+        predictions = Predictions.objects.order_by('age')
+        self.assertEqual([(p.age, p.bmi, p.prediction) for p in predictions],
+                         [(18, 33.77, Decimal('1725.55')), (19, 27.9, Decimal('16884.92'))])
+        # Une seule fiche client pour les lignes sans coordonnées
+        self.assertEqual(ClientInfos.objects.count(), 1)
+
+
+    def test_imports_export_format_with_clients_and_dates(self):
+        ClientInfos.objects.create(first_name='Alice', last_name='Marchand', email='alice@test.fr')
+        rows = [
+            'client_first_name,client_last_name,client_email,date,age,gender,weight,height,children,smoker,region,prediction',
+            'alice,marchand,alice@test.fr,2023-05-01 10:00:00,30,female,70,1.75,1,no,northeast,5000',
+            'Bruno,Petit,bruno@test.fr,2023-05-02 10:00:00,45,male,90,1.80,2,yes,northwest,25000',
+            'Bruno,Petit,bruno@test.fr,2023-06-02 10:00:00,45,male,92,1.80,2,yes,northwest,26000',
+        ]
+        self._import('\n'.join(rows) + '\n', batch_size=1)
+
+        self.assertEqual(ClientInfos.objects.count(), 2)
+        self.assertEqual(Predictions.objects.filter(client__email='alice@test.fr').count(), 1)
+        self.assertEqual(list(Predictions.objects.filter(client__email='bruno@test.fr')
+                              .order_by('date').values_list('date__month', flat=True)), [5, 6])
+
+
+    def test_client_index_holds_only_the_current_batch(self):
+        rows = ['client_first_name,client_last_name,client_email,age,gender,weight,height,children,smoker,region,prediction']
+        rows += [f'Client,Numero{i},client{i}@test.fr,30,female,70,1.75,1,no,northeast,{5000 + i}' for i in range(6)]
+        sizes = []
+
+        def resolve(keys, known, db):
+            _resolve_clients(keys, known, db)
+            sizes.append(len(known))
+
+        with patch('predict.imports._resolve_clients', side_effect=resolve):
+            self._import('\n'.join(rows) + '\n', batch_size=2)
+
+        self.assertEqual(sizes, [2, 2, 2])
+        self.assertEqual(Predictions.objects.values('client').distinct().count(), 6)
+
+
+    def test_non_finite_and_out_of_bounds_values_skip_the_row(self):
+        out, err = self._import(
+            'age,sex,bmi,children,smoker,region,charges\n'
+            'inf,female,27.9,0,yes,southwest,16884.92\n'
+            '1e400,female,27.9,0,yes,southwest,16884.92\n'
+            '19,female,27.9,0,yes,southwest,NaN\n'
+            '19,female,inf,0,yes,southwest,1000\n'
+            '19,female,nan,0,yes,southwest,1000\n'
+            '19,female,5,0,yes,southwest,1000\n'
+            '17,female,27.9,0,yes,southwest,1000\n'
+            '126,female,27.9,0,yes,southwest,1000\n'
+            '19,female,27.9,16,yes,southwest,1000\n'
+            '19,female,27.9,0,yes,southwest,16884.92\n')
+
+        self.assertIn('1 prédiction(s) importée(s), 9 ligne(s) ignorée(s)', out)
+        self.assertEqual([line.split()[1] for line in err.splitlines()],
+                         ['2', '3', '4', '5', '6', '7', '8', '9', '10'])
+        self.assertIn('Ligne 10 ignorée : children hors limites : 16', err)
+        self.assertEqual(list(Predictions.objects.values_list('bmi', flat=True)), [27.9])
+
+
+    def test_counts_only_inserted_rows_and_checks_authors(self):
+        advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+        header = 'age,sex,bmi,children,smoker,region,charges,created_by_id\n'
+        row = '19,female,27.9,0,yes,southwest,16884.92,{}\n'
+        self._import(header + row.format(advisor.pk))
+
+        out, err = self._import(header + row.format(advisor.pk) + '20,male,30,1,no,northeast,2000,9999\n')
+
+        # Ligne déjà importée (même client, même montant) et auteur inexistant
+        self.assertIn('0 prédiction(s) importée(s), 2 ligne(s) ignorée(s)', out)
+        self.assertIn('Ligne 3 ignorée : auteur inconnu : 9999', err)
+        self.assertEqual(Predictions.objects.get().created_by, advisor)
+
+
+    def test_missing_columns_are_rejected(self):
+        with self.assertRaisesMessage(CommandError, 'Colonnes manquantes : prediction'):
+            self._import('age,sex,bmi,children,smoker,region\n19,female,27.9,0,yes,southwest\n')
+
+        self.assertFalse(Predictions.objects.exists())
+
+
+class SavePredictionUpsertTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.data = {
+            'first_name': 'Alice', 'last_name': 'Marchand', 'email': 'alice@test.fr',
+            'age': 30, 'gender': 'female', 'smoker': 'no', 'weight': 70, 'height': 1.75,
+            'children': 1, 'region': 'northeast',
+        }
+        self.client_user = User.objects.create_user(email='client@test.fr', password='Test_Client_159', role='Client')
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+
+
+    def test_submit_takes_two_statements(self):
+        with CaptureQueriesContext(connections['predictions']) as queries:
+            save_prediction(self.data, 5000, 1000, 9000, user=self.advisor)
+
+        self.assertLessEqual(len(queries), 2)
+        prediction = Predictions.objects.select_related('client').get()
+        self.assertEqual((prediction.client.first_name, prediction.created_by_id), ('Alice', self.advisor.pk))
+
+
+    def test_duplicate_submissions_do_not_fail(self):
+        save_prediction(self.data, 5000, 1000, 9000, user=self.client_user)
+        # Même client et même prédiction, enregistrés par un autre utilisateur
+        save_prediction(self.data, 5000, 1000, 9000, user=self.advisor)
+
+        self.assertEqual(Predictions.objects.count(), 1)
+        # Le client existant garde son utilisateur, comme avec get_or_create
+        self.assertEqual(ClientInfos.objects.get().user_id, self.client_user.pk)
+
+
+    def test_form_normalizes_names_once(self):
+        form = PredictionForm(data=dict(self.data, first_name='alice', last_name='MARCHAND'))
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual((form.cleaned_data['first_name'], form.cleaned_data['last_name']), ('Alice', 'Marchand'))
+
+
+class SharedPredictionCacheTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.data = {
+            'first_name': 'Alice', 'last_name': 'Marchand', 'email': 'alice@test.fr',
+            'age': 30, 'gender': 'female', 'smoker': 'no', 'weight': 70, 'height': 1.75,
+            'children': 1, 'region': 'northeast',
+        }
+        self.cache = SharedPredictionCache()
+        self._enable(64)
+
+
+    def _enable(self, slots):
+        shm_settings = override_settings(PREDICT_SHM_CACHE_SLOTS=slots, PREDICT_SHM_CACHE_NAME=f'test-{os.getpid()}-{slots}')
+        shm_settings.enable()
+        self.addCleanup(shm_settings.disable)
+        self.addCleanup(self.cache.close, unlink=True)
+
+
+    def test_round_trip_keyed_by_inputs_and_model_version(self):
+        self.assertIsNone(self.cache.get(self.data))
+        self.cache.put(self.data, (5000.12, None, 9000.5))
+
+        self.assertEqual(self.cache.get(self.data), (5000.12, None, 9000.5))
+        self.assertIsNone(self.cache.get(dict(self.data, children=2)))
+
+        with patch('predict.sharedcache.model_version', return_value='0123456789abcdef'):
+            self.assertIsNone(self.cache.get(self.data))
+
+        stats = self.cache.stats()
+        self.assertEqual((stats['used'], stats['hits'], stats['misses']), (1, 1, 3))
+
+
+    def test_entries_are_shared_with_other_processes(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                SharedPredictionCache().put(self.data, (4000.0, 1000.0, 8000.0))
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(self.cache.get(self.data), (4000.0, 1000.0, 8000.0))
+
+
+    def test_full_table_evicts_entries_not_read_since_last_pass(self):
+        self._enable(8)
+        profiles = [dict(self.data, age=age) for age in range(20, 28)]
+        for age, profile in enumerate(profiles):
+            self.cache.put(profile, (float(age), None, None))
+
+        self.assertEqual(self.cache.stats()['occupancy'], 1.0)
+        self.assertIsNotNone(self.cache.get(profiles[0]))
+
+        self.cache.put(dict(self.data, age=60), (60.0, None, None))
+
+        self.assertIsNotNone(self.cache.get(profiles[0]))
+        self.assertIsNotNone(self.cache.get(dict(self.data, age=60)))
+        self.assertEqual(sum(self.cache.get(profile) is None for profile in profiles), 1)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+    @patch('predict.views.predict_charges')
+    def test_views_read_the_shared_cache(self, mock_predict):
+        mock_predict.return_value = (3000.5, 1000, 7000.5)
+        self.addCleanup(shared_cache.close, unlink=True)
+
+        for _ in range(2):
+            response = self.client.post(reverse('prediction'), data=self.data)
+            self.assertEqual(response.context['prediction'], 3000.5)
+        mock_predict.assert_called_once()
+
+        staff = User.objects.create_user(email='staff@test.fr', password='Staff_Test_159', is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(reverse('prediction_stats')).json()['shared_cache']
+        self.assertEqual((stats['enabled'], stats['used'], stats['hits']), (True, 1, 1))
+
+
+@override_settings(PREDICT_PERCENTILES_REFRESH=0)
+class SegmentRankTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.client_infos = ClientInfos.objects.create(first_name='Alice', last_name='Marchand', email='alice@test.fr')
+        Predictions.objects.bulk_create(
+            [self._prediction(amount, 'yes', 'southeast') for amount in range(1000, 41000, 1000)]
+            + [self._prediction(500 + amount, 'no', 'northwest') for amount in range(5)])
+        segment_ranks.reset()
+        self.addCleanup(segment_ranks.reset)
+
+
+    def _prediction(self, amount, smoker, region):
+        return Predictions(client=self.client_infos, prediction=amount, age=40, weight=80, height=1.80,
+                           children=0, gender='male', smoker=smoker, region=region)
+
+
+    def test_rank_within_segment(self):
+        self.assertEqual(segment_ranks.rank('yes', 'southeast', 34000), {'percentile': 84, 'count': 40})
+        self.assertEqual(segment_ranks.rank('yes', 'southeast', 50000)['percentile'], 100)
+        # Trop peu de prédictions dans le segment
+        self.assertIsNone(segment_ranks.rank('no', 'northwest', 502))
+
+
+    def test_new_predictions_are_merged_incrementally(self):
+        segment_ranks.rank('yes', 'southeast', 34000)
+        Predictions.objects.bulk_create([self._prediction(100 + amount, 'yes', 'southeast') for amount in range(40)])
+
+        with CaptureQueriesContext(connections['predictions']) as queries:
+            rank = segment_ranks.rank('yes', 'southeast', 34000)
+
+        self.assertEqual(rank, {'percentile': 92, 'count': 80})
+        self.assertIn('"id" >', queries[0]['sql'])
+
+
+    def test_state_is_persisted_for_restart(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory) / 'ranks.npz'
+
+        with override_settings(PREDICT_PERCENTILES_PATH=str(path)):
+            expected = segment_ranks.rank('yes', 'southeast', 34000)
+            self.assertTrue(path.exists())
+
+            restarted = SegmentRanks()
+            with CaptureQueriesContext(connections['predictions']) as queries:
+                self.assertEqual(restarted.rank('yes', 'southeast', 34000), expected)
+
+        # Vérification du fichier, puis lecture des seules prédictions postérieures
+        self.assertEqual(len(queries), 2)
+
+
+    def test_corrupted_state_file_is_rebuilt(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory) / 'ranks.npz'
+        # Archive tronquée (écriture interrompue)
+        path.write_bytes(b'PK\x03\x04tronque')
+
+        with override_settings(PREDICT_PERCENTILES_PATH=str(path)), self.assertLogs('predict.percentiles', 'WARNING'):
+            self.assertEqual(segment_ranks.rank('yes', 'southeast', 34000)['count'], 40)
+
+        # Réécrit en entier, sans fichier temporaire laissé à côté
+        self.assertEqual(os.listdir(directory), ['ranks.npz'])
+        with override_settings(PREDICT_PERCENTILES_PATH=str(path)):
+            self.assertEqual(SegmentRanks()._load()[1], Predictions.objects.order_by('pk').last().pk)
+
+
+    def test_busy_refresh_does_not_block_readers(self):
+        # Rattrapage en cours dans un autre thread : pas d'attente, pas encore de rang
+        with segment_ranks._lock:
+            with CaptureQueriesContext(connections['predictions']) as queries:
+                self.assertIsNone(segment_ranks.rank('yes', 'southeast', 34000))
+        self.assertEqual(len(queries), 0)
+
+
+    def test_stale_ranks_are_caught_up_in_a_background_thread(self):
+        ranks = SegmentRanks()
+        threads = []
+        caught_up = threading.Event()
+
+        def refresh():
+            threads.append(threading.current_thread().name)
+            caught_up.set()
+
+        ranks.refresh = refresh
+        with patch.object(SegmentRanks, '_spawn', SPAWN_THREAD):
+            with CaptureQueriesContext(connections['predictions']) as queries:
+                self.assertIsNone(ranks.rank('yes', 'southeast', 34000))
+            self.assertTrue(caught_up.wait(timeout=10))
+
+        # La requête n'a fait qu'une lecture en mémoire
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(threads, ['segment-ranks'])
+
+
+    @patch('predict.warmup.predict_charges')
+    def test_warm_up_catches_up_segment_ranks(self, mock_predict):
+        warmup.warm_up(rounds=1)
+        self.addCleanup(warmup.reset)
+
+        self.assertEqual(segment_ranks._last_pk, Predictions.objects.order_by('pk').last().pk)
+        self.assertEqual(len(segment_ranks._values[segment_name('yes', 'southeast')]), 40)
+
+
+    @patch('predict.views.predict_charges')
+    def test_prediction_page_shows_segment_rank(self, mock_predict):
+        mock_predict.return_value = (34000.0, 30000.0, 38000.0)
+
+        response = self.client.post(reverse('prediction'), data={
+            'first_name': 'Bruno', 'last_name': 'Petit', 'email': 'bruno@test.fr', 'age': 45,
+            'gender': 'male', 'smoker': 'yes', 'weight': 90, 'height': 1.80, 'children': 2, 'region': 'southeast',
+        })
+
+        # La prédiction enregistrée compte dans son segment
+        self.assertEqual(response.context['segment_rank']['count'], 41)
+        self.assertContains(response, 'percentile parmi les fumeurs')
+        self.assertContains(response, 'de la région Sud-Est')
+
+
+class SensitivityViewTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.profile = {'age': 40, 'gender': 'male', 'smoker': 'yes', 'weight': 95, 'height': 1.78,
+                        'children': 2, 'region': 'southeast'}
+        self.advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+
+
+    def test_curves_are_scored_in_one_batch(self):
+        self.client.force_login(self.advisor)
+
+        with patch('predict.whatif.predict_batch', wraps=predict_batch) as batch:
+            response = self.client.get(reverse('prediction_whatif'), self.profile)
+
+        self.assertEqual(response.status_code, 200)
+        batch.assert_called_once()
+
+        curves = response.json()
+        expected = predict_charges(40, 'male', 'yes', 95, 1.78, 2, 'southeast')[0]
+        self.assertEqual(curves['base'], expected)
+        self.assertEqual(curves['age']['x'], list(range(40, 61)))
+        self.assertEqual(curves['children']['x'], [0, 1, 2, 3, 4, 5])
+        self.assertEqual(curves['weight']['x'][0], 75)
+        self.assertIn(95, curves['weight']['x'])
+
+        index = curves['weight']['x'].index(95)
+        self.assertEqual(curves['weight']['yes'][index], expected)
+        # Arrêter de fumer fait baisser les charges
+        self.assertLess(curves['weight']['no'][index], expected)
+
+
+    def test_invalid_profile_and_access(self):
+        self.assertEqual(self.client.get(reverse('prediction_whatif'), self.profile).status_code, 302)
+
+        client_user = User.objects.create_user(email='client@test.fr', password='Test_Client_159', role='Client')
+        self.client.force_login(client_user)
+        self.assertEqual(self.client.get(reverse('prediction_whatif'), self.profile).status_code, 403)
+
+        self.client.force_login(self.advisor)
+        response = self.client.get(reverse('prediction_whatif'), dict(self.profile, weight=400))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('weight', response.json()['errors'])
+
+
+    @patch('predict.views.predict_charges')
+    def test_advisor_result_links_the_curves(self, mock_predict):
+        mock_predict.return_value = (22000.0, 18000.0, 26000.0)
+        self.client.force_login(self.advisor)
+
+        response = self.client.post(reverse('prediction'), data=dict(
+            self.profile, first_name='Bruno', last_name='Petit', email='bruno@test.fr'))
+
+        self.assertContains(response, 'id="sensitivity-curves"')
+        self.assertIn('smoker=yes', response.context['scenario_url'])
+
+
+    @patch('predict.views.predict_charges')
+    def test_staff_result_links_the_curves(self, mock_predict):
+        mock_predict.return_value = (22000.0, 18000.0, 26000.0)
+        staff = User.objects.create_user(email='staff@test.fr', password='Staff_Test_159', is_staff=True)
+        self.client.force_login(staff)
+
+        response = self.client.post(reverse('prediction'), data=dict(
+            self.profile, first_name='Bruno', last_name='Petit', email='bruno@test.fr'))
+
+        self.assertContains(response, 'id="sensitivity-curves"')
+        self.assertEqual(self.client.get(response.context['scenario_url']).status_code, 200)
+
+
+
+class ExplainPredictionTest(TestCase):
+    databases = {'default', 'predictions'}
+
+    def setUp(self):
+        self.profile = {'age': 40, 'gender': 'male', 'smoker': 'yes', 'weight': 95, 'height': 1.78,
+                        'children': 2, 'region': 'southeast'}
+
+
+    def test_contributions_add_up_to_the_prediction(self):
+        rng = random.Random(7)
+
+        for _ in range(50):
+            profile = (rng.randint(18, 80), rng.choice(list(GENDER_CODES)), rng.choice(list(SMOKER_CODES)),
+                       rng.uniform(45, 130), rng.uniform(1.5, 2.0), rng.randint(0, 5), rng.choice(list(REGION_CODES)))
+            explanation = explain.explain_prediction(*profile)
+            total = explanation['base'] + sum(item['value'] for item in explanation['contributions'])
+            # Arrondis au centime de chaque terme
+            self.assertAlmostEqual(total, predict_charges(*profile)[0], delta=0.05)
+
+
+    def test_contributions_are_grouped_by_form_field(self):
+        explanation = explain.explain_prediction(*self.profile.values())
+        fields = [item['field'] for item in explanation['contributions']]
+
+        self.assertCountEqual(fields, explain.FIELDS)
+        # Fumer est de loin ce qui pèse le plus dans ce profil
+        self.assertEqual(fields[0], 'smoker')
+        self.assertGreater(explanation['contributions'][0]['value'], 0)
+
+        values = [abs(item['value']) for item in explanation['contributions']]
+        self.assertEqual(values, sorted(values, reverse=True))
+
+
+    def test_tables_are_saved_to_the_configured_path(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = Path(directory) / 'model.paths.npz'
+        explain._path_tables.cache_clear()
+        self.addCleanup(explain._path_tables.cache_clear)
+
+        with override_settings(PREDICT_EXPLAIN_TABLES_PATH=str(path)):
+            tables = explain.load_path_tables()
+            # Écrit en entier, sans fichier temporaire laissé à côté
+            self.assertEqual(os.listdir(directory), ['model.paths.npz'])
+            self.assertEqual(str(tables['model_version']), model_version())
+
+            # Relues depuis le fichier, sans reconstruire les arbres
+            explain._path_tables.cache_clear()
+            with patch.object(explain, 'build_path_tables') as build:
+                explain.load_path_tables()
+            build.assert_not_called()
+
+            # Fichier d'une autre version du modèle : recalculées
+            explain._path_tables.cache_clear()
+            with patch.object(explain, 'build_path_tables', wraps=explain.build_path_tables) as build:
+                explain._path_tables('0' * 16, path)
+            build.assert_called_once()
+
+            # Fichier tronqué (écriture interrompue) : recalculées aussi
+            path.write_bytes(b'PK\x03\x04tronque')
+            explain._path_tables.cache_clear()
+            with self.assertLogs('predict.explain', 'WARNING'):
+                self.assertIsNotNone(explain.explain_prediction(*self.profile.values()))
+
+
+    def test_tables_stay_in_memory_without_path(self):
+        explain._path_tables.cache_clear()
+        self.addCleanup(explain._path_tables.cache_clear)
+
+        with override_settings(PREDICT_EXPLAIN_TABLES_PATH=None), patch.object(explain, '_save') as save:
+            explain.load_path_tables()
+        save.assert_not_called()
+
+
+    @patch('predict.views.predict_charges')
+    def test_result_shows_the_explanation(self, mock_predict):
+        mock_predict.return_value = (22000.0, 18000.0, 26000.0)
+        advisor = User.objects.create_user(email='advisor@test.fr', password='Test_Advisor_159', role='Advisor')
+        self.client.force_login(advisor)
+
+        response = self.client.post(reverse('prediction'), data=dict(
+            self.profile, first_name='Bruno', last_name='Petit', email='bruno@test.fr'))
+
+        self.assertContains(response, 'id="prediction-explanation"')
+        self.assertContains(response, 'data-field="smoker"')
+        self.assertEqual(len(response.context['explanation']['contributions']), len(explain.FIELDS))
+
+
+    @patch('predict.views.explain_prediction', side_effect=RuntimeError)
+    @patch('predict.views.predict_charges')
+    def test_result_without_explanation(self, mock_predict, mock_explain):
+        mock_predict.return_value = (22000.0, 18000.0, 26000.0)
+
+        with self.assertLogs('predict.views', level='ERROR'):
+            response = self.client.post(reverse('prediction'), data=dict(
+                self.profile, first_name='Bruno', last_name='Petit', email='bruno@test.fr'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'id="prediction-explanation"')
@@ -1,6 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from .views import PredictionView
+from .views import (AsyncPredictionView, JobDownloadView, JobListView, JobStatusView, PortfolioView, PredictionView,
+                    PredictionExportView, PredictionStatsView, ReadinessView, SensitivityView)
+
+# Vue native asynchrone pour un déploiement ASGI, vue synchrone sous WSGI
+prediction_view = AsyncPredictionView if settings.PREDICT_ASYNC_VIEWS else PredictionView
 
 urlpatterns = [
-    path('', PredictionView.as_view(), name='prediction'),
+    path('', prediction_view.as_view(), name='prediction'),
+    path('export/', PredictionExportView.as_view(), name='prediction_export'),
+    path('portfolio/', PortfolioView.as_view(), name='prediction_portfolio'),
+    path('whatif/', SensitivityView.as_view(), name='prediction_whatif'),
+    path('ready/', ReadinessView.as_view(), name='prediction_ready'),
+    path('stats/', PredictionStatsView.as_view(), name='prediction_stats'),
+    path('jobs/', JobListView.as_view(), name='job_list'),
+    path('jobs/<int:pk>/', JobStatusView.as_view(), name='job_status'),
+    path('jobs/<int:pk>/download/', JobDownloadView.as_view(), name='job_download'),
 ]
\ No newline at end of file
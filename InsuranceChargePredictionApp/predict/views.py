@@ -1,18 +1,84 @@
-from django.urls import reverse_lazy
+import json
+import logging
+import os
+from asgiref.sync import sync_to_async
+from django.urls import reverse, reverse_lazy
+from django.utils.http import urlencode
 from django.shortcuts import render
-from .forms import PredictionForm
-from django.views.generic import FormView
-from .services import predict_charges, ModelNotFoundError
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.decorators import method_decorator
+from django.utils.cache import add_never_cache_headers
+from django.views.decorators.csrf import csrf_exempt
+from .forms import PortfolioForm, PredictionForm, PredictionExportForm, ScenarioForm
+from django.views.generic import FormView, TemplateView, View
+from .services import predict_charges, save_prediction, asave_prediction, ModelNotFoundError
+from .executor import run_prediction, PredictionBusyError
+from . import warmup
+from .idempotency import aget_submission, astore_submission, get_submission, store_submission, submission_key
+from .singleflight import prediction_flight, prediction_key, save_flight, save_key
+from .sharedcache import shared_cache
+from .percentiles import segment_ranks
+from .whatif import PROFILE_FIELDS, sensitivity_curves
+from .explain import explain_prediction
+from .model_export import live_model_url
+from .quotes import current_quote
+from .api import check_api_token, validate_client_payload, validate_score_payload
+from .exports import DEFAULT_CHUNK_SIZE, filter_predictions, iter_export_rows, stream_csv
+from .jobs import enqueue
+from .portfolio import PAGE_SIZE, latest_predictions, portfolio_page
+from .models import Job
+from .tasks import job_output_path
 from django.contrib.auth import get_user_model
-from django.db import transaction
-from .models import ClientInfos, Predictions
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def is_advisor_or_staff(user):
+    """Accès aux outils conseiller (courbes « et si », portefeuille, tâches de fond)."""
+    return user.is_authenticated and (user.is_staff or getattr(user, 'role', None) == 'Advisor')
+
+
+def coalesced_predict(data):
+    """predict_charges, partagé entre les requêtes identiques en cours (predict.singleflight)
+    et, s'il est activé, relu du cache partagé entre workers (predict.sharedcache)."""
+    cached = shared_cache.get(data)
+    if cached is not None:
+        return cached
+
+    result = prediction_flight.do(prediction_key(data), lambda: predict_charges(
+        data['age'],
+        data['gender'],
+        data['smoker'],
+        data['weight'],
+        data['height'],
+        data['children'],
+        data['region']
+    ))
+    shared_cache.put(data, result)
+    return result
+
+
+def coalesced_save(data, prediction, range_lower, range_upper, user=None):
+    """save_prediction, exécuté une seule fois pour des soumissions identiques simultanées."""
+    return save_flight.do(save_key(data, prediction, user), lambda: save_prediction(
+        data, prediction, range_lower, range_upper, user=user))
+
 
 class PredictionView(FormView):
     form_class = PredictionForm
     template_name = 'predict/prediction.html'
     success_url = reverse_lazy('prediction')
+    # Explication calculée dans get_result_context (la vue asynchrone la calcule hors de la boucle)
+    explain_in_context = True
+    fragment_template_name = 'predict/includes/result.html'
+    fragment_header = 'X-Prediction-Fragment'
+    # Utilisateur dont le formulaire est prérempli : son devis précalculé est affiché
+    quote_user = None
 
 
     def get_initial(self):
@@ -26,10 +92,12 @@ class PredictionView(FormView):
                     try:
                         user = User.objects.get(id=selected_user_id)
                         initial = self.get_user_info(user, initial)
+                        self.quote_user = user
                     except User.DoesNotExist:
                         pass
             else:
                 initial = self.get_user_info(self.request.user, initial)
+                self.quote_user = self.request.user
 
         return initial
 
@@ -69,81 +137,556 @@ class PredictionView(FormView):
         return initial
     
 
+    def is_advisor(self):
+        return self.request.user.is_authenticated and hasattr(self.request.user, 'role') and self.request.user.role == 'Advisor'
+
+
+    def get_fragment_format(self):
+        """Format de réponse partielle demandé ('html' ou 'json'), None pour la page complète."""
+        requested = self.request.headers.get(self.fragment_header, '').lower()
+        if requested in ('html', 'json'):
+            return requested
+
+        accept = self.request.headers.get('Accept', '')
+        if accept.split(',')[0].strip().startswith('application/json'):
+            return 'json'
+
+        return None
+
+
+    def get_fragment_context(self, form):
+        # Pas de liste des clients ni de gabarit complet : seul le bloc résultat est renvoyé
+        return {'form': form, 'is_advisor': self.is_advisor(), 'fragment': True}
+
+
+    def render_fragment(self, fragment, context, status=200):
+        if fragment == 'json':
+            return JsonResponse({
+                'prediction': context.get('prediction'),
+                'range_lower': context.get('range_lower'),
+                'range_upper': context.get('range_upper'),
+                'errors': {field: list(errors) for field, errors in context['form'].errors.items()},
+                'save_error': context.get('save_error', False),
+            }, status=status)
+
+        return render(self.request, self.fragment_template_name, context, status=status)
+
+
     def get_context_data(self, **kwargs):
 
         context = super().get_context_data(**kwargs)
 
-        if self.request.user.is_authenticated and hasattr(self.request.user, 'role') and self.request.user.role == 'Advisor':
+        if self.is_advisor():
             context['users'] = User.objects.filter(role='Client')
             context['selected_user_id'] = self.request.GET.get('user_id', '')
             context['is_advisor'] = True
         else:
             context['is_advisor'] = False
 
+        context['live_model_url'] = live_model_url()
+        context['quote'] = current_quote(self.quote_user)
+
         return context
 
 
+    def form_invalid(self, form):
+        fragment = self.get_fragment_format()
+
+        if fragment:
+            return self.render_fragment(fragment, self.get_fragment_context(form), status=400)
+
+        return super().form_invalid(form)
+
+
+    def prediction_failed(self, form, error):
+        if isinstance(error, ModelNotFoundError):
+            form.add_error(None, 'Toutes nos excuses, le service de prédiction est momentanément indisponible.')
+        elif isinstance(error, PredictionBusyError):
+            form.add_error(None, 'Le service de prédiction est très sollicité, veuillez réessayer dans un instant.')
+        else:
+            form.add_error(None, 'Les données renseignées pour le poids et/ou la taille semblent incorrectes.')
+
+        return self.form_invalid(form)
+
+
+    def get_result_context(self, form, fragment, prediction, range_lower, range_upper):
+        context = self.get_fragment_context(form) if fragment else self.get_context_data()
+        context['form'] = form
+        context['prediction'] = prediction
+
+        if range_lower and range_upper:
+            context['range_lower'] = range_lower
+            context['range_upper'] = range_upper
+
+        # Courbes « et si » chargées par la page (predict/whatif.py), mêmes droits que SensitivityView
+        if is_advisor_or_staff(self.request.user):
+            context['scenario_url'] = reverse('prediction_whatif') + '?' + urlencode(
+                {name: form.cleaned_data[name] for name in PROFILE_FIELDS})
+
+        if self.explain_in_context:
+            context['explanation'] = self.get_explanation(form.cleaned_data)
+        return context
+
+
+    def get_explanation(self, data):
+        """Part de chaque champ dans la prédiction (predict/explain.py), ou None."""
+        try:
+            return explain_prediction(*(data[name] for name in PROFILE_FIELDS))
+        except Exception:
+            logger.exception('Explication de la prédiction indisponible')
+            return None
+
+
+    def get_segment_rank(self, data, prediction):
+        """Rang de la prédiction parmi celles du même segment (fumeur, région), ou None."""
+        try:
+            rank = segment_ranks.rank(data['smoker'], data['region'], prediction)
+        except Exception:
+            logger.exception('Rang de la prédiction indisponible')
+            return None
+
+        if rank is not None:
+            rank['smoker'] = data['smoker'] == 'yes'
+            rank['region'] = dict(PredictionForm.REGION_CHOICES)[data['region']]
+        return rank
+
+
+    def render_result(self, fragment, context):
+        if fragment:
+            return self.render_fragment(fragment, context)
+
+        return render(self.request, self.template_name, context)
+
+
+    def get_submission_key(self, data):
+        token = data.get('submission_token')
+        return submission_key(token, data, self.request.user) if token else None
+
+
+    def render_stored_submission(self, form, fragment, stored):
+        # Double-clic ou renvoi du navigateur : ni modèle, ni base
+        context = self.get_result_context(
+            form, fragment, stored['prediction'], stored['range_lower'], stored['range_upper'])
+        return self.render_result(fragment, context)
+
+
     def form_valid(self, form):
+        fragment = self.get_fragment_format()
+        data = form.cleaned_data
+
+        submission = self.get_submission_key(data)
+        stored = get_submission(submission) if submission else None
+        if stored:
+            return self.render_stored_submission(form, fragment, stored)
+
         try:
-            data = form.cleaned_data
+            prediction, range_lower, range_upper = coalesced_predict(data)
+        except (ValueError, ModelNotFoundError) as error:
+            return self.prediction_failed(form, error)
 
-            prediction, range_lower, range_upper = predict_charges(
-                data['age'], 
-                data['gender'], 
-                data['smoker'], 
-                data['weight'], 
-                data['height'], 
-                data['children'], 
-                data['region']
-            )
+        context = self.get_result_context(form, fragment, prediction, range_lower, range_upper)
 
-            context = self.get_context_data()
-            context['form'] = form
-            context['prediction'] = prediction
+        try:
+            coalesced_save(data, prediction, range_lower, range_upper, user=self.request.user)
 
-            if range_lower and range_upper:
-                context['range_lower'] = range_lower
-                context['range_upper'] = range_upper
+            # Seules les soumissions enregistrées sont rejouées : un échec sera retenté
+            if submission:
+                store_submission(submission, prediction, range_lower, range_upper)
 
-        except ValueError:
-            form.add_error(None, 'Les données renseignées pour le poids et/ou la taille semblent incorrectes.')
-            return self.form_invalid(form)
-        
-        except ModelNotFoundError:
-            form.add_error(None, 'Toutes nos excuses, le service de prédiction est momentanément indisponible.')
-            return self.form_invalid(form)
-        
+        except Exception:
+            context['save_error'] = True
+            import traceback
+            traceback.print_exc()
+
+        context['segment_rank'] = self.get_segment_rank(data, prediction)
+        return self.render_result(fragment, context)
+
+
+class AsyncPredictionView(PredictionView):
+    """Version native asynchrone de PredictionView, pour le déploiement ASGI.
+
+    Le modèle tourne dans un pool de threads dédié et borné (predict.executor),
+    l'enregistrement passe par l'ORM asynchrone. Activée par PREDICT_ASYNC_VIEWS.
+    """
+
+    explain_in_context = False
+
+    async def aload_request_state(self):
+        # Tout accès base est fait ici, avant les méthodes synchrones héritées
+        self.request.user = await self.request.auser()
+        self.async_initial = await self.aget_initial()
+
+
+    async def aget_initial(self):
+        initial = self.initial.copy()
+
+        if self.request.user.is_authenticated:
+            if self.is_advisor():
+                selected_user_id = self.request.GET.get('user_id')
+
+                if selected_user_id:
+                    try:
+                        user = await User.objects.aget(id=selected_user_id)
+                        initial = self.get_user_info(user, initial)
+                        self.quote_user = user
+                    except User.DoesNotExist:
+                        pass
+            else:
+                initial = self.get_user_info(self.request.user, initial)
+                self.quote_user = self.request.user
+
+        return initial
+
+
+    def get_initial(self):
+        return self.async_initial.copy()
+
+
+    async def get(self, request, *args, **kwargs):
+        await self.aload_request_state()
+        return self.render_to_response(self.get_context_data())
+
+
+    async def post(self, request, *args, **kwargs):
+        await self.aload_request_state()
+        form = self.get_form()
+
+        if form.is_valid():
+            return await self.aform_valid(form)
+
+        return self.form_invalid(form)
+
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+
+    def render_result(self, fragment, context):
+        if fragment:
+            return self.render_fragment(fragment, context)
+
+        # Rendu différé : le handler le fait hors de la boucle (liste des clients)
+        return self.render_to_response(context)
 
+
+    async def aget_explanation(self, data):
+        # Parcours des arbres (et calcul des tables sur un worker froid) dans le pool du modèle
         try:
-            with transaction.atomic():
-                client, created = ClientInfos.objects.get_or_create(
-                    email = data['email'],
-                    first_name = data['first_name'].capitalize(),
-                    last_name = data['last_name'].capitalize(),
-                    defaults={'user': self.request.user if self.request.user.is_authenticated 
-                              and hasattr(self.request.user, 'role') and self.request.user.role == 'Client' 
-                              else None}
-                )
-
-                Predictions.objects.get_or_create(
-                    client = client,
-                    prediction = prediction,
-                    defaults={
-                        'created_by': self.request.user if self.request.user.is_authenticated else None, # Gérer les priorités
-                        'range_lower': range_lower if range_lower else None,
-                        'range_upper': range_upper if range_upper else None,
-                        'age': data['age'], 
-                        'gender': data['gender'], 
-                        'smoker': data['smoker'], 
-                        'weight': data['weight'], 
-                        'height': data['height'], 
-                        'children': data['children'], 
-                        'region': data['region']
-                    })
+            return await run_prediction(self.get_explanation, data)
+        except PredictionBusyError:
+            return None
+
+
+    async def aform_valid(self, form):
+        fragment = self.get_fragment_format()
+        data = form.cleaned_data
+
+        submission = self.get_submission_key(data)
+        stored = await aget_submission(submission) if submission else None
+        if stored:
+            context = self.get_result_context(
+                form, fragment, stored['prediction'], stored['range_lower'], stored['range_upper'])
+            context['explanation'] = await self.aget_explanation(data)
+            return self.render_result(fragment, context)
+
+        try:
+            prediction, range_lower, range_upper = await run_prediction(coalesced_predict, data)
+        except (ValueError, ModelNotFoundError, PredictionBusyError) as error:
+            return self.prediction_failed(form, error)
+
+        context = self.get_result_context(form, fragment, prediction, range_lower, range_upper)
+        context['explanation'] = await self.aget_explanation(data)
+
+        try:
+            await asave_prediction(data, prediction, range_lower, range_upper, user=self.request.user)
+
+            if submission:
+                await astore_submission(submission, prediction, range_lower, range_upper)
 
         except Exception:
             context['save_error'] = True
             import traceback
             traceback.print_exc()
-        
-        return render(self.request, self.template_name, context)
\ No newline at end of file
+
+        context['segment_rank'] = await sync_to_async(self.get_segment_rank)(data, prediction)
+        return self.render_result(fragment, context)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class PredictionExportView(View):
+    """Export CSV des prédictions, diffusé ligne à ligne (mémoire constante)."""
+
+    def get(self, request, *args, **kwargs):
+        form = PredictionExportForm(request.GET)
+
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain; charset=utf-8')
+
+        data = form.cleaned_data
+        queryset = filter_predictions(data['start'], data['end'], data['region'])
+        rows = iter_export_rows(queryset, chunk_size=data['chunk_size'] or DEFAULT_CHUNK_SIZE)
+
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="predictions.csv"'
+        return response
+
+
+def api_response(body, status=200):
+    return JsonResponse(body, status=status, json_dumps_params={'separators': (',', ':')})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ScoreAPIView(View):
+    """API JSON de tarification pour les partenaires, authentifiée par jeton.
+
+    Ne lit ni la session, ni l'utilisateur, ni les messages (middlewares paresseux,
+    donc sans coût ici) et ne rend aucun template. L'enregistrement est optionnel
+    (`"persist": true`, avec l'identité du client).
+    """
+
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        if not check_api_token(request.headers.get('Authorization', '')):
+            response = api_response({'error': 'unauthorized'}, status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+
+        try:
+            payload = json.loads(request.body)
+        except (ValueError, UnicodeDecodeError):
+            payload = None
+
+        if not isinstance(payload, dict):
+            return api_response({'error': 'invalid_json'}, status=400)
+
+        data, errors = validate_score_payload(payload)
+        persist = payload.get('persist') is True
+
+        if persist:
+            client_data, client_errors = validate_client_payload(payload)
+            data.update(client_data)
+            errors.update(client_errors)
+
+        if errors:
+            return api_response({'errors': errors}, status=400)
+
+        try:
+            prediction, range_lower, range_upper = coalesced_predict(data)
+        except ValueError:
+            return api_response({'errors': {'__all__': [
+                'Les données renseignées pour le poids et/ou la taille semblent incorrectes.']}}, status=400)
+        except ModelNotFoundError:
+            return api_response({'error': 'unavailable'}, status=503)
+
+        body = {
+            'prediction': prediction,
+            'range': [range_lower, range_upper] if range_lower and range_upper else None,
+        }
+
+        if persist:
+            try:
+                coalesced_save(data, prediction, range_lower, range_upper)
+                body['saved'] = True
+            except Exception:
+                logger.exception("Échec de l'enregistrement d'une prédiction de l'API")
+                body['saved'] = False
+
+        return api_response(body)
+
+
+class ReadinessView(View):
+    """Disponibilité du worker : 200 une fois le modèle préchauffé, 503 avant."""
+
+    def get(self, request, *args, **kwargs):
+        state = warmup.state
+
+        response = JsonResponse({
+            'ready': state['warm'],
+            'warmup_ms': state['warmup_ms'],
+            'native_threads': state['native_threads'],
+            'pid': state['pid'],
+        }, status=200 if state['warm'] else 503)
+        add_never_cache_headers(response)
+        return response
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class PredictionStatsView(View):
+    """Métriques du worker courant : travail dupliqué évité par le regroupement, et
+    cache partagé par les workers de la machine (succès, taux d'occupation)."""
+
+    def get(self, request, *args, **kwargs):
+        response = JsonResponse({
+            'pid': os.getpid(),
+            'singleflight': {
+                'predictions': prediction_flight.stats(),
+                'saves': save_flight.stats(),
+            },
+            'shared_cache': shared_cache.stats(),
+        })
+        add_never_cache_headers(response)
+        return response
+
+
+class AdvisorRequiredMixin(UserPassesTestMixin):
+
+    def test_func(self):
+        return is_advisor_or_staff(self.request.user)
+
+
+class SensitivityView(AdvisorRequiredMixin, View):
+    """Courbes « et si » (poids, âge, enfants ; fumeur ou non) autour d'un profil, en JSON.
+
+    Toute la grille de scénarios est prédite en un seul appel au modèle.
+    """
+
+    def get(self, request, *args, **kwargs):
+        form = ScenarioForm(request.GET)
+
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+
+        try:
+            curves = sensitivity_curves(form.cleaned_data)
+        except ModelNotFoundError:
+            return JsonResponse({'error': 'unavailable'}, status=503)
+
+        return JsonResponse(curves)
+
+
+class PortfolioView(AdvisorRequiredMixin, TemplateView):
+    """Portefeuille du conseiller : dernière prédiction de chaque client, filtrée et triée.
+
+    Une requête par page, quelle que soit la taille du portefeuille.
+    """
+
+    template_name = 'predict/portfolio.html'
+    paginate_by = PAGE_SIZE
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        form = PortfolioForm(self.request.GET)
+        rows, next_cursor = [], None
+
+        if form.is_valid():
+            data = form.cleaned_data
+            # L'équipe voit tous les clients, un conseiller ceux qu'il a suivis
+            queryset = latest_predictions(None if self.request.user.is_staff else self.request.user)
+
+            if data['region']:
+                queryset = queryset.filter(region=data['region'])
+            if data['smoker']:
+                queryset = queryset.filter(smoker=data['smoker'])
+
+            rows, next_cursor = portfolio_page(queryset, data['sort'], data['after'], self.paginate_by)
+
+        if next_cursor:
+            query = self.request.GET.copy()
+            query['after'] = next_cursor
+            context['next_query'] = query.urlencode()
+
+        context.update(form=form, rows=rows)
+        return context
+
+
+# Tâches que les conseillers peuvent lancer : type -> formulaire de paramètres
+ADVISOR_JOBS = {
+    'export_predictions': PredictionExportForm,
+    'export_own_predictions': PredictionExportForm,
+}
+
+# Tâches qui exposent les données de tous les clients : réservées à l'équipe, comme
+# PredictionExportView (lancement et téléchargement). Un conseiller exporte les siennes
+# avec export_own_predictions.
+STAFF_ONLY_JOBS = {'export_predictions'}
+
+
+def job_payload(job):
+    payload = {
+        'id': job.pk,
+        'kind': job.kind,
+        'state': job.state,
+        'progress': job.progress,
+        'progress_done': job.progress_done,
+        'progress_total': job.progress_total,
+        'attempts': job.attempts,
+        'message': job.message,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'status_url': reverse('job_status', args=[job.pk]),
+        'download_url': None,
+    }
+
+    if job.state == Job.SUCCEEDED and (job.result or {}).get('file'):
+        payload['download_url'] = reverse('job_download', args=[job.pk])
+
+    return payload
+
+
+class JobListView(AdvisorRequiredMixin, View):
+    """Lance une tâche de fond (POST, réponse 202 immédiate) ou liste les dernières lancées (GET)."""
+
+    def get(self, request, *args, **kwargs):
+        jobs = Job.objects.filter(created_by_id=request.user.pk).order_by('-pk')[:20]
+        return JsonResponse({'jobs': [job_payload(job) for job in jobs]})
+
+    def post(self, request, *args, **kwargs):
+        kind = request.POST.get('kind')
+        form_class = ADVISOR_JOBS.get(kind)
+
+        if form_class is None:
+            return JsonResponse({'errors': {'kind': ['Type de tâche inconnu.']}}, status=400)
+
+        if kind in STAFF_ONLY_JOBS and not request.user.is_staff:
+            return JsonResponse({'errors': {'kind': ["Tâche réservée à l'équipe."]}}, status=403)
+
+        form = form_class(request.POST)
+        if not form.is_valid():
+            return JsonResponse({'errors': {field: list(errors) for field, errors in form.errors.items()}}, status=400)
+
+        # Paramètres relus et revalidés par le worker : on garde la forme texte des valeurs
+        params = {name: form.data[name] for name, value in form.cleaned_data.items() if value not in (None, '')}
+        job = enqueue(kind, params, user=request.user)
+
+        response = JsonResponse(job_payload(job), status=202)
+        response['Location'] = reverse('job_status', args=[job.pk])
+        return response
+
+
+class JobAccessMixin(AdvisorRequiredMixin):
+
+    def get_job(self):
+        job = get_object_or_404(Job, pk=self.kwargs['pk'])
+
+        # Une tâche n'est visible que par son auteur (et l'équipe)
+        if job.created_by_id != self.request.user.pk and not self.request.user.is_staff:
+            raise Http404
+        return job
+
+
+class JobStatusView(JobAccessMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        response = JsonResponse(job_payload(self.get_job()))
+        add_never_cache_headers(response)
+        return response
+
+
+class JobDownloadView(JobAccessMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_job()
+        name = (job.result or {}).get('file')
+
+        if job.state != Job.SUCCEEDED or not name:
+            raise Http404
+
+        if job.kind in STAFF_ONLY_JOBS and not request.user.is_staff:
+            raise PermissionDenied
+
+        path = job_output_path(name)
+        if not path.is_file():
+            raise Http404
+
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
@@ -0,0 +1,93 @@
+import logging
+import os
+import time
+
+from threadpoolctl import threadpool_info, threadpool_limits
+
+from .explain import load_path_tables
+from .percentiles import segment_ranks
+from .services import ModelNotFoundError, load_model, load_rmse, predict_charges
+
+
+logger = logging.getLogger(__name__)
+
+
+# Profils variés (fumeur ou non, toutes les régions) pour exercer l'encodeur et les arbres
+CANARY_PROFILES = [
+    (18, 'male', 'no', 70, 1.80, 0, 'northwest'),
+    (45, 'female', 'yes', 95, 1.62, 2, 'southeast'),
+    (64, 'male', 'yes', 120, 1.75, 4, 'southwest'),
+    (33, 'female', 'no', 58, 1.68, 1, 'northeast'),
+]
+
+# État du processus courant, exposé par la vue de disponibilité
+state = {
+    'warm': False,
+    'warmup_ms': None,
+    'native_threads': None,
+    'pid': None,
+}
+
+_limiter = None
+
+
+def limit_native_threads(limit):
+    """Bride les pools BLAS/OpenMP déjà chargés : N workers x M threads ne doivent pas dépasser les cœurs."""
+    global _limiter
+
+    _limiter = threadpool_limits(limits=limit)
+    state['native_threads'] = sorted({pool['num_threads'] for pool in threadpool_info()})
+    return state['native_threads']
+
+
+def restore_native_threads():
+    global _limiter
+
+    if _limiter is not None:
+        _limiter.restore_original_limits()
+        _limiter = None
+    state['native_threads'] = None
+
+
+def warm_up(rounds=2):
+    """Charge le modèle et exécute des prédictions témoins avant d'accepter du trafic.
+
+    Les premiers appels paient le dépickle, l'initialisation des chemins numpy/sklearn
+    et la croissance de l'allocateur : ils sont faits ici plutôt que sur un client. Les rangs
+    par segment sont aussi rattrapés ici (lecture de toute la table sans fichier de sauvegarde),
+    et les tables d'explication du modèle calculées.
+
+    Sans fichier de modèle, l'erreur est journalisée et le worker reste « froid » : il sert
+    les pages mais /predict/ready/ répond 503. Renvoie la durée en ms, ou None dans ce cas.
+    """
+    start = time.perf_counter()
+
+    try:
+        load_model()
+        load_rmse()
+        for _ in range(rounds):
+            for profile in CANARY_PROFILES:
+                predict_charges(*profile)
+    except (FileNotFoundError, ModelNotFoundError):
+        logger.exception('Préchauffage impossible : modèle introuvable')
+        return None
+
+    try:
+        load_path_tables()
+    except ValueError:
+        pass  # modèle non explicable (predict.explain) : pas d'explication affichée
+
+    try:
+        segment_ranks.refresh(force=True)
+    except Exception:
+        # Base indisponible : le rattrapage se fera à la première prédiction
+        logger.exception('Rangs par segment non préchargés')
+
+    state['warmup_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    state['warm'] = True
+    state['pid'] = os.getpid()
+    return state['warmup_ms']
+
+
+def reset():
+    state.update(warm=False, warmup_ms=None, pid=None)
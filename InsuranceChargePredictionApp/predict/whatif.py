@@ -0,0 +1,65 @@
+from itertools import islice
+
+from .services import predict_batch
+
+
+# Balayages autour du profil de base (bornes de PredictionForm)
+WEIGHT_STEP = 2
+WEIGHT_SPAN = 20
+MIN_WEIGHT, MAX_WEIGHT = 30, 250
+AGE_SPAN = 20
+MAX_AGE = 125
+MAX_CHILDREN = 5
+
+SMOKER_VALUES = ('no', 'yes')
+PROFILE_FIELDS = ('age', 'gender', 'smoker', 'weight', 'height', 'children', 'region')
+
+
+def _axes(profile):
+    """Valeurs balayées pour chaque variable, le profil de base compris."""
+    weight = float(profile['weight'])
+    low = max(MIN_WEIGHT, weight - WEIGHT_SPAN)
+    high = min(MAX_WEIGHT, weight + WEIGHT_SPAN)
+    weights = sorted({round(low + step * WEIGHT_STEP, 1) for step in range(int((high - low) // WEIGHT_STEP) + 1)} | {weight})
+
+    age = int(profile['age'])
+    children = int(profile['children'])
+    return {
+        'weight': weights,
+        'age': list(range(age, min(MAX_AGE, age + AGE_SPAN) + 1)),
+        'children': sorted(set(range(MAX_CHILDREN + 1)) | {children}),
+    }
+
+
+def scenario_grid(profile):
+    """Profils de la grille : chaque balayage, fumeur et non-fumeur. Renvoie (axes, profils)."""
+    axes = _axes(profile)
+    profiles = []
+
+    for name, values in axes.items():
+        for smoker in SMOKER_VALUES:
+            for value in values:
+                scenario = dict(profile, smoker=smoker, **{name: value})
+                profiles.append(tuple(scenario[field] for field in PROFILE_FIELDS))
+
+    return axes, profiles
+
+
+def sensitivity_curves(profile):
+    """Courbes « et si » autour d'un profil (age, gender, smoker, weight, height, children, region).
+
+    Toute la grille est prédite en un seul appel au modèle (predict_batch). Renvoie
+    {'base': prédiction du profil, '<variable>': {'x': [...], 'no': [...], 'yes': [...]}},
+    avec None pour un scénario invalide (IMC hors limites).
+    """
+    axes, profiles = scenario_grid(profile)
+    results = iter(predict_batch(profiles))
+
+    curves = {}
+    for name, values in axes.items():
+        curves[name] = {'x': values}
+        for smoker in SMOKER_VALUES:
+            curves[name][smoker] = [result and float(result[0]) for result in islice(results, len(values))]
+
+    base = curves['age'][profile['smoker']][0]
+    return {'base': base, **curves}
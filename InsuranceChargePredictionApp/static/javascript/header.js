@@ -0,0 +1,20 @@
+// Pages pré-rendues : l'en-tête anonyme est remplacé par celui de l'utilisateur connecté
+document.addEventListener('DOMContentLoaded', function() {
+    const header = document.querySelector('header[data-fragment-url]');
+
+    if (!header) {
+        return;
+    }
+
+    fetch(header.dataset.fragmentUrl, { credentials: 'same-origin' })
+        .then(function(response) {
+            // 204 : visiteur anonyme, l'en-tête pré-rendu est déjà le bon
+            return response.status === 200 ? response.text() : null;
+        })
+        .then(function(html) {
+            if (html) {
+                header.outerHTML = html;
+            }
+        })
+        .catch(function() {});
+});
@@ -0,0 +1,144 @@
+// Estimation en direct : évalue dans le navigateur le modèle exporté par export_live_model.
+// Indicatif uniquement, la prédiction de référence reste calculée par le serveur à l'envoi.
+(function() {
+    function loadModel(data) {
+        return {
+            numeric: data.numeric,
+            categorical: data.categorical,
+            init: data.init,
+            learningRate: data.learning_rate,
+            rmse: data.rmse,
+            roots: Int32Array.from(data.trees.roots),
+            feature: Int32Array.from(data.trees.feature),
+            threshold: Float64Array.from(data.trees.threshold),
+            left: Int32Array.from(data.trees.left),
+            right: Int32Array.from(data.trees.right)
+        };
+    }
+
+    function encode(model, inputs) {
+        const row = [];
+
+        model.numeric.features.forEach(function(name, i) {
+            row.push((inputs[name] - model.numeric.mean[i]) / model.numeric.scale[i]);
+        });
+
+        model.categorical.forEach(function(column) {
+            const index = column.categories.indexOf(inputs[column.feature]);
+            if (index === -1) {
+                throw new Error('Catégorie inconnue pour ' + column.feature);
+            }
+            column.categories.forEach(function(category, i) {
+                if (i !== column.drop) {
+                    row.push(i === index ? 1 : 0);
+                }
+            });
+        });
+
+        // Les arbres de scikit-learn comparent les valeurs en float32
+        return Float32Array.from(row);
+    }
+
+    function rawPredict(model, inputs) {
+        const row = encode(model, inputs);
+        let raw = model.init;
+
+        for (let t = 0; t < model.roots.length; t++) {
+            let node = model.roots[t];
+            while (model.left[node] !== -1) {
+                node = row[model.feature[node]] <= model.threshold[node] ? model.left[node] : model.right[node];
+            }
+            raw += model.learningRate * model.threshold[node];
+        }
+
+        return raw;
+    }
+
+    function round2(value) {
+        return Math.round(value * 100) / 100;
+    }
+
+    function predict(model, inputs) {
+        return round2(rawPredict(model, inputs));
+    }
+
+    // Utilisé par le test de parité (node), sans DOM
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = { loadModel: loadModel, rawPredict: rawPredict, predict: predict };
+        return;
+    }
+
+    function readInputs(form) {
+        const value = function(name) {
+            const field = form.elements[name];
+            return field ? field.value.trim() : '';
+        };
+
+        const age = parseInt(value('age'), 10);
+        const weight = parseFloat(value('weight'));
+        const height = parseFloat(value('height'));
+        const children = parseInt(value('children'), 10);
+
+        // Mêmes bornes que PredictionForm : pas d'estimation sur une saisie incomplète
+        if (!(age >= 18 && age <= 125) || !(weight >= 30 && weight <= 250)
+                || !(height >= 1 && height <= 2.5) || !(children >= 0 && children <= 15)
+                || !value('gender') || !value('smoker') || !value('region')) {
+            return null;
+        }
+
+        const bmi = round2(weight / (height * height));
+        if (bmi < 13) {
+            return null;
+        }
+
+        return {
+            age: age,
+            bmi: bmi,
+            children: children,
+            sex: value('gender'),
+            smoker: value('smoker'),
+            region: value('region')
+        };
+    }
+
+    function formatEuros(value) {
+        return value.toLocaleString('fr-FR', { minimumFractionDigits: 2, maximumFractionDigits: 2 }) + ' €';
+    }
+
+    document.addEventListener('DOMContentLoaded', function() {
+        const form = document.querySelector('form[data-model-url]');
+        const output = document.getElementById('live-estimate');
+
+        if (!form || !output) {
+            return;
+        }
+
+        fetch(form.dataset.modelUrl)
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function(data) {
+                const model = loadModel(data);
+
+                const update = function() {
+                    const inputs = readInputs(form);
+
+                    if (!inputs) {
+                        output.hidden = true;
+                        return;
+                    }
+
+                    output.textContent = 'Estimation en direct : ' + formatEuros(predict(model, inputs));
+                    output.hidden = false;
+                };
+
+                form.addEventListener('input', update);
+                form.addEventListener('change', update);
+                update();
+            })
+            .catch(function() {});
+    });
+})();
@@ -0,0 +1,42 @@
+// Soumission partielle : seul le bloc résultat est demandé au serveur puis remplacé
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('prediction-form');
+
+    if (!form || !document.getElementById('prediction-result')) {
+        return;
+    }
+
+    form.addEventListener('submit', function(event) {
+        event.preventDefault();
+
+        const button = form.querySelector('button[type="submit"]');
+        button.disabled = true;
+
+        fetch(window.location.href, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: { 'X-Prediction-Fragment': 'html' },
+            credentials: 'same-origin'
+        })
+            .then(function(response) {
+                // 400 : formulaire invalide, le fragment contient les erreurs
+                if (response.status !== 200 && response.status !== 400) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function(html) {
+                document.getElementById('prediction-result').outerHTML = html;
+                if (window.drawSensitivityCurves) {
+                    window.drawSensitivityCurves();
+                }
+            })
+            .catch(function() {
+                // Repli sur la soumission classique (page complète)
+                form.submit();
+            })
+            .finally(function() {
+                button.disabled = false;
+            });
+    });
+});
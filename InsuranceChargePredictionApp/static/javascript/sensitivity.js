@@ -0,0 +1,80 @@
+// Courbes « et si » du bloc résultat : une requête, puis une courbe SVG par variable
+(function() {
+    const WIDTH = 240;
+    const HEIGHT = 140;
+    const PADDING = 24;
+    const COLORS = { yes: '#dc2626', no: '#2563eb' };
+    const SVG = 'http://www.w3.org/2000/svg';
+
+    function element(name, attributes) {
+        const node = document.createElementNS(SVG, name);
+        Object.keys(attributes).forEach(function(key) {
+            node.setAttribute(key, attributes[key]);
+        });
+        return node;
+    }
+
+    function draw(figure, curve, low, high) {
+        const xs = curve.x;
+        const xMin = xs[0];
+        const xSpan = (xs[xs.length - 1] - xMin) || 1;
+        const ySpan = (high - low) || 1;
+        const svg = element('svg', { viewBox: '0 0 ' + WIDTH + ' ' + HEIGHT, width: '100%' });
+
+        const x = function(value) { return PADDING + (value - xMin) / xSpan * (WIDTH - 2 * PADDING); };
+        const y = function(value) { return HEIGHT - PADDING - (value - low) / ySpan * (HEIGHT - 2 * PADDING); };
+
+        svg.appendChild(element('text', { x: 0, y: 12, 'font-size': 10, fill: '#6b7280' })).textContent = Math.round(high) + ' €';
+        svg.appendChild(element('text', { x: 0, y: HEIGHT - 4, 'font-size': 10, fill: '#6b7280' })).textContent =
+            xs[0] + ' → ' + xs[xs.length - 1];
+
+        ['no', 'yes'].forEach(function(smoker) {
+            const points = [];
+            curve[smoker].forEach(function(value, i) {
+                if (value !== null) {
+                    points.push(x(xs[i]).toFixed(1) + ',' + y(value).toFixed(1));
+                }
+            });
+            svg.appendChild(element('polyline', { points: points.join(' '), fill: 'none', stroke: COLORS[smoker], 'stroke-width': 2 }));
+        });
+
+        figure.appendChild(svg);
+    }
+
+    function drawSensitivityCurves() {
+        const container = document.getElementById('sensitivity-curves');
+        if (!container) {
+            return;
+        }
+
+        fetch(container.dataset.url, { credentials: 'same-origin' })
+            .then(function(response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.json();
+            })
+            .then(function(curves) {
+                const figures = container.querySelectorAll('figure[data-curve]');
+                let values = [];
+                figures.forEach(function(figure) {
+                    const curve = curves[figure.dataset.curve];
+                    values = values.concat(curve.yes, curve.no).filter(function(value) { return value !== null; });
+                });
+
+                // Même échelle pour les trois courbes
+                const low = Math.min.apply(null, values);
+                const high = Math.max.apply(null, values);
+                figures.forEach(function(figure) {
+                    draw(figure, curves[figure.dataset.curve], low, high);
+                });
+                container.hidden = false;
+            })
+            .catch(function() {
+                // Courbes facultatives : le résultat reste affiché sans elles
+            });
+    }
+
+    window.drawSensitivityCurves = drawSensitivityCurves;
+    document.addEventListener('DOMContentLoaded', drawSensitivityCurves);
+})();
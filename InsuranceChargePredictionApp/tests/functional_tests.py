@@ -6,6 +6,7 @@ User = get_user_model()
 
 
 class TestClientJourney(TestCase):
+    databases = {'default', 'predictions'}
 
     # Functional test for Client user journey
 
@@ -0,0 +1,54 @@
+import gzip
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+
+# (template, fichier généré) : pages identiques pour tous les visiteurs anonymes
+PAGES = [
+    ('home.html', 'index.html'),
+    ('404.html', '404.html'),
+    ('500.html', '500.html'),
+]
+
+
+def _write_atomic(path, content):
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    help = ("Pré-rend les pages invariantes (accueil, 404, 500) en HTML statique, avec leur "
+            "variante gzip, pour qu'elles soient servies directement par WhiteNoise. "
+            "À lancer après collectstatic, puis redémarrer les workers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Répertoire de sortie (settings.PRERENDER_ROOT par défaut).')
+
+    def handle(self, *args, **options):
+        output = Path(options['output'] or settings.PRERENDER_ROOT)
+        output.mkdir(parents=True, exist_ok=True)
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        for template, filename in PAGES:
+            try:
+                content = render_to_string(template, {'prerendered': True}, request=request).encode('utf-8')
+            except ValueError as error:
+                # Manifest absent : les URLs hashées des ressources ne sont pas encore connues
+                raise CommandError(f"Impossible de rendre {template}, lancez collectstatic d'abord ({error}).")
+
+            path = output / filename
+            _write_atomic(path, content)
+            _write_atomic(path.with_name(filename + '.gz'), gzip.compress(content, compresslevel=9, mtime=0))
+
+            self.stdout.write(f"{template} -> {path} ({len(content)} octets)")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(PAGES)} page(s) pré-rendue(s) dans {output}."))
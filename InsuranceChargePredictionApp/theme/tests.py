@@ -0,0 +1,76 @@
+import gzip
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+
+PLAIN_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+@override_settings(STORAGES=PLAIN_STORAGES)
+class PrerenderPagesTest(TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.output = Path(tmp.name)
+
+    def test_command_writes_pages_and_gzip_variants(self):
+        call_command('prerender_pages', output=str(self.output), stdout=StringIO())
+
+        for filename in ('index.html', '404.html', '500.html'):
+            content = (self.output / filename).read_bytes()
+            self.assertEqual(gzip.decompress((self.output / f'{filename}.gz').read_bytes()), content)
+
+        index = (self.output / 'index.html').read_text(encoding='utf-8')
+        self.assertIn('Bienvenue chez Assur\'Aimant', index)
+        self.assertIn(f'data-fragment-url="{reverse("header_fragment")}"', index)
+        self.assertIn('javascript/header.js', index)
+        self.assertIn('Connexion', index)
+
+    def test_error_handlers_serve_prerendered_pages(self):
+        (self.output / '404.html').write_text('<p>404 pré-rendue</p>', encoding='utf-8')
+
+        with self.settings(PRERENDER_ROOT=self.output):
+            response = self.client.get('/page-inexistante/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertContains(response, '404 pré-rendue', status_code=404)
+
+
+@override_settings(STORAGES=PLAIN_STORAGES)
+class HeaderFragmentViewTest(TestCase):
+
+    def test_anonymous_visitor_gets_no_content(self):
+        response = self.client.get(reverse('header_fragment'))
+        self.assertEqual(response.status_code, 204)
+
+    def test_authenticated_user_gets_personalised_header(self):
+        User.objects.create_user(email='header@test.fr', password='Test_Header_159', first_name='Léa')
+        self.client.login(email='header@test.fr', password='Test_Header_159')
+
+        response = self.client.get(reverse('header_fragment'))
+        self.assertContains(response, 'Bienvenue, Léa')
+        self.assertNotContains(response, 'data-fragment-url')
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+
+    def test_portfolio_link_follows_advisor_or_staff_access(self):
+        client = User.objects.create_user(email='client@test.fr', password='Test_Header_159')
+        User.objects.create_user(email='staff@test.fr', password='Test_Header_159', is_staff=True)
+        User.objects.create_user(email='advisor@test.fr', password='Test_Header_159', role='Advisor')
+        portfolio = reverse('prediction_portfolio')
+
+        for email, shown in ((client.email, False), ('staff@test.fr', True), ('advisor@test.fr', True)):
+            with self.subTest(email=email):
+                self.client.login(email=email, password='Test_Header_159')
+                response = self.client.get(reverse('header_fragment'))
+                self.assertEqual(portfolio in response.content.decode(), shown)